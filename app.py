@@ -4,6 +4,7 @@ import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
 from flask_caching import Cache
+from utils.Payload import NegotiatedCompress
 import flask
 from flask import request
 
@@ -18,7 +19,8 @@ server = flask.Flask(__name__)
 
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets,
                 server=server)
-cache = Cache(app.server)
+cache = Cache()  # Configured from config.yaml in run.py
+compress = NegotiatedCompress()  # Configured from config.yaml in run.py
 app.title = "Automated EDA"
 
 def register_before_request(app):
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+import yaml
+
+
+class SyntheticData():
+    """Synthetic CSV datasets of any size and the config.yaml describing them.
+
+    Numerical columns mix normal, skewed and integer valued distributions, some
+    shifted by the binary target. Categorical columns cycle through the given
+    cardinalities with Zipf distributed categories. Every column has about
+    `missing` of its values missing. Rows are written in chunks, so the size
+    of the file is not bounded by memory.
+    """
+
+    target = 'target'
+
+    @staticmethod
+    def columns(numerical, categorical):
+        return [f'num_{i}' for i in range(numerical)], [f'cat_{i}' for i in range(categorical)]
+
+    @staticmethod
+    def chunk(rng, rows, numerical, categorical, cardinality=(5, 50), missing=0.05):
+        num_cols, cat_cols = SyntheticData.columns(numerical, categorical)
+        target = rng.random(rows) < 0.3
+        columns = {}
+        for i, col in enumerate(num_cols):
+            kind = i % 3
+            if kind == 0:
+                values = rng.normal(10 * (i + 1), 1 + i % 7, rows) + 2.0 * target
+            elif kind == 1:
+                values = rng.lognormal(1, 0.75, rows)
+            else:
+                values = rng.poisson(3 + i % 5, rows).astype('float64')
+            columns[col] = values
+        for i, col in enumerate(cat_cols):
+            n_categories = cardinality[i % len(cardinality)]
+            codes = np.minimum(rng.zipf(1.5, rows) - 1, n_categories - 1)
+            labels = np.array([f'c{code}' for code in range(n_categories)], dtype=object)
+            columns[col] = labels[codes]
+
+        df = pd.DataFrame(columns)
+        if missing > 0:
+            for col in df.columns:
+                df.loc[rng.random(rows) < missing, col] = np.nan
+        df[SyntheticData.target] = target.astype('int64')
+        return df
+
+    @staticmethod
+    def generate(path, rows, numerical=10, categorical=5, cardinality=(5, 50), missing=0.05,
+                 seed=0, chunksize=100000):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        rng = np.random.default_rng(seed)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        written = 0
+        with open(tmp_path, 'w', newline='') as f:
+            while written < rows:
+                n = min(chunksize, rows - written)
+                SyntheticData.chunk(rng, n, numerical, categorical, cardinality, missing).to_csv(
+                    f, index=False, header=written == 0)
+                written += n
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def write_config(conf_file, data_file, numerical, categorical, **overrides):
+        num_cols, cat_cols = SyntheticData.columns(numerical, categorical)
+        conf_dict = {
+            'DataFilePath': [os.path.abspath(data_file)],
+            'Target': SyntheticData.target,
+            'NumericalColumns': num_cols,
+            'CategoricalColumns': cat_cols + [SyntheticData.target],
+            'Seed': 0,
+        }
+        conf_dict.update(overrides)
+        with open(conf_file, 'w') as f:
+            yaml.safe_dump(conf_dict, f, default_flow_style=False, sort_keys=False)
+        return conf_dict
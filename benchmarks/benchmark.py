@@ -0,0 +1,340 @@
+"""Benchmarks of every Dash callback in run.py and every InteractionAnalytics method
+on synthetic datasets of increasing size.
+
+    python benchmarks/benchmark.py --grid 10000x10x5 100000x20x10 --output results.json
+    python benchmarks/benchmark.py --grid 10000x10x5 --baseline baseline.json
+    python benchmarks/benchmark.py --compare baseline.json results.json
+
+A grid entry is <rows>x<numerical columns>x<categorical columns>. Each case runs
+in its own process, since run.py reads config.yaml from the working directory
+when it is imported. Results are JSON; comparing against a baseline exits
+with status 1 when a timing, memory or payload figure grew beyond --threshold.
+"""
+import argparse
+import datetime
+import gc
+import gzip
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from SyntheticData import SyntheticData
+
+default_grid = ['10000x10x5', '100000x20x10', '1000000x20x10', '10000x400x100']
+
+# Minimum values below which differences are noise and never reported as regressions
+noise_floor = {'cold_s': 0.01, 'warm_s': 0.01, 'peak_mb': 1.0, 'payload_kb': 1.0}
+
+
+def parse_case(spec):
+    rows, numerical, categorical = (int(value) for value in spec.lower().split('x'))
+    return {'rows': rows, 'numerical': numerical, 'categorical': categorical}
+
+
+def case_name(case):
+    return f"rows={case['rows']},num={case['numerical']},cat={case['categorical']}"
+
+
+def prepare_case(case, args):
+    case_dir = os.path.join(os.path.abspath(args.work_dir), case_name(case).replace(',', '_').replace('=', ''))
+    data_file = os.path.join(case_dir, f'data-{args.cardinality.replace(",", "-")}-{args.missing}.csv')
+    if not os.path.exists(data_file):
+        cardinality = tuple(int(value) for value in args.cardinality.split(','))
+        SyntheticData.generate(data_file, case['rows'], case['numerical'], case['categorical'],
+                               cardinality, args.missing)
+
+    # The callback cache is disabled so that every call computes
+    SyntheticData.write_config(os.path.join(case_dir, 'config.yaml'), data_file, case['numerical'],
+                               case['categorical'], Sample_Size=args.sample_size or case['rows'],
+                               CacheType='null', LogLevel='WARNING')
+    return case_dir
+
+
+def run_case(case, args):
+    case_dir = prepare_case(case, args)
+    output = os.path.join(case_dir, 'results.json')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--repeats', str(args.repeats),
+               '--output', output]
+    subprocess.run(command, cwd=case_dir, check=True)
+    with open(output) as f:
+        results = json.load(f)
+    for result in results:
+        result['case'] = case_name(case)
+    return results
+
+
+def measure(func, reset, repeats):
+    """Cold time of the first call, median of `repeats` warm calls, and the peak
+    memory allocated by a cold call under tracemalloc.
+    """
+    result = {}
+    try:
+        reset()
+        gc.collect()
+        start = time.perf_counter()
+        value = func()
+        result['cold_s'] = time.perf_counter() - start
+
+        warm = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            warm.append(time.perf_counter() - start)
+        result['warm_s'] = statistics.median(warm) if warm else result['cold_s']
+
+        reset()
+        gc.collect()
+        tracemalloc.start()
+        func()
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    except Exception as e:      # pylint: disable=W0703
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        result['error'] = f'{type(e).__name__}: {e}'
+        value = None
+    return result, value
+
+
+def payload_size(value):
+    import plotly.utils
+
+    encoded = json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+    return len(encoded) / 1024, len(gzip.compress(encoded, 6)) / 1024
+
+
+def component_values(component, values):
+    # Initial property values of every component with an id in a layout tree
+    if isinstance(component, (list, tuple)):
+        for child in component:
+            component_values(child, values)
+        return
+    if not hasattr(component, 'to_plotly_json'):
+        return
+    props = component.to_plotly_json()['props']
+    if 'id' in props:
+        for prop, value in props.items():
+            if prop not in ('id', 'children'):
+                values[f"{props['id']}.{prop}"] = value
+        if 'children' in props and not hasattr(props['children'], 'to_plotly_json') \
+                and not isinstance(props['children'], (list, tuple)):
+            values[f"{props['id']}.children"] = props['children']
+    component_values(props.get('children'), values)
+
+
+def split_outputs(output):
+    if output.startswith('..'):
+        return output[2:-2].split('...')
+    return [output]
+
+
+def callback_benchmarks(run, data_object, reset, repeats):
+    import layout
+
+    values = {}
+    for name in dir(layout):
+        if name == 'layout' or name.endswith('_layout'):
+            component_values(getattr(layout, name), values)
+    values['url.search'] = ''
+    values['dataset-store.data'] = run.registry.default
+    values['dataset-dropdown.value'] = run.registry.default
+
+    # Callbacks run in the order they are declared, so options are set before the figures use them
+    results = []
+    for output, entry in run.app.callback_map.items():
+        func = entry['callback'].__wrapped__
+        args = [values.get(f"{item['id']}.{item['property']}") for item in entry['inputs'] + entry['state']]
+        result, value = measure(lambda: func(*args), reset, repeats)
+        result.update(kind='callback', name=func.__name__, output=output)
+        if 'error' not in result:
+            outputs = split_outputs(output)
+            for key, item in zip(outputs, value if len(outputs) > 1 else [value]):
+                values[key] = item
+            result['payload_kb'], result['payload_gzip_kb'] = payload_size(value)
+        results.append(result)
+    return results
+
+
+def analytics_specs(df, conf_dict, cache=None):
+    from utils.MultiVarAnalytics import InteractionAnalytics as IA
+
+    num = conf_dict['NumericalColumns']
+    cat = [col for col in conf_dict['CategoricalColumns'] if col != conf_dict['Target']] or conf_dict['CategoricalColumns']
+    target = conf_dict['Target']
+    x_y = lambda: IA.sorted_pairs(df, num[0], num[-1])
+    return {
+        'rank_associations': lambda: IA.rank_associations(df, conf_dict, target, 5, 5, cache=cache),
+        'cramers_v_matrix': lambda: IA.cramers_v_matrix(df, conf_dict['CategoricalColumns'], cache=cache),
+        'compute_cramers_v': lambda: IA.compute_cramers_v(df, conf_dict['CategoricalColumns']),
+        'eta_squared': lambda: IA.eta_squared(df, num, conf_dict['CategoricalColumns']),
+        'NoLabels': lambda: IA.NoLabels(cat[0]),
+        'categorical_relations': lambda: IA.categorical_relations(df, cat[0], cat[-1]),
+        'numerical_relations': lambda: IA.numerical_relations(df, num[0], num[-1], cache=cache),
+        'compute_numerical_relations': lambda: IA.compute_numerical_relations(df, num[0], num[-1]),
+        'sorted_pairs': x_y,
+        'fast_lowess': lambda: IA.fast_lowess(*x_y()),
+        'lowess_error': lambda: IA.lowess_error(df, num[0], num[-1]),
+        'density_grid': lambda: IA.density_grid(df, num[0], num[-1], cat[0]),
+        'numerical_correlation': lambda: IA.numerical_correlation(df, conf_dict, 'pearson'),
+        'nc_relation': lambda: IA.nc_relation(df, conf_dict, num[0], cat[0]),
+        'pca': lambda: IA.pca(df, num, conf_dict.get('PCAComponents'), cache),
+        'compute_pca': lambda: IA.compute_pca(df, num, conf_dict.get('PCAComponents')),
+        'pca_3d': lambda: IA.pca_3d(df, conf_dict, cat[0], 1, 2, cache),
+        'nnc_relation': lambda: IA.nnc_relation(df, conf_dict, num[0], num[-1], cat[0]),
+    }
+
+
+def analytics_benchmarks(data_object, reset, repeats):
+    from utils.MultiVarAnalytics import InteractionAnalytics
+
+    specs = analytics_specs(data_object.df, data_object.conf_dict, data_object.results)
+    results = []
+    for name, member in vars(InteractionAnalytics).items():
+        if not isinstance(member, staticmethod):
+            continue
+        if name in specs:
+            result, _ = measure(specs[name], reset, repeats)
+        else:
+            result = {'skipped': 'no benchmark arguments'}
+        result.update(kind='analytics', name=name)
+        results.append(result)
+    return results
+
+
+def worker(args):
+    import warnings
+    warnings.filterwarnings('ignore')
+
+    start = time.perf_counter()
+    import run
+    from utils.MultiVarAnalytics import InteractionAnalytics
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data_object = run.registry.get(None)
+    results = [{'kind': 'startup', 'name': 'import_run', 'cold_s': import_s},
+               {'kind': 'startup', 'name': 'load_dataset', 'cold_s': time.perf_counter() - start,
+                'resident_mb': data_object.memory_usage() / 2 ** 20}]
+
+    def reset():
+        data_object.results.clear()
+        for cache in (data_object.univariate, data_object.value_counts, data_object.sort_indexes,
+                      data_object.column_cache, data_object.correlations):
+            cache.clear()
+
+    results += callback_benchmarks(run, data_object, reset, args.repeats)
+    results += analytics_benchmarks(data_object, reset, args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+
+
+def metadata():
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'pandas': pandas.__version__, 'numpy': numpy.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def compare(baseline, results, threshold):
+    """Prints the metrics that grew by more than `threshold` times and new errors.
+    Returns the number of regressions.
+    """
+    key = lambda result: (result.get('case'), result['kind'], result.get('output') or result['name'])
+    previous = {key(result): result for result in baseline['results']}
+    regressions = 0
+    for result in results['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        label = f"{result.get('case')} {result['kind']} {result['name']}"
+        if 'error' in result and 'error' not in old:
+            print(f'{label}: now fails with {result["error"]}')
+            regressions += 1
+            continue
+        for metric, floor in noise_floor.items():
+            if metric not in result or metric not in old:
+                continue
+            if result[metric] > floor and result[metric] > threshold * max(old[metric], floor):
+                print(f'{label}: {metric} {old[metric]:.4g} -> {result[metric]:.4g}')
+                regressions += 1
+    print(f'{regressions} regression(s) over {threshold:.2f}x against the baseline of {baseline["meta"].get("commit")}')
+    return regressions
+
+
+def summary(results):
+    for result in results['results']:
+        if 'skipped' in result:
+            continue
+        line = f"{result.get('case', '')} {result['kind']} {result['name']}: "
+        if 'error' in result:
+            print(line + result['error'])
+            continue
+        line += f"cold {result['cold_s']:.3f}s"
+        if 'warm_s' in result:
+            line += f", warm {result['warm_s']:.3f}s, peak {result['peak_mb']:.1f} MB"
+        if 'payload_kb' in result:
+            line += f", payload {result['payload_kb']:.1f} KB ({result['payload_gzip_kb']:.1f} KB gzip)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', nargs='+', default=default_grid, help='Cases as <rows>x<numerical>x<categorical>')
+    parser.add_argument('--cardinality', default='5,50', help='Category counts cycled over categorical columns')
+    parser.add_argument('--missing', type=float, default=0.05, help='Share of missing values per column')
+    parser.add_argument('--sample-size', type=int, default=None, help='Sample_Size, all rows by default')
+    parser.add_argument('--repeats', type=int, default=3, help='Warm calls timed per benchmark')
+    parser.add_argument('--work-dir', default=os.path.join(ROOT, '.benchmarks'), help='Generated data and configs')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='Results to compare against after running')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Allowed growth factor per metric')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'), help='Only compare two result files')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return 0
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            results = json.load(f)
+        return 1 if compare(baseline, results, args.threshold) else 0
+
+    results = {'meta': metadata(), 'grid': args.grid, 'results': []}
+    for spec in args.grid:
+        results['results'] += run_case(parse_case(spec), args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    summary(results)
+
+    # A benchmark that raised is a failure even without a baseline
+    errors = sum('error' in result for result in results['results'])
+    if errors:
+        print(f'{errors} benchmark(s) failed')
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        return 1 if regressions or errors else 0
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Import time budget of run.py, measured with python -X importtime.
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 2500 --repeats 5
+
+run.py is imported in a fresh interpreter against a small synthetic dataset,
+the fastest of --repeats runs counts. Exits with status 1 when it takes more
+than --budget-ms or when one of the --lazy modules (the analytics backends
+the callbacks import on first use) is imported at startup. The same checks
+run under pytest in tests/test_import_budget.py. IDEAR_IMPORT_BUDGET_MS
+overrides the default budget, for slower machines.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from SyntheticData import SyntheticData
+
+default_budget_ms = float(os.environ.get('IDEAR_IMPORT_BUDGET_MS', 4000))
+lazy_modules = ['scipy.stats', 'statsmodels', 'matplotlib', 'sklearn', 'plotly.express', 'plotly.figure_factory']
+
+
+def prepare(work_dir):
+    data_file = os.path.join(work_dir, 'data.csv')
+    if not os.path.exists(data_file):
+        SyntheticData.generate(data_file, 1000, 5, 3)
+    SyntheticData.write_config(os.path.join(work_dir, 'config.yaml'), data_file, 5, 3, LogLevel='WARNING',
+                               PrewarmImports=False)
+    return work_dir
+
+
+def parse_importtime(stderr):
+    # Lines are "import time: <self us> | <cumulative us> | <indented module name>"
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append({'module': name.strip(), 'depth': (len(name) - len(name.lstrip())) // 2,
+                        'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+    return imports
+
+
+def measure(work_dir, module='run'):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]).rstrip(os.pathsep))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=work_dir, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{process.stderr[-2000:]}')
+    imports = parse_importtime(process.stderr)
+    total = next(item['cumulative_ms'] for item in reversed(imports) if item['module'] == module)
+    return total, imports
+
+
+def eager_lazy_modules(imports, lazy):
+    return sorted({name for item in imports for name in lazy
+                   if item['module'] == name or item['module'].startswith(name + '.')})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=default_budget_ms, help='Allowed import time of run.py')
+    parser.add_argument('--repeats', type=int, default=3, help='Interpreters started, the fastest counts')
+    parser.add_argument('--lazy', nargs='*', default=lazy_modules, help='Modules run.py must not import')
+    parser.add_argument('--top', type=int, default=15, help='Slowest top level imports listed')
+    parser.add_argument('--work-dir', default=os.path.join(ROOT, '.benchmarks', 'import_budget'))
+    args = parser.parse_args()
+
+    work_dir = prepare(os.path.abspath(args.work_dir))
+    total, imports = min((measure(work_dir) for _ in range(max(args.repeats, 1))), key=lambda item: item[0])
+
+    # Direct imports of run.py and the packages they pull in, slowest first
+    top_level = sorted((item for item in imports if item['depth'] == 1), key=lambda item: -item['cumulative_ms'])
+    for item in top_level[:args.top]:
+        print(f"{item['cumulative_ms']:9.1f} ms  {item['module']}")
+
+    failed = False
+    eager = eager_lazy_modules(imports, args.lazy)
+    if eager:
+        failed = True
+        print(f"Imported at startup but should be lazy: {', '.join(eager)}")
+    status = 'over' if total > args.budget_ms else 'within'
+    print(f"import run: {total:.1f} ms, {status} the {args.budget_ms:.0f} ms budget")
+    failed = failed or total > args.budget_ms
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
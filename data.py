@@ -2,52 +2,87 @@ import pandas as pd
 import numpy as np
 import os
 import collections
-import matplotlib
 import io
 import sys
 import operator
 import yaml
+import hashlib
 
-import scipy.stats as stats
-from statsmodels.graphics.mosaicplot import mosaic
-import statsmodels.api as sm
-from statsmodels.formula.api import ols
 import os
 from string import Template
 from functools import partial
 from collections import OrderedDict
 
+from utils.ColumnarFrame import ColumnarFrame
+from utils.Compaction import Compaction
+from utils.DataIngestion import DataIngestion
+from utils.SQLSource import SQLSource
+from utils.Sketches import StreamingProfile
+from utils.TableView import TableView
+from utils.TopK import TopK
+from utils.DescriptiveStatistics import DescriptiveStatistics
+from utils.UnivariateAnalytics import UnivariateAnalytics
+from utils.MultiVarAnalytics import InteractionAnalytics, ResultsCache
+
 class data():
 
-    def __init__(self):
-        self.df, self.conf_dict = self.read_data()
-        self.df0 = self.df.copy()
+    def __init__(self, conf_dict=None):
+        self.column_cache = OrderedDict()
+        self.univariate = {}
+        self.value_counts = {}
+        self.sort_indexes = {}
+        self.correlations = {}
+        self.results = ResultsCache()
+        self.mapped_bytes = 0
+        self.df, self.conf_dict = self.read_data(conf_dict)
         self.desc_stats_num, self.desc_stats_cat = self.descriptive_statistics()
+        # The statistics above are taken on the loaded dtypes, the sample is kept compacted
+        if self.conf_dict.get('CompactMemory', True):
+            self.df = Compaction.compact(self.df, self.conf_dict['CategoricalColumns'], self.conf_dict['NumericalColumns'],
+                                         self.conf_dict.get('MaxCategoryRatio', 0.5))
+        self.version = self.dataset_version()
+
+    @staticmethod
+    def read_config(conf_file="config.yaml"):
+        with open(conf_file) as f:
+            return yaml.load(f, Loader=yaml.FullLoader)
 
-    def read_data(self):
+    def read_data(self, conf_dict=None):
 
-        conf_file = "config.yaml"
-        Sample_Size =  10000
-        conf_dict = yaml.load(open(conf_file), Loader=yaml.FullLoader)
+        if conf_dict is None:
+            conf_dict = self.read_config()
+        Sample_Size = conf_dict.get('Sample_Size', 10000)
         
-        # Read in data from local file or SQL server
-        # if 'DataSource' not in conf_dict:
-        #     df=pd.read_csv(conf_dict['DataFilePath'][0], skipinitialspace=True)
-        # else:
-        #     import pyodbc
-        #     cnxn = pyodbc.connect('driver=ODBC Driver 17 for SQL Server;server={};port=1433;database={};Uid={};Pwd={}'.format(
-        #             conf_dict['Server'], conf_dict['Database'],conf_dict['Username'],conf_dict['Password']))
-        #     df = pd.read_sql(conf_dict['Query'],cnxn)
-
-        # Fix data source for testing and development
-        df = pd.read_csv('data/titanic.csv')
+        # Only load the configured columns when all of them are known up front
+        columns = self.configured_columns(conf_dict)
+
+        # Stratify the sample on the target so that rare classes keep their share
+        stratify = None
+        if conf_dict.get('StratifiedSampling', False) and 'Target' in conf_dict:
+            stratify = conf_dict['Target'][0] if type(conf_dict['Target']) == list else conf_dict['Target']
+
+        # Read in data from SQL server, the database draws the sample
+        if 'DataSource' in conf_dict:
+            self.data_file = None
+            df = SQLSource.sample(conf_dict, Sample_Size, seed=conf_dict.get('Seed'), stratify=stratify,
+                                  columns=columns, chunksize=conf_dict.get('ChunkSize'))
+        else:
+            # Local file defaults to the titanic data for testing and development
+            data_file = conf_dict.get('DataFilePath', 'data/titanic.csv')
+            if isinstance(data_file, list):
+                data_file = data_file[0]
+            self.data_file = data_file
+
+            # Single pass over the source, memory is bounded by the sample size
+            df = DataIngestion.sample(data_file, Sample_Size, seed=conf_dict.get('Seed'), stratify=stratify,
+                                      columns=columns, cache_dir=conf_dict.get('CacheDirectory'),
+                                      chunksize=conf_dict.get('ChunkSize'),
+                                      float_columns=conf_dict.get('FloatDataTypes'),
+                                      use_cache=conf_dict.get('UseColumnarCache', True))
 
         # Making sure that we are not reading any extra column
         df = df[[each for each in df.columns if 'Unnamed' not in each]]
 
-        if Sample_Size < df.shape[0]:
-            df = df.sample(Sample_Size)
-
         # change float data types
         if 'FloatDataTypes' in conf_dict:   
             for col_name in conf_dict['FloatDataTypes']:
@@ -76,50 +111,288 @@ class data():
         
         return df, conf_dict
 
+    def full_columns(self, columns):
+        """Columns over every row of the source, read from the columnar cache.
+        Returns the sampled columns unless FullDataInteractions is enabled.
+        """
+        conf_dict = self.conf_dict
+        if not (conf_dict.get('FullDataInteractions', False) and conf_dict.get('UseColumnarCache', True)
+                and self.data_file is not None and DataIngestion.columnar_available()):
+            return self.df[columns]
+
+        missing = [col for col in columns if col not in self.column_cache]
+        if missing:
+            loaded = DataIngestion.load(self.data_file, columns=missing, cache_dir=conf_dict.get('CacheDirectory'),
+                                        float_columns=conf_dict.get('FloatDataTypes'))
+            for col in missing:
+                self.column_cache[col] = loaded[col]
+
+        # Keep the most recently used full columns resident
+        full_df = pd.concat([self.column_cache[col] for col in columns], axis=1)
+        for col in columns:
+            self.column_cache.move_to_end(col)
+        while len(self.column_cache) > max(conf_dict.get('FullDataColumnCache', 4), len(columns)):
+            self.column_cache.popitem(last=False)
+        return full_df
+
+    @staticmethod
+    def configured_columns(conf_dict):
+        if 'NumericalColumns' not in conf_dict or 'CategoricalColumns' not in conf_dict:
+            return None
+
+        targets = conf_dict.get('Target', [])
+        if type(targets) != list:
+            targets = [targets]
+
+        columns = []
+        for col in conf_dict['NumericalColumns'] + conf_dict['CategoricalColumns'] + targets:
+            if col not in columns:
+                columns.append(col)
+        return columns
+
 
     def descriptive_statistics(self):
-        def num_missing(x):
-            return len(x.index)-x.count()
+        if self.conf_dict.get('FullDataStatistics', False) and self.data_file is not None:
+            numerical = list(self.df.select_dtypes(include=[np.number]).columns)
+            categorical = [col for col in self.df.columns if col in self.conf_dict['CategoricalColumns']]
+            return self.full_statistics(numerical, categorical)
+        return DescriptiveStatistics.summarize(self.df, self.conf_dict['CategoricalColumns'])
+
+    def full_statistics(self, numerical, categorical):
+        # Sketches over every row of the source, see utils/Sketches.py
+        conf_dict = self.conf_dict
+        stats, top_values = StreamingProfile.profile(self.data_file, numerical, categorical,
+                                                     cache_dir=conf_dict.get('CacheDirectory'),
+                                                     chunksize=conf_dict.get('ChunkSize'),
+                                                     float_columns=conf_dict.get('FloatDataTypes'),
+                                                     workers=conf_dict.get('StatisticsWorkers'),
+                                                     use_cache=conf_dict.get('UseColumnarCache', True),
+                                                     top_k=conf_dict.get('TopCategories', 50))
+        # The bar and pie charts then show the most frequent values of all rows too
+        self.value_counts.update(top_values)
+        return stats
+
+
+    def memory_usage(self):
+        # Bytes held by the sample and the cached full columns, without those mapped from a shared snapshot
+        usage = self.df.memory_usage(deep=True).sum() - self.mapped_bytes
+        usage += sum(order.nbytes for order, _ in self.sort_indexes.values() if not isinstance(order, np.memmap))
+        usage += sum(col.memory_usage(deep=False) for col in self.column_cache.values())
+        usage += self.results.memory_usage()
+        return int(usage)
+
+    def dataset_version(self):
+        # Changes whenever the sampled rows or the column configuration change
+        hashes = pd.util.hash_pandas_object(self.df, index=True).to_numpy()
+        key = repr((self.df.shape, int(hashes.sum()), list(self.df.columns),
+                    self.conf_dict.get('NumericalColumns'), self.conf_dict.get('CategoricalColumns'),
+                    self.conf_dict.get('Target')))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+    def univariate_summary(self, col):
+        # Compact histogram, KDE, quantile and QQ data, computed once per column
+        if col not in self.univariate:
+            self.univariate[col] = UnivariateAnalytics.summarize(self.df[col].to_numpy(dtype='float64', na_value=np.nan))
+        return self.univariate[col]
+
+    def warm_up(self, workers=None):
+        """Compute the univariate results of every configured column in a process pool,
+        so that the first selection of a column is as fast as the later ones.
+        """
+        from concurrent.futures import ProcessPoolExecutor
 
-        def num_unique(x):
-            return len(np.unique(x.dropna()))
+        numerical = [col for col in self.conf_dict['NumericalColumns'] if col not in self.univariate]
+        categorical = [col for col in self.conf_dict['CategoricalColumns'] if col not in self.value_counts]
 
-        temp_df = self.df0.describe().T
-        missing_df = pd.DataFrame(self.df0.apply(num_missing, axis=0))
-        missing_df.columns = ['missing']
-        unq_df = pd.DataFrame(self.df0.apply(num_unique, axis=0))
-        unq_df.columns = ['unique']
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            num_futures = {col: executor.submit(UnivariateAnalytics.summarize,
+                                                self.df[col].to_numpy(dtype='float64', na_value=np.nan))
+                           for col in numerical}
+            cat_futures = {col: executor.submit(TopK.from_values, self.df[col], self.conf_dict.get('TopCategories', 50))
+                           for col in categorical}
+            for col, future in num_futures.items():
+                self.univariate[col] = future.result()
+            for col, future in cat_futures.items():
+                self.value_counts[col] = future.result()
 
-        types_df = pd.DataFrame(self.df0.dtypes)
-        types_df.columns = ['DataType']
+    def sort_index(self, col):
+        # Ascending row order of a column for the paged data table, computed once
+        if col not in self.sort_indexes:
+            self.sort_indexes[col] = TableView.sort_index(self.df[col])
+        return self.sort_indexes[col]
 
-        summary_df_num = temp_df.join(missing_df).join(unq_df)#.join(types_df)
-        summary_df_num.index = summary_df_num.index.set_names(['Column name'])
+    def numerical_correlation(self, method):
+        if method not in self.correlations:
+            self.correlations[method] = InteractionAnalytics.numerical_correlation(self.df, self.conf_dict, method)
+        return self.correlations[method]
 
-        col_names = list(types_df.index) #Get all col names
-        num_cols = len(col_names)
-        index = range(num_cols)
+    def cramers_v(self):
+        if 'cramers_v' not in self.correlations:
+            self.correlations['cramers_v'] = InteractionAnalytics.cramers_v_matrix(
+                self.df, self.conf_dict['CategoricalColumns'], cache=self.results)
+        return self.correlations['cramers_v']
 
-        cat_index = []
-        for i in index: #Find the indices of columns in Categorical columns
-            if col_names[i] in self.conf_dict['CategoricalColumns']:
-                cat_index.append(i)
+    def precompute(self, workers=None, methods=('pearson',)):
+        # Everything the tabs compute from the whole sample, before it is shared
+        if workers:
+            self.warm_up(workers)
+        for col in self.conf_dict['NumericalColumns']:
+            self.univariate_summary(col)
+        for col in self.conf_dict['CategoricalColumns']:
+            self.target_distribution(col)
+        for col in self.df.columns:
+            self.sort_index(col)
+        if len(self.conf_dict['NumericalColumns']) > 1:
+            for method in methods:
+                self.numerical_correlation(method)
+        if len(self.conf_dict['CategoricalColumns']) > 1:
+            self.cramers_v()
 
-        summary_df_cat = missing_df.join(unq_df)#.join(types_df.iloc[cat_index], how='inner')
-        summary_df_cat.index = summary_df_cat.index.set_names(['Column name'])
+    def shared_state(self):
+        # Sample, row sized arrays and the remaining (column sized) results of a snapshot
+        dtype = np.int32 if len(self.df) < 2 ** 31 else np.int64
+        arrays = {col: order.astype(dtype) for col, (order, _) in self.sort_indexes.items()}
+        artifacts = {
+            'conf_dict': self.conf_dict,
+            'data_file': self.data_file,
+            'version': self.version,
+            'desc_stats_num': self.desc_stats_num,
+            'desc_stats_cat': self.desc_stats_cat,
+            'univariate': self.univariate,
+            'value_counts': self.value_counts,
+            'sort_valid': {col: valid for col, (_, valid) in self.sort_indexes.items()},
+            'correlations': self.correlations,
+        }
+        return self.df, arrays, artifacts
 
-        return summary_df_num.reset_index(), summary_df_cat.reset_index()
+    @classmethod
+    def attach(cls, df, arrays, artifacts):
+        # Dataset over a shared snapshot, see utils/SharedDataset.py
+        from utils.SharedDataset import SharedDataset
 
+        data_object = cls.__new__(cls)
+        data_object.column_cache = OrderedDict()
+        data_object.results = ResultsCache()
+        data_object.df = df
+        data_object.mapped_bytes = SharedDataset.mapped_bytes(df)
+        data_object.sort_indexes = {col: (arrays[col], valid) for col, valid in artifacts.pop('sort_valid').items()}
+        for key, value in artifacts.items():
+            setattr(data_object, key, value)
+        return data_object
 
-    def target_distribution(self, target):
-        return pd.DataFrame(self.df[target].value_counts()).reset_index()
+    def top_values(self, col):
+        if col not in self.value_counts:
+            self.value_counts[col] = TopK.from_values(self.df[col], self.conf_dict.get('TopCategories', 50))
+        return self.value_counts[col]
+
+    def target_distribution(self, target, n=None):
+        # The n most frequent values and one row for the rest
+        return self.top_values(target).frame(target, n)
+
+
+class columnar_data(data):
+    """`data` over a ColumnarFrame, selected with Backend: columnar in config.yaml.
+
+    The sample is written once as memory mapped Arrow IPC files and columns are
+    loaded as the callbacks select them, so tables with thousands of columns
+    open without reading them and only the recently used columns stay in
+    memory. Descriptive statistics are computed on first use, a group of
+    columns at a time. Unseeded samples are drawn once and reused until the
+    source file changes.
+    """
+
+    def __init__(self, conf_dict=None):
+        self.column_cache = OrderedDict()
+        self.univariate = {}
+        self.value_counts = {}
+        self.sort_indexes = {}
+        self.correlations = {}
+        self.results = ResultsCache()
+        self.mapped_bytes = 0
+        self.stats = None
+        self.df, self.conf_dict = self.read_data(conf_dict)
+        self.version = self.dataset_version()
 
     @staticmethod
-    def shapiro_test(x):
-        p_val = round(stats.shapiro(x)[1], 6)
-        status = 'passed'
-        color = 'blue'
-        if p_val < 0.05:
-            status = 'failed'
-            color = 'red'
-        return status, color, p_val
\ No newline at end of file
+    def supported(conf_dict):
+        return ('DataSource' not in conf_dict and conf_dict.get('UseColumnarCache', True)
+                and DataIngestion.columnar_available())
+
+    def read_data(self, conf_dict=None):
+        if conf_dict is None:
+            conf_dict = self.read_config()
+
+        stratify = None
+        if conf_dict.get('StratifiedSampling', False) and 'Target' in conf_dict:
+            stratify = conf_dict['Target'][0] if type(conf_dict['Target']) == list else conf_dict['Target']
+
+        data_file = conf_dict.get('DataFilePath', 'data/titanic.csv')
+        if isinstance(data_file, list):
+            data_file = data_file[0]
+        self.data_file = data_file
+
+        # Columns are compacted group by group as the sample is written
+        compact = conf_dict.get('CompactMemory', True)
+        excluded = set(conf_dict.get('ColumnsToExclude', []))
+
+        def transform(df):
+            numerical = conf_dict.get('NumericalColumns', list(df.select_dtypes(include=[np.number]).columns))
+            categorical = conf_dict.get('CategoricalColumns', list(df.select_dtypes(exclude=[np.number]).columns))
+            return Compaction.compact(df, [col for col in categorical if col not in excluded],
+                                      [col for col in numerical if col not in excluded],
+                                      conf_dict.get('MaxCategoryRatio', 0.5))
+
+        compact_key = repr((compact, conf_dict.get('MaxCategoryRatio', 0.5), conf_dict.get('NumericalColumns'),
+                            conf_dict.get('CategoricalColumns'), sorted(excluded)))
+        directory = ColumnarFrame.build(data_file, conf_dict.get('Sample_Size', 10000), seed=conf_dict.get('Seed'),
+                                        stratify=stratify, columns=self.configured_columns(conf_dict),
+                                        cache_dir=conf_dict.get('CacheDirectory'), chunksize=conf_dict.get('ChunkSize'),
+                                        float_columns=conf_dict.get('FloatDataTypes'),
+                                        transform=transform if compact else None, compact_key=compact_key)
+        df = ColumnarFrame(directory, conf_dict.get('ColumnCacheMB', 256) * 2 ** 20)
+
+        # Column lists from the schema, numerical meaning numerical before compaction
+        numeric = [col for col in df.meta['numeric'] if col in df]
+        if 'CategoricalColumns' not in conf_dict:
+            conf_dict['CategoricalColumns'] = [col for col in df.columns if col not in numeric]
+        if 'NumericalColumns' not in conf_dict:
+            conf_dict['NumericalColumns'] = numeric
+        conf_dict['CategoricalColumns'] = [col for col in conf_dict['CategoricalColumns'] if col not in excluded]
+        conf_dict['NumericalColumns'] = [col for col in conf_dict['NumericalColumns'] if col not in excluded]
+        conf_dict['CategoricalColumns'] = sorted(conf_dict['CategoricalColumns'], reverse=True)
+        return df, conf_dict
+
+    def descriptive_statistics(self, group_size=256):
+        # On first use, through the column cache a group of columns at a time
+        if self.stats is None:
+            numeric = [col for col in self.df.meta['numeric'] if col in self.df]
+            categorical = [col for col in self.df.columns if col in self.conf_dict['CategoricalColumns']]
+            if self.conf_dict.get('FullDataStatistics', False):
+                self.stats = self.full_statistics(numeric, categorical)
+                return self.stats
+            summary_num = pd.concat([DescriptiveStatistics.numerical_summary(self.df, numeric[i:i + group_size])
+                                     for i in range(0, len(numeric), group_size)] or
+                                    [DescriptiveStatistics.numerical_summary(self.df, [])])
+            summary_cat = DescriptiveStatistics.categorical_summary(self.df, categorical)
+            self.stats = summary_num.reset_index(), summary_cat.reset_index()
+        return self.stats
+
+    def top_values(self, col):
+        # With FullDataStatistics the statistics pass also counts the most frequent values
+        if self.conf_dict.get('FullDataStatistics', False):
+            self.descriptive_statistics()
+        return super().top_values(col)
+
+    @property
+    def desc_stats_num(self):
+        return self.descriptive_statistics()[0]
+
+    @property
+    def desc_stats_cat(self):
+        return self.descriptive_statistics()[1]
+
+    def dataset_version(self):
+        # The sample files are immutable, their directory identifies the rows
+        key = repr((self.df.directory, self.df.shape, list(self.df.columns), self.conf_dict.get('NumericalColumns'),
+                    self.conf_dict.get('CategoricalColumns'), self.conf_dict.get('Target')))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""gunicorn settings: gunicorn run:server
+
+The app is imported once in the master (preload_app) and the default
+dataset is loaded there into a shared snapshot, see utils/SharedDataset.py.
+Forked workers start with it mapped, and datasets loaded later are written
+once and mapped by every worker.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+# Snapshots and per worker metrics go to the shared cache directory
+os.environ.setdefault('IDEAR_SHARED_MEMORY', '1')
+os.environ.setdefault('IDEAR_METRICS_DIR', os.path.join('.cache', 'metrics'))
+
+
+def on_starting(server):
+    # Counts of the previous server would be added to the new ones
+    import shutil
+
+    shutil.rmtree(os.environ['IDEAR_METRICS_DIR'], ignore_errors=True)
+
+
+def when_ready(server):
+    import run
+
+    run.registry.get()
+    server.log.info("Default dataset loaded in the master")
+
+
+def pre_fork(server, worker):
+    from utils.Prewarm import Prewarm
+
+    Prewarm.wait()
@@ -32,6 +32,28 @@ header = dbc.Row(
     style = {'text-align':'center', "padding":"2% 2% 1% 1%", "background-color":theme_color_code}
 )
 
+## Component 2.1. Dataset selection, also set with the ?dataset=<name> URL parameter
+dataset_selector = dbc.Row(
+    [
+        dbc.Col(
+            [
+                dbc.Label("Dataset:", html_for="dataset-dropdown"),
+                dbc.Select(id="dataset-dropdown")
+            ], width=4
+        )
+    ],
+    style = {"padding":"1% 0% 0% 1%"}
+)
+
+# Progress of an upload (?upload=<job id>), polled until parsing ends
+upload_progress = dbc.Row(
+    [
+        dbc.Col(html.Div(id="upload-progress"), width=8),
+        dcc.Interval(id="upload-interval", interval=1000, disabled=True)
+    ],
+    style = {"padding":"1% 0% 0% 1%"}
+)
+
 # the styles for the main content position it to the right of the sidebar and
 # add some padding.
 CONTENT_STYLE = {
@@ -48,7 +70,8 @@ top_tabs = dbc.Row([
             dcc.Tab(label = "Descriptive Statistics", value = "descriptive-statistics"),
             dcc.Tab(label = "Univariate Analysis", value = "univariate"),
             dcc.Tab(label = "Multivariate Analysis", value = "multivariate"),
-            dcc.Tab(label = "Visualize Numerical Variables", value = "numerical-visualize")
+            dcc.Tab(label = "Visualize Numerical Variables", value = "numerical-visualize"),
+            dcc.Tab(label = "Data Input", value = "data-input")
             ], value = "profile-data", id = "tabs")
         ])
     ], style = {'text-align':'center', "padding":"2% 2% 1% 1%"}
@@ -67,16 +90,29 @@ data_description = dcc.Markdown(id="data_description")
 ### 4.3. Slider
 slider = dbc.FormGroup(
     [
-        dbc.Label("Select number of rows to display from the data", html_for="slider"),
-        dcc.Slider(id="slider", min=1, max=30, step=1, value=5,
-                    marks = {i:i for i in range(1,31)}),
+        dbc.Label("Select number of rows per page", html_for="slider"),
+        dcc.Slider(id="slider", min=5, max=100, step=5, value=10,
+                    marks = {i:str(i) for i in range(10,101,10)}),
     ]
 )
 
 slider_rows = dbc.Form([slider])
 
-### 4.4. Sample data table
-table = html.Div(id="sample_table")
+### 4.4. Sample data table, paged, sorted and filtered on the server
+table = dash_table.DataTable(
+    id="sample_table",
+    page_current=0,
+    page_size=10,
+    page_action="custom",
+    sort_action="custom",
+    sort_mode="single",
+    sort_by=[],
+    filter_action="custom",
+    filter_query="",
+    style_table={"overflowX": "auto"},
+    style_cell={"textAlign": "left"},
+    style_header={"fontWeight": "bold"}
+)
 
 profile_data_layout = dbc.Col(
     [
@@ -273,6 +309,8 @@ cat_correlation_dropdown = dbc.Row(
 
 cat_corr_heatmap = dcc.Graph(id='cat-corr-heatmap')
 
+cat_assoc_heatmap = dcc.Graph(id='cat-assoc-heatmap')
+
 ### 9.3. Interaction between numerical variables
 num_intr_header = html.H4("8. Explore interactions between numerical variables (on sampled data)", id="intr-corr-header")
 
@@ -376,6 +414,7 @@ interactions_layout = dbc.Col(
         cat_correlation_header,
         cat_correlation_dropdown,
         cat_corr_heatmap,
+        cat_assoc_heatmap,
         html.Br(),
         num_intr_header,
         num_intr_dropdown,
@@ -451,13 +490,38 @@ num_viz_layout = dbc.Col(
     ]
 )
 
+## Component 11. Data input layout
+
+### 11.1. Header text
+data_input_header = html.H4("Upload a dataset")
+
+### 11.2. Upload form, a plain HTML form served by the Flask server so that the file
+### is posted as multipart data and parsed in the background
+data_input_form = html.Iframe(src="/upload", style={"width":"100%", "height":"320px", "border":"none"})
+
+data_input_hint = html.P(["Files can also be uploaded without the browser: ",
+                          html.Code("curl -T data.csv -H 'X-Upload-Token: <token>' '<host>/upload/<name>?target=<column>'")])
+
+data_input_layout = dbc.Col(
+    [
+        html.Br(),
+        data_input_header,
+        data_input_form,
+        data_input_hint
+    ], width=8
+)
+
 ## Bring it all together
 layout = dbc.Container(
     [
         dcc.Store(id='memory-output', storage_type='memory'),
+        dcc.Location(id='url', refresh=False),
+        dcc.Store(id='dataset-store', storage_type='memory'),
         dbc.Col(
             [
                 header,
+                dataset_selector,
+                upload_progress,
                 top_tabs,
                 content
             ], align = 'stretch'
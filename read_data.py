@@ -17,9 +17,13 @@ from string import Template
 from functools import partial
 from collections import OrderedDict
 
+from utils.Sampling import ReservoirSampler
+from utils.SQLSource import SQLSource
+
 conf_file = "config.yaml"
-Sample_Size =  10000
 conf_dict = yaml.load(open(conf_file), Loader=yaml.FullLoader)
+Sample_Size = conf_dict.get('Sample_Size', 10000)
+Chunk_Size = conf_dict.get('ChunkSize', 100000)
 
 class data():
 
@@ -28,24 +32,24 @@ class data():
 
     def read_data(self):
         
-        # Read in data from local file or SQL server
+        # Read in data from local file or SQL server, one chunk at a time
         if 'DataSource' not in conf_dict:
-            df=pd.read_csv(conf_dict['DataFilePath'][0], skipinitialspace=True)
+            chunks = pd.read_csv(conf_dict['DataFilePath'][0], skipinitialspace=True, chunksize=Chunk_Size)
+
+            # Sampling Data in a single pass if data size is larger than Sample_Size.
+            # Memory is bounded by the sample size, the unsampled data is never held in memory.
+            df = ReservoirSampler.sample(chunks, Sample_Size, seed=conf_dict.get('Seed'))
         else:
-            import pyodbc
-            cnxn = pyodbc.connect('driver=ODBC Driver 17 for SQL Server;server={};port=1433;database={};Uid={};Pwd={}'.format(
-                    conf_dict['Server'], conf_dict['Database'],conf_dict['Username'],conf_dict['Password']))
-            df = pd.read_sql(conf_dict['Query'],cnxn)
+            # The database draws the sample from a pooled connection, only the configured columns are read
+            columns = None
+            if 'NumericalColumns' in conf_dict and 'CategoricalColumns' in conf_dict:
+                columns = list(OrderedDict.fromkeys(conf_dict['NumericalColumns'] + conf_dict['CategoricalColumns']))
+            df = SQLSource.sample(conf_dict, Sample_Size, seed=conf_dict.get('Seed'), columns=columns,
+                                  chunksize=Chunk_Size)
 
         # Making sure that we are not reading any extra column
         df = df[[each for each in df.columns if 'Unnamed' not in each]]
 
-        # Sampling Data if data size is larger than 10k
-        df0 = df # df0 is the unsampled data. Will be used in data exploration and analysis where sampling is not needed
-                # However, keep in mind that your final report will always be based on the sampled data. 
-        if Sample_Size < df.shape[0]:
-            df = df.sample(Sample_Size)
-
         # change float data types
         if 'FloatDataTypes' in conf_dict:   
             for col_name in conf_dict['FloatDataTypes']:
@@ -5,10 +5,8 @@ import dash_html_components as html
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 import plotly.graph_objs as go
-import plotly.figure_factory as ff
-import plotly.express as px
 
-from urllib.parse import quote as urlquote
+from urllib.parse import quote as urlquote, parse_qs
 import flask
 from flask import Flask, send_from_directory, send_file, request, session, _request_ctx_stack
 
@@ -19,27 +17,125 @@ import os
 import string
 import random
 import re
+import logging
 
 import numpy as np
-import scipy.stats as stats
 
 from layout import layout as desktop_layout
 from layout import profile_data_layout, descriptive_statistics_layout, univariate_layout
-from layout import interactions_layout, num_viz_layout
+from layout import interactions_layout, num_viz_layout, data_input_layout
 
 from callbacks import *
-from data import data
+from data import data, columnar_data
 from utils.MultiVarAnalytics import InteractionAnalytics
-from app import app, server, cache, register_before_request
+from utils.Figures import Figures
+from utils.UnivariateAnalytics import UnivariateAnalytics
+from utils.CallbackCache import CallbackCache
+from utils.DatasetRegistry import DatasetRegistry
+from utils.SharedDataset import SharedDataset
+from utils.DataUpload import DataUpload
+from utils.TableView import TableView
+from utils.Payload import Payload
+from utils.Metrics import Metrics
+from utils.Profiling import Profiling
+from utils.Prewarm import Prewarm
+from app import app, server, cache, compress, register_before_request
 
 app.layout = desktop_layout
 
 from app import app
 
-data_object = data()
+# Datasets are loaded on first use and evicted under the configured memory budget
+def load_dataset(conf_dict):
+    # Out-of-core backend, columns are loaded from memory mapped files as they are used
+    if conf_dict.get('Backend', 'pandas') == 'columnar' and columnar_data.supported(conf_dict):
+        data_object = columnar_data(conf_dict)
 
-df = data_object.df
-conf_dict = data_object.conf_dict
+    # Workers map a snapshot written by the first process loading the dataset
+    elif SharedDataset.enabled(conf_dict):
+        return SharedDataset.load(conf_dict, DatasetRegistry.dataset_name(conf_dict), build_shared_dataset,
+                                  data.attach)
+    else:
+        data_object = data(conf_dict)
+
+    # Optional warm-up of the univariate tab, spread over all cores
+    if data_object.conf_dict.get('PrecomputeOnStartup', False):
+        data_object.warm_up(data_object.conf_dict.get('PrecomputeWorkers'))
+    return data_object
+
+def build_shared_dataset(conf_dict):
+    data_object = data(conf_dict)
+    data_object.precompute(data_object.conf_dict.get('PrecomputeWorkers'))
+    return data_object.shared_state()
+
+conf_dict = data.read_config()
+logging.basicConfig(level=conf_dict.get('LogLevel', 'INFO'), format='%(asctime)s %(name)s %(levelname)s %(message)s')
+registry = DatasetRegistry(conf_dict, load_dataset)
+# PrecomputeOnStartup datasets are loaded and warmed up before serving
+registry.preload()
+
+# Memoize heavy callbacks per dataset version and arguments, the dataset is the last argument
+cache.init_app(app.server, config=CallbackCache.cache_config(conf_dict))
+CallbackCache.register_stats_route(app.server)
+memoize = CallbackCache.memoize(cache, lambda *args: registry.get(args[-1]).version)
+
+# Per callback latency, CPU time, size and cache results at /metrics, before compression
+Metrics.init_app(app, conf_dict)
+
+# Opt-in cProfile and stack sampling of single callback requests, listed at /admin/profiles
+Profiling.init_app(app, conf_dict)
+
+# Compressed responses, fast JSON and figures rounded to FigureSignificantDigits
+Payload.init_app(app, compress, conf_dict)
+slim = Payload.slim(conf_dict.get('FigureSignificantDigits', 6))
+
+# Uploads are saved by the request and parsed in a background process
+DataUpload.register_routes(app.server, conf_dict, reserved_names=registry.configured,
+                           stylesheets=[dbc.themes.BOOTSTRAP])
+
+## 1. Resolve the dataset from the URL (?dataset=<name>) or the dataset dropdown
+@app.callback(
+    [Output('dataset-dropdown', 'options'),
+    Output('dataset-dropdown', 'value')],
+    [Input('url', 'search')]
+)
+def set_dataset_options(search):
+    requested = parse_qs((search or '').lstrip('?')).get('dataset', [None])[0]
+    options = [{"label":name, "value":name} for name in registry.names()]
+    return options, registry.resolve(requested)
+
+@app.callback(
+    Output('dataset-store', 'data'),
+    [Input('dataset-dropdown', 'value')]
+)
+def select_dataset(name):
+    return registry.resolve(name)
+
+## 1.1. Poll the progress of an upload (?upload=<job id>) until it is parsed
+@app.callback(
+    [Output('upload-progress', 'children'),
+    Output('upload-interval', 'disabled')],
+    [Input('url', 'search'),
+    Input('upload-interval', 'n_intervals')]
+)
+def show_upload_progress(search, n_intervals):
+    job_id = parse_qs((search or '').lstrip('?')).get('upload', [None])[0]
+    if job_id is None:
+        return None, True
+
+    status = DataUpload.status(DataUpload.upload_dir(conf_dict), job_id)
+    if status is None:
+        return dbc.Alert("Upload not found", color="warning"), True
+    if status['state'] == 'failed':
+        return dbc.Alert(f"Upload of {status['dataset']} failed: {status.get('message')}", color="danger"), True
+    if status['state'] == 'done':
+        return dbc.Alert([f"{status['dataset']} is ready ({status['rows']} rows). ",
+                          dcc.Link("Open it", href=f"/?dataset={status['dataset']}")], color="success"), True
+
+    read = status.get('bytes_read', 0)
+    total = max(status.get('bytes_total', 0), 1)
+    return [html.Div(f"Parsing {status['dataset']}: {status.get('rows', 0)} rows"),
+            dbc.Progress(value=100 * read / total, striped=True, animated=True)], False
 
 @app.callback(Output("page-content", "children"), [Input("tabs", "value")])
 def render_page_content(tab):
@@ -53,6 +149,8 @@ def render_page_content(tab):
         return interactions_layout
     elif tab == "numerical-visualize":
         return num_viz_layout
+    elif tab == "data-input":
+        return data_input_layout
     
     # If the user tries to reach a different page, return a 404 message
     return dbc.Jumbotron(
@@ -64,25 +162,39 @@ def render_page_content(tab):
     )
 
 
-## 2. Control number of rows in table using slider
+## 2. Page, sort and filter the data table on the server, the slider sets the page size
 @app.callback(
-    Output('sample_table', 'children'),
+    Output('sample_table', 'page_size'),
     [Input('slider', 'value')]
 )
-def generate_sample_table(value):
-    return dbc.Row(
-        [
-            html.P(f"Showing the top {value} rows"),
-            dbc.Table.from_dataframe(df.head(value), striped=True, bordered=True, hover=True, responsive=True)
-        ] 
-    )
+def set_sample_table_page_size(value):
+    return value
+
+@app.callback(
+    [Output('sample_table', 'data'),
+    Output('sample_table', 'columns'),
+    Output('sample_table', 'page_count')],
+    [Input('sample_table', 'page_current'),
+    Input('sample_table', 'page_size'),
+    Input('sample_table', 'sort_by'),
+    Input('sample_table', 'filter_query'),
+    Input('dataset-store', 'data')]
+)
+@memoize
+def generate_sample_table(page_current, page_size, sort_by, filter_query, dataset):
+    data_object = registry.get(dataset)
+    records, page_count = TableView.page(data_object.df, data_object.sort_index, page_current, page_size,
+                                         sort_by, filter_query)
+    return records, TableView.columns(data_object.df), page_count
 
 ## 3. Print data column description from the data
 @app.callback(
     Output('data_description', 'children'),
-    [Input('slider', 'value')]
+    [Input('slider', 'value'),
+    Input('dataset-store', 'data')]
 )
-def generate_data_description(value):
+def generate_data_description(value, dataset):
+    data_object = registry.get(dataset)
     return f'''
         * Target variable is **{data_object.conf_dict['Target']}**
         * Numerical columns are **{", ".join(data_object.conf_dict['NumericalColumns'])}**
@@ -92,26 +204,32 @@ def generate_data_description(value):
 ## 4. Descriptive statistics of numerical variables
 @app.callback(
     Output('summary_num', 'children'),
-    [Input('description-header', 'children')]
+    [Input('description-header', 'children'),
+    Input('dataset-store', 'data')]
 )
-def generate_stats_numerical(value):
+@memoize
+def generate_stats_numerical(value, dataset):
+    data_object = registry.get(dataset)
     return dbc.Row(
         [
             html.P("Descriptive statistics of numerical variables"),
-            dbc.Table.from_dataframe(data_object.desc_stats_num, striped=True, bordered=True, hover=True, responsive=True)
+            TableView.table('summary-num-table', data_object.desc_stats_num)
         ] 
     )
 
 ## 5. Descriptive statistics of categorical variables
 @app.callback(
     Output('summary_cat', 'children'),
-    [Input('description-header', 'children')]
+    [Input('description-header', 'children'),
+    Input('dataset-store', 'data')]
 )
-def generate_stats_categorical(value):
+@memoize
+def generate_stats_categorical(value, dataset):
+    data_object = registry.get(dataset)
     return dbc.Row(
         [
             html.P("Descriptive statistics of categorical variables"),
-            dbc.Table.from_dataframe(data_object.desc_stats_cat, striped=True, bordered=True, hover=True, responsive=True)
+            TableView.table('summary-cat-table', data_object.desc_stats_cat)
         ] 
     )
 
@@ -119,9 +237,11 @@ def generate_stats_categorical(value):
 @app.callback(
     [Output('target-dropdown', 'options'),
     Output('target-dropdown', 'value')],
-    [Input('target-header', 'children')]
+    [Input('target-header', 'children'),
+    Input('dataset-store', 'data')]
 )
-def set_target_dropdown_options(value):
+def set_target_dropdown_options(value, dataset):
+    data_object = registry.get(dataset)
 
     if type(data_object.conf_dict['Target']) == list:
         options = [{"label":target, "value":target} for target in data_object.conf_dict['Target']]
@@ -136,9 +256,14 @@ def set_target_dropdown_options(value):
 @app.callback(
     [Output('target-distribution-bar', 'figure'),
     Output('target-distribution-pie', 'figure')],
-    [Input('target-dropdown', 'value')]
+    [Input('target-dropdown', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_target_distribution(value):
+@memoize
+@slim
+def generate_target_distribution(value, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
     
@@ -153,9 +278,11 @@ def generate_target_distribution(value):
 @app.callback(
     [Output('numerical-dropdown', 'options'),
     Output('numerical-dropdown', 'value')],
-    [Input('numerical-header', 'children')]
+    [Input('numerical-header', 'children'),
+    Input('dataset-store', 'data')]
 )
-def set_numerical_dropdown_options(value):
+def set_numerical_dropdown_options(value, dataset):
+    data_object = registry.get(dataset)
 
     if type(data_object.conf_dict['NumericalColumns']) == list:
         options = [{"label":var, "value":var} for var in data_object.conf_dict['NumericalColumns']]
@@ -174,36 +301,49 @@ def set_numerical_dropdown_options(value):
     Output('num-distribution-kde', 'figure'),
     Output('num-distribution-qq', 'figure'),
     Output('num-distribution-box', 'figure')],
-    [Input('numerical-dropdown', 'value')]
+    [Input('numerical-dropdown', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_numerical_distribution(value):
+@memoize
+@slim
+def generate_numerical_distribution(value, dataset):
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
-    status, color, p_val = data.shapiro_test(df[value])
+    # Normality test, histogram, KDE, quantiles and QQ points are computed once per column
+    summary = data_object.univariate_summary(value)
+
+    # A column without any finite value gets empty plots
+    if summary is None:
+        normality_text = f"Normality test for {value} skipped (no values)"
+        histogram, kdeplot, qqplot, boxplot = go.Figure(), go.Figure(), go.Figure(), go.Figure()
+        for figure, title in [(histogram, f"Histogram of {value}"), (kdeplot, f"KDE plot of {value}"),
+                              (qqplot, f"QQ plot to check normality of {value}"),
+                              (boxplot, f"Boxplot for distribution of {value}")]:
+            figure.update_layout(template=template, title=title)
+        return normality_text, histogram, kdeplot, qqplot, boxplot
+
+    status, color, p_val = summary['normality']
     normality_text = f"Normality test for {value} {status} (p_value = {p_val})"
 
-    histogram = px.histogram(df, x=value, template=template, title=f"Histogram of {value}")
-    histogram.update_layout({"yaxis": {"title": "Frequency"}})
+    histogram = go.Figure(Figures.histogram(summary, value))
+    histogram.update_layout({"xaxis": {"title": f"{value}"}, "yaxis": {"title": "Frequency"}},
+                        template=template, title=f"Histogram of {value}", bargap=0)
 
-    hist_data = [df[value]]
-    group_labels = [value] # name of the dataset
-    kdeplot = ff.create_distplot(hist_data, group_labels, show_hist=False, show_rug=False)
+    kdeplot = go.Figure(Figures.kde(summary, value))
     kdeplot.update_layout({"xaxis": {"title": f"{value}"}, "yaxis": {"title": "Density"}}, 
                         template=template, title=f"KDE plot of {value}")
 
-    qq=stats.probplot(df[value])
-    x = np.array([qq[0][0][0], qq[0][0][-1]])
-
-    qqplot = go.Figure()
-    qqplot.add_scatter(x=qq[0][0], y=qq[0][1], mode='markers')
-    qqplot.add_scatter(x=x, y=qq[1][1] + qq[1][0]*x, mode='lines')
+    qqplot = go.Figure(Figures.qq(summary))
     qqplot.layout.update(showlegend=False)
     qqplot.update_layout({'xaxis': {'title': 'Theoretical Quantities'}, 
                         'yaxis': {'title': 'Ordered Values'}}, template=template, 
                         title=f"QQ plot to check normality of {value}")
 
-    boxplot = px.box(df, y=value, template=template, title=f"Boxplot for distribution of {value}")
+    boxplot = go.Figure(Figures.box(summary, value))
+    boxplot.update_layout({"yaxis": {"title": f"{value}"}}, showlegend=False, template=template,
+                        title=f"Boxplot for distribution of {value}")
 
     return normality_text, histogram, kdeplot, qqplot, boxplot
 
@@ -211,9 +351,11 @@ def generate_numerical_distribution(value):
 @app.callback(
     [Output('categorical-dropdown', 'options'),
     Output('categorical-dropdown', 'value')],
-    [Input('categorical-header', 'children')]
+    [Input('categorical-header', 'children'),
+    Input('dataset-store', 'data')]
 )
-def set_categorical_dropdown_options(value):
+def set_categorical_dropdown_options(value, dataset):
+    data_object = registry.get(dataset)
 
     if type(data_object.conf_dict['CategoricalColumns']) == list:
         options = [{"label":target, "value":target} for target in data_object.conf_dict['CategoricalColumns']]
@@ -226,10 +368,13 @@ def set_categorical_dropdown_options(value):
 ## 11. Dropdown options for categorical variables selection of top n variables
 @app.callback(
     Output('categorical-top-n', 'options'),
-    [Input('categorical-dropdown', 'value')]
+    [Input('categorical-dropdown', 'value')],
+    [State('dataset-store', 'data')]
 )
-def set_categorical_topn_options(value):
-    options = [{"label":target, "value":target} for target in range(1, df[value].nunique() + 1)]
+def set_categorical_topn_options(value, dataset):
+    data_object = registry.get(dataset)
+    # Up to TopCategories values, the rest are shown as one bar
+    options = [{"label":target, "value":target} for target in range(1, len(data_object.top_values(value).counts) + 1)]
     return options
 
 ## 12. Distribution of categorical variables
@@ -237,14 +382,19 @@ def set_categorical_topn_options(value):
     [Output('categorical-distribution-bar', 'figure'),
     Output('categorical-distribution-pie', 'figure')],
     [Input('categorical-dropdown', 'value'),
-    Input('categorical-top-n', 'value')]
+    Input('categorical-top-n', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_categorical_distribution(value1, value2):
+@memoize
+@slim
+def generate_categorical_distribution(value1, value2, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
     # if value2:
-    eng_df = data_object.target_distribution(value1).iloc[:int(value2),:]
+    eng_df = data_object.target_distribution(value1, int(value2))
     # else:
     #     eng_df = data_object.target_distribution(value1)
 
@@ -261,9 +411,11 @@ def generate_categorical_distribution(value1, value2):
 @app.callback(
     [Output('rank-ref-var', 'options'),
     Output('rank-ref-var', 'value')],
-    [Input('rank-header', 'children')]
+    [Input('rank-header', 'children'),
+    Input('dataset-store', 'data')]
 )
-def set_rank_refvar_options(value):
+def set_rank_refvar_options(value, dataset):
+    data_object = registry.get(dataset)
     options = [{"label":target, "value":target} for target in data_object.conf_dict['CategoricalColumns'] +\
                                      data_object.conf_dict['NumericalColumns']]
     return options, (data_object.conf_dict['CategoricalColumns'] + data_object.conf_dict['NumericalColumns'])[0]
@@ -274,9 +426,11 @@ def set_rank_refvar_options(value):
     Output('rank-top-cat', 'options'),
     Output('rank-top-num', 'value'),
     Output('rank-top-cat', 'value')],
-    [Input('rank-ref-var', 'value')]
+    [Input('rank-ref-var', 'value')],
+    [State('dataset-store', 'data')]
 )
-def set_rank_topnum_options(value):
+def set_rank_topnum_options(value, dataset):
+    data_object = registry.get(dataset)
     options_topnum = [{"label":target, "value":target} for target in \
                 range(1, len([var for var in data_object.conf_dict['NumericalColumns'] if var != value]) + 1)]
 
@@ -294,14 +448,20 @@ def set_rank_topnum_options(value):
     Output('rank-variables-cat', 'figure')],
     [Input('rank-ref-var', 'value'),
     Input('rank-top-num', 'value'),
-    Input('rank-top-cat', 'value')]
+    Input('rank-top-cat', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_rank_correlations(refvar, topnum, topcat):
+@memoize
+@slim
+def generate_rank_correlations(refvar, topnum, topcat, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
     corr_num, metric_num, corr_cat, metric_cat = \
-            InteractionAnalytics.rank_associations(data_object.df, data_object.conf_dict, refvar, topnum, topcat)
+            InteractionAnalytics.rank_associations(data_object.df, data_object.conf_dict, refvar, topnum, topcat,
+                                                   cache=data_object.results)
 
     bar_num = px.bar(corr_num, x='Variable', y='Correlation', labels= {'Correlation':f'Correlation ({metric_num})'}, 
                     template=template, title = f"Top {topnum} associated numerical variables")
@@ -317,9 +477,11 @@ def generate_rank_correlations(refvar, topnum, topcat):
     Output('cat-var-2', 'options'),
     Output('cat-var-1', 'value'),
     Output('cat-var-2', 'value')],
-    [Input('cat-corr-header', 'value')]
+    [Input('cat-corr-header', 'value'),
+    Input('dataset-store', 'data')]
 )
-def set_cat_corr_options(value):
+def set_cat_corr_options(value, dataset):
+    data_object = registry.get(dataset)
     options = [{"label":var, "value":var} for var in data_object.conf_dict['CategoricalColumns']]
     default_value_1 = data_object.conf_dict['CategoricalColumns'][0]
     default_value_2 = data_object.conf_dict['CategoricalColumns'][-1]
@@ -329,27 +491,56 @@ def set_cat_corr_options(value):
 @app.callback(
     Output('cat-corr-heatmap', 'figure'),
     [Input('cat-var-1', 'value'),
-    Input('cat-var-2', 'value')]
+    Input('cat-var-2', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_cat_correlations(cat_var_1, cat_var_2):
+@memoize
+@slim
+def generate_cat_correlations(cat_var_1, cat_var_2, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
-    corr_df = InteractionAnalytics.categorical_relations(data_object.df, cat_var_1, cat_var_2)
+    corr_df = InteractionAnalytics.categorical_relations(data_object.df, cat_var_1, cat_var_2,
+                                                         data_object.top_values(cat_var_1).labels(10),
+                                                         data_object.top_values(cat_var_2).labels(10))
     heatmap = px.imshow(corr_df, template=template, labels=dict(color="Co-occurence Frequency"),
                 title = f'{cat_var_1} vs {cat_var_2}')
 
     return heatmap
 
+## 17.1. Cramer's V heatmap among all categorical variables
+@app.callback(
+    Output('cat-assoc-heatmap', 'figure'),
+    [Input('cat-corr-header', 'children'),
+    Input('dataset-store', 'data')]
+)
+@memoize
+@slim
+def generate_cat_associations(value, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
+
+    template = "plotly_white"
+
+    cramer_df = data_object.cramers_v()
+    heatmap = px.imshow(cramer_df, template=template, labels=dict(color="Cramer's V"), zmin=0, zmax=1,
+                title = "Cramer's V (bias corrected) among categorical variables")
+
+    return heatmap
+
 ## 18. Dropdown options for numerical correlations
 @app.callback(
     [Output('intr-var-1', 'options'),
     Output('intr-var-2', 'options'),
     Output('intr-var-1', 'value'),
     Output('intr-var-2', 'value')],
-    [Input('intr-corr-header', 'value')]
+    [Input('intr-corr-header', 'value'),
+    Input('dataset-store', 'data')]
 )
-def set_num_corr_options(value):
+def set_num_corr_options(value, dataset):
+    data_object = registry.get(dataset)
     options = [{"label":var, "value":var} for var in data_object.conf_dict['NumericalColumns']]
     default_value_1 = data_object.conf_dict['NumericalColumns'][0]
     default_value_2 = data_object.conf_dict['NumericalColumns'][-1]
@@ -359,18 +550,30 @@ def set_num_corr_options(value):
 @app.callback(
     Output('num-intr-scatter', 'figure'),
     [Input('intr-var-1', 'value'),
-    Input('intr-var-2', 'value')]
+    Input('intr-var-2', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_num_interactions(num_var_1, num_var_2):
+@memoize
+@slim
+def generate_num_interactions(num_var_1, num_var_2, dataset):
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
-    lowess, ols, corr = InteractionAnalytics.numerical_relations(data_object.df, num_var_1, num_var_2)
+    lowess, ols, corr = InteractionAnalytics.numerical_relations(data_object.df, num_var_1, num_var_2,
+                                                                 cache=data_object.results)
 
+    # Above the threshold the points are binned server side and drawn as a density heatmap
+    points_df = data_object.full_columns(list(dict.fromkeys([num_var_1, num_var_2])))
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=data_object.df[num_var_2], y=data_object.df[num_var_1],
-                        mode='markers',
-                        name='Data Points'))
+    if points_df.shape[0] > data_object.conf_dict.get('ScatterPointThreshold', 100000):
+        grid = InteractionAnalytics.density_grid(points_df, num_var_2, num_var_1,
+                                                 bins=data_object.conf_dict.get('DensityBins', 200))
+        fig.add_trace(Figures.density_heatmap(grid))
+    else:
+        fig.add_trace(go.Scatter(x=points_df[num_var_2], y=points_df[num_var_1],
+                            mode='markers',
+                            name='Data Points'))
 
     fig.add_trace(go.Scatter(x=lowess['x'], y=lowess['lowess'],
                         mode='lines',
@@ -392,13 +595,18 @@ def generate_num_interactions(num_var_1, num_var_2):
 ## 20. Numerical correlation heatmap
 @app.callback(
     Output('num-corr-heatmap', 'figure'),
-    [Input('num-var-method', 'value')]
+    [Input('num-var-method', 'value'),
+    Input('dataset-store', 'data')]
 )
-def generate_num_correlations(method):
+@memoize
+@slim
+def generate_num_correlations(method, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
-    corr_df = InteractionAnalytics.numerical_correlation(data_object.df, data_object.conf_dict, method)
+    corr_df = data_object.numerical_correlation(method)
     heatmap = px.imshow(corr_df, template=template, labels=dict(color="Corelation"),
                 title = f'{method} correlation among numerical variables')
 
@@ -410,9 +618,11 @@ def generate_num_correlations(method):
     Output('num-cat-intr-cat', 'options'),
     Output('num-cat-intr-num', 'value'),
     Output('num-cat-intr-cat', 'value')],
-    [Input('num-cat-intr-header', 'value')]
+    [Input('num-cat-intr-header', 'value'),
+    Input('dataset-store', 'data')]
 )
-def set_num_corr_options(value):
+def set_num_corr_options(value, dataset):
+    data_object = registry.get(dataset)
     options_num = [{"label":var, "value":var} for var in data_object.conf_dict['NumericalColumns']]
     options_cat = [{"label":var, "value":var} for var in data_object.conf_dict['CategoricalColumns']]
 
@@ -425,14 +635,25 @@ def set_num_corr_options(value):
 @app.callback(
     Output('num-cat-intr-plot', 'figure'),
     [Input('num-cat-intr-num', 'value'),
-    Input('num-cat-intr-cat', 'value')]
+    Input('num-cat-intr-cat', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_num_cat_interactions(num_var, cat_var):
+@memoize
+@slim
+def generate_num_cat_interactions(num_var, cat_var, dataset):
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
 
     status, p_val = InteractionAnalytics.nc_relation(data_object.df, data_object.conf_dict, num_var, cat_var)
-    boxplot = px.box(data_object.df, y=num_var, x=cat_var, template=template, 
+
+    # Quartiles, fences and outliers per category instead of every point
+    boxplot = go.Figure()
+    for category, values in data_object.df[[cat_var, num_var]].groupby(cat_var, observed=True, sort=True)[num_var]:
+        values = np.sort(values.dropna().to_numpy(dtype='float64'))
+        if len(values):
+            boxplot.add_traces(Figures.box(UnivariateAnalytics.box(values), str(category)))
+    boxplot.update_layout(template=template, showlegend=False, xaxis_title=cat_var, yaxis_title=num_var,
             title=f"Boxplot for distribution of {num_var} by {cat_var} \n ho {status} (p-value = {p_val})")
 
     return boxplot
@@ -445,9 +666,11 @@ def generate_num_cat_interactions(num_var, cat_var):
     Output('num-num-cat-intr-num-1', 'value'),
     Output('num-num-cat-intr-num-2', 'value'),
     Output('num-num-cat-intr-cat', 'value')],
-    [Input('num-cat-intr-header', 'value')]
+    [Input('num-cat-intr-header', 'value'),
+    Input('dataset-store', 'data')]
 )
-def set_num_num_cat_options(value):
+def set_num_num_cat_options(value, dataset):
+    data_object = registry.get(dataset)
     options_num = [{"label":var, "value":var} for var in data_object.conf_dict['NumericalColumns']]
     options_cat = [{"label":var, "value":var} for var in data_object.conf_dict['CategoricalColumns']]
 
@@ -462,12 +685,27 @@ def set_num_num_cat_options(value):
     Output('num-num-cat-intr-plot', 'figure'),
     [Input('num-num-cat-intr-num-1', 'value'),
     Input('num-num-cat-intr-num-2', 'value'),
-    Input('num-num-cat-intr-cat', 'value')]
+    Input('num-num-cat-intr-cat', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_num_cat_interactions(num_var_1, num_var_2, cat_var):
+@memoize
+@slim
+def generate_num_num_cat_interactions(num_var_1, num_var_2, cat_var, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
-    scatterplot = px.scatter(data_object.df, x=num_var_2, y=num_var_1, color=cat_var, template=template)
+
+    points_df = data_object.full_columns(list(dict.fromkeys([num_var_1, num_var_2, cat_var])))
+    if points_df.shape[0] > data_object.conf_dict.get('ScatterPointThreshold', 100000):
+        # Per category counts on a shared grid, one marker per non-empty bin
+        grid = InteractionAnalytics.density_grid(points_df, num_var_2, num_var_1, cat_var,
+                                                 bins=data_object.conf_dict.get('DensityBins', 200))
+        scatterplot = go.Figure(Figures.density_scatter(grid))
+        scatterplot.update_layout(xaxis_title=num_var_2, yaxis_title=num_var_1, legend_title=cat_var,
+                                  template=template)
+    else:
+        scatterplot = px.scatter(points_df, x=num_var_2, y=num_var_1, color=cat_var, template=template)
 
     return scatterplot
 
@@ -481,17 +719,23 @@ def generate_num_cat_interactions(num_var_1, num_var_2, cat_var):
     Output('num-viz-cat', 'value'),
     Output('num-viz-pc-x', 'value'),
     Output('num-viz-pc-y', 'value')],
-    [Input('num-viz-header', 'value')]
+    [Input('num-viz-header', 'value'),
+    Input('dataset-store', 'data')]
 )
-def set_num_viz_dropdown_options(value):
+def set_num_viz_dropdown_options(value, dataset):
+    data_object = registry.get(dataset)
     options_cat = [{"label":var, "value":var} for var in data_object.conf_dict['CategoricalColumns']]
     default_value_cat = data_object.conf_dict['CategoricalColumns'][0]
 
+    num_components = len(data_object.conf_dict['NumericalColumns'])
+    if data_object.conf_dict.get('PCAComponents'):
+        num_components = min(num_components, int(data_object.conf_dict['PCAComponents']))
+
     pc_dropdown_options = [{"label":var, "value":var} for var in \
-                    range(1, len(data_object.conf_dict['NumericalColumns']) + 1)]
+                    range(1, num_components + 1)]
 
     pc_dropdown_default_1 = 1
-    pc_dropdown_default_2 = len(data_object.conf_dict['NumericalColumns'])
+    pc_dropdown_default_2 = num_components
 
     return options_cat, options_cat, pc_dropdown_options, pc_dropdown_options, default_value_cat, default_value_cat, pc_dropdown_default_1, pc_dropdown_default_2
 
@@ -503,24 +747,38 @@ def set_num_viz_dropdown_options(value):
     [Input('num-viz-3d-cat', 'value'),
     Input('num-viz-cat', 'value'),
     Input('num-viz-pc-x', 'value'),
-    Input('num-viz-pc-y', 'value')]
+    Input('num-viz-pc-y', 'value')],
+    [State('dataset-store', 'data')]
 )
-def generate_3d_pca(cat_var_3d, cat_var_2d, pc_x, pc_y):
+@memoize
+@slim
+def generate_3d_pca(cat_var_3d, cat_var_2d, pc_x, pc_y, dataset):
+    import plotly.express as px
+    data_object = registry.get(dataset)
 
     template = "plotly_white"
-    pc_df, explained_variance = InteractionAnalytics.pca_3d(data_object.df, data_object.conf_dict, cat_var_3d, int(pc_x), int(pc_y))
-    pc_df_2d, _ = InteractionAnalytics.pca_3d(data_object.df, data_object.conf_dict, cat_var_2d, int(pc_x), int(pc_y))
 
+    # One cached fit, the colour columns are looked up on the scores
+    pc_df, explained_variance = InteractionAnalytics.pca_3d(data_object.df, data_object.conf_dict, cat_var_3d, int(pc_x), int(pc_y),
+                                                            cache=data_object.results)
+    pc_df[cat_var_2d] = data_object.df[cat_var_2d].loc[pc_df.index]
 
-    plot_3d = px.scatter_3d(pc_df, x='PC1', y='PC2', z='PC3', color=cat_var_3d, template=template)
+    if explained_variance.shape[0] >= 3:
+        plot_3d = px.scatter_3d(pc_df, x='PC1', y='PC2', z='PC3', color=cat_var_3d, template=template)
+    else:
+        plot_3d = px.scatter(pc_df, x='PC1', y=pc_df.columns[explained_variance.shape[0] - 1],
+                             color=cat_var_3d, template=template)
 
     plot_variance = px.bar(explained_variance, x='Component', y='Variance', template=template)
 
-    plot_2d_pca = px.scatter(pc_df_2d, x='PC'+str(pc_x), y='PC'+str(pc_y), color=cat_var_2d, template=template)
+    plot_2d_pca = px.scatter(pc_df, x='PC'+str(pc_x), y='PC'+str(pc_y), color=cat_var_2d, template=template)
 
     return plot_3d, plot_variance, plot_2d_pca
 
 
+# Optionally import the analytics backends in the background, they are imported lazily otherwise
+Prewarm.start(conf_dict)
+
 if __name__ == '__main__':
     # app.server.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
     app.server.run(debug = True)
\ No newline at end of file
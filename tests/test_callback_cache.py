@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from utils.CallbackCache import CallbackCache, LRUCache
+
+
+def test_memoize_counts_every_hit_and_miss_across_threads():
+    calls = []
+
+    @CallbackCache.memoize(LRUCache(threshold=100), lambda *args: 'v1')
+    def callback_under_test(value):
+        calls.append(value)
+        return value * 2
+
+    def run():
+        for value in range(10):
+            assert callback_under_test(value) == value * 2
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counts = CallbackCache.stats()['callbacks']['callback_under_test']
+    assert counts['hits'] + counts['misses'] == 80
+    assert counts['misses'] == len(calls)
+
+
+def test_redis_backend_requires_the_redis_package():
+    try:
+        import redis    # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError, match='redis package'):
+            CallbackCache.cache_config({'CacheType': 'redis'})
+    else:
+        assert CallbackCache.cache_config({'CacheType': 'redis'})['CACHE_TYPE'] == 'redis'
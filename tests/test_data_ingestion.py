@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from utils.DataIngestion import DataIngestion
+
+pa = pytest.importorskip('pyarrow')
+
+
+def build(tmp_path, text, chunksize=5):
+    source = tmp_path / 'data.csv'
+    source.write_text(text)
+    target = DataIngestion.build_cache(str(source), str(tmp_path / 'cache'), chunksize=chunksize)
+    return pa.parquet.read_schema(target), pd.read_parquet(target)
+
+
+def test_integer_column_meeting_a_decimal_is_widened_to_float(tmp_path):
+    schema, df = build(tmp_path, 'a,b\n1,x\n2,x\n3,y\n4,y\n5,z\n12.5,z\n')
+    assert schema.field('a').type == pa.float64()
+    assert df['a'].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0, 12.5]
+    assert schema.field('b').type == pa.string()
+
+
+def test_boolean_column_meeting_a_number_is_widened_to_float(tmp_path):
+    schema, df = build(tmp_path, 'a\nTrue\nFalse\nTrue\nFalse\nTrue\n2.5\n')
+    assert schema.field('a').type == pa.float64()
+    assert df['a'].tolist() == [1.0, 0.0, 1.0, 0.0, 1.0, 2.5]
+
+
+def test_numerical_column_meeting_text_is_widened_to_string(tmp_path):
+    schema, df = build(tmp_path, 'a\n1\n2\n3\n4\n5\n1.5\nn/a?\n', chunksize=5)
+    assert schema.field('a').type == pa.string()
+    assert df['a'].tolist() == ['1', '2', '3', '4', '5', '1.5', 'n/a?']
+
+
+def test_columns_fitting_the_first_chunk_keep_their_type(tmp_path):
+    schema, df = build(tmp_path, 'a,b\n1,0.5\n2,1.5\n3,2.5\n4,3.5\n5,4.5\n6,\n')
+    assert schema.field('a').type == pa.int64()
+    assert schema.field('b').type == pa.float64()
+    assert df['b'].isna().sum() == 1
@@ -0,0 +1,65 @@
+import io
+import json
+import os
+
+import flask
+import pytest
+
+from utils.DataUpload import DataUpload
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(DataUpload, 'start', staticmethod(lambda conf_dict, name, path, target=None: 'job'))
+    server = flask.Flask(__name__)
+    DataUpload.register_routes(server, {'UploadDirectory': str(tmp_path), 'UploadToken': 'secret',
+                                        'MaxUploadMB': 1, 'MaxPendingUploads': 1},
+                               reserved_names={'titanic'})
+    return server.test_client()
+
+
+def put(client, name, headers=None, data=b'a,b\n1,2\n'):
+    return client.put(f'/upload/{name}', data=data, headers=headers or {})
+
+
+def test_uploads_require_the_token(client):
+    assert put(client, 'iris').status_code == 403
+    assert put(client, 'iris', {'X-Upload-Token': 'wrong'}).status_code == 403
+    response = put(client, 'iris', {'X-Upload-Token': 'secret'})
+    assert response.status_code == 202
+    assert response.get_json() == {'dataset': 'iris', 'job': 'job'}
+
+
+def test_form_uploads_require_the_token(client):
+    def post(token):
+        return client.post('/upload', content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(b'a,b\n1,2\n'), 'iris.csv'), 'token': token})
+    assert post('wrong').status_code == 403
+    assert post('secret').status_code == 302
+
+
+def test_existing_names_are_refused(client, tmp_path):
+    os.makedirs(tmp_path / 'datasets')
+    with open(tmp_path / 'datasets' / 'iris.json', 'w') as f:
+        json.dump({}, f)
+    assert put(client, 'iris', {'X-Upload-Token': 'secret'}).status_code == 409
+    assert put(client, 'titanic', {'X-Upload-Token': 'secret'}).status_code == 400
+
+
+def test_pending_uploads_are_bounded(client, tmp_path):
+    DataUpload.write_status(str(tmp_path), 'abc', state='parsing', dataset='wine')
+    assert put(client, 'wine', {'X-Upload-Token': 'secret'}).status_code == 409
+    assert put(client, 'iris', {'X-Upload-Token': 'secret'}).status_code == 429
+
+
+def test_large_uploads_are_refused(client):
+    response = put(client, 'iris', {'X-Upload-Token': 'secret'}, data=b'0' * (2 * 2 ** 20))
+    assert response.status_code == 413
+
+
+def test_uploads_are_disabled_without_a_token(tmp_path):
+    server = flask.Flask(__name__)
+    DataUpload.register_routes(server, {'UploadDirectory': str(tmp_path)})
+    client = server.test_client()
+    assert b'disabled' in client.get('/upload').data
+    assert put(client, 'iris', {'X-Upload-Token': ''}).status_code == 403
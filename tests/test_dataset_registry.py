@@ -0,0 +1,49 @@
+import threading
+import time
+
+from utils.DatasetRegistry import DatasetRegistry
+
+
+class Loaded():
+
+    def __init__(self, conf_dict):
+        self.conf_dict = conf_dict
+
+    def memory_usage(self):
+        return 0
+
+
+def slow_loader(calls):
+    def load(conf_dict):
+        calls.append(conf_dict['DataFilePath'])
+        time.sleep(0.05)
+        return Loaded(conf_dict)
+    return load
+
+
+def test_concurrent_requests_load_a_dataset_once(tmp_path):
+    calls = []
+    registry = DatasetRegistry({'DataFilePath': 'data/a.csv', 'UploadDirectory': str(tmp_path)},
+                               slow_loader(calls))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get('a'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['data/a.csv']
+    assert all(result is results[0] for result in results)
+
+
+def test_preload_loads_the_datasets_precomputed_on_startup(tmp_path):
+    calls = []
+    conf_dict = {'UploadDirectory': str(tmp_path), 'DefaultDataset': 'b',
+                 'Datasets': {'a': {'DataFilePath': 'data/a.csv'},
+                              'b': {'DataFilePath': 'data/b.csv', 'PrecomputeOnStartup': True},
+                              'c': {'DataFilePath': 'data/c.csv', 'PrecomputeOnStartup': True}}}
+    registry = DatasetRegistry(conf_dict, slow_loader(calls))
+    registry.preload()
+
+    assert calls == ['data/b.csv', 'data/c.csv']
+    assert list(registry.loaded) == ['b', 'c']
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import import_budget
+
+
+@pytest.fixture(scope='module')
+def measured(tmp_path_factory):
+    work_dir = import_budget.prepare(str(tmp_path_factory.mktemp('import_budget')))
+    # The fastest of a few fresh interpreters, as the script does
+    return min((import_budget.measure(work_dir) for _ in range(3)), key=lambda item: item[0])
+
+
+def test_run_imports_within_the_budget(measured):
+    total, _ = measured
+    assert total <= import_budget.default_budget_ms, \
+        f'import run took {total:.0f} ms, over the {import_budget.default_budget_ms:.0f} ms budget'
+
+
+def test_analytics_backends_are_not_imported_at_startup(measured):
+    _, imports = measured
+    assert import_budget.eager_lazy_modules(imports, import_budget.lazy_modules) == []
+    assert any(item['module'] == 'run' for item in imports)
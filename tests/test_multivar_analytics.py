@@ -0,0 +1,40 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.stats.contingency import association
+
+from utils.MultiVarAnalytics import InteractionAnalytics
+
+
+def dense_cramers_v(x, y):
+    valid = x.notna() & y.notna()
+    table = pd.crosstab(x[valid], y[valid]).to_numpy()
+    return association(table, method='cramer')
+
+
+def test_cramers_v_of_a_high_cardinality_pair_matches_scipy():
+    rng = np.random.default_rng(0)
+    n = 100000
+    a = rng.integers(0, 2000, n)
+    df = pd.DataFrame({'a': a.astype(str), 'b': ((a + rng.integers(0, 40, n)) % 1500).astype(str),
+                       'c': rng.choice(['x', 'y', 'z'], n)})
+    df.loc[rng.random(n) < 0.05, 'b'] = None
+
+    result = InteractionAnalytics.compute_cramers_v(df, ['a', 'b', 'c'], bias_correction=False)
+    for x, y in [('a', 'b'), ('a', 'c'), ('b', 'c')]:
+        np.testing.assert_allclose(result.loc[x, y], dense_cramers_v(df[x], df[y]), rtol=1e-9)
+        assert result.loc[x, y] == result.loc[y, x]
+
+
+def test_cramers_v_memory_does_not_follow_the_table_size():
+    rng = np.random.default_rng(1)
+    n = 200000
+    df = pd.DataFrame({'a': rng.integers(0, 10000, n), 'b': rng.integers(0, 10000, n)})
+    tracemalloc.start()
+    result = InteractionAnalytics.compute_cramers_v(df, ['a', 'b'])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # A dense 10k x 10k table of counts alone is 800 MB
+    assert peak < 100 * 2 ** 20
+    assert 0 <= result.loc['a', 'b'] < 0.1
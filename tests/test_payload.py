@@ -0,0 +1,20 @@
+import json
+
+import numpy as np
+
+from utils.Payload import Payload
+
+
+def test_round_array_keeps_significant_digits_of_every_value():
+    values = np.array([1.23456789e4, 3.14159265e-3, -2.71828183e-7, 0.0, np.nan, np.inf, 987654321.123])
+    rounded = Payload.round_array(values, 6)
+    expected = [12345.7, 0.00314159, -2.71828e-07, 0.0, np.nan, np.inf, 987654000.0]
+    np.testing.assert_array_equal(rounded, expected)
+    # The rounded decimals are also the shortest representation of the doubles
+    assert json.dumps(rounded[:3].tolist()) == '[12345.7, 0.00314159, -2.71828e-07]'
+
+
+def test_round_array_leaves_other_arrays_alone():
+    assert Payload.round_array(np.arange(5)).dtype.kind == 'i'
+    assert Payload.round_array(np.array([], dtype='float64')).size == 0
+    assert Payload.round_array(np.array([1.23456789], dtype='float32'), 3).dtype == np.float32
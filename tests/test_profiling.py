@@ -0,0 +1,26 @@
+import dash
+import dash_html_components as html
+
+from utils.Profiling import Profiling
+
+
+def dash_app(conf_dict):
+    app = dash.Dash(__name__)
+    app.layout = html.Div(id='root')
+    Profiling.init_app(app, conf_dict)
+    return app.server
+
+
+def test_profiling_is_not_registered_without_a_token(tmp_path):
+    server = dash_app({'Profiling': True, 'ProfileDirectory': str(tmp_path)})
+    # Dash serves its index page on any other path
+    assert not any(rule.rule.startswith('/admin/profiles') for rule in server.url_map.iter_rules())
+
+
+def test_admin_routes_require_the_token(tmp_path):
+    server = dash_app({'Profiling': True, 'ProfileToken': 'secret', 'ProfileDirectory': str(tmp_path)})
+    client = server.test_client()
+    assert client.get('/admin/profiles').status_code == 403
+    assert client.get('/admin/profiles?token=wrong').status_code == 403
+    assert client.get('/admin/profiles', headers={'X-Profile': 'wrong'}).status_code == 403
+    assert client.get('/admin/profiles?token=secret').status_code == 200
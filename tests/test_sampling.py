@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from utils.Sampling import ReservoirSampler
+
+
+def chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+def stream(n=20000, strata=('a',) * 6 + ('b',) * 3 + ('c',), seed=0):
+    rng = np.random.default_rng(seed)
+    # Sorted on the stratum, the order in which sources are often written
+    return pd.DataFrame({'x': np.arange(n), 's': np.sort(rng.choice(list(strata), n))})
+
+
+def test_uniform_sample_has_the_requested_size_and_no_duplicates():
+    df = stream()
+    sample = ReservoirSampler.sample(chunks(df, 3000), 500, seed=1)
+    assert len(sample) == 500
+    assert sample.index.is_unique
+    assert (df.loc[sample.index, 'x'] == sample['x']).all()
+
+
+def test_sample_does_not_depend_on_the_chunk_size():
+    df = stream()
+    first = ReservoirSampler.sample(chunks(df, 1000), 300, seed=3, stratify='s')
+    second = ReservoirSampler.sample(chunks(df, 7000), 300, seed=3, stratify='s')
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_stratified_sample_is_proportional():
+    df = stream()
+    sample = ReservoirSampler.sample(chunks(df, 2000), 1000, seed=2, stratify='s')
+    expected = df['s'].value_counts() * 1000 / len(df)
+    assert len(sample) == 1000
+    assert (sample['s'].value_counts().reindex(expected.index) - expected).abs().max() <= 1
+
+
+def test_stratified_sample_matches_an_unbounded_reservoir():
+    df = stream()
+    bounded = ReservoirSampler.sample(chunks(df, 2000), 1000, seed=4, stratify='s')
+    unbounded = ReservoirSampler(1000, seed=4, stratify='s', oversample=len(df), stratum_floor=len(df))
+    for chunk in chunks(df, 2000):
+        unbounded.update(chunk)
+    pd.testing.assert_frame_equal(bounded, unbounded.result())
+
+
+def test_stratified_reservoir_memory_is_split_across_strata():
+    n, sample_size = 50000, 200
+    df = pd.DataFrame({'x': np.arange(n), 's': np.arange(n) % 1000})
+    sampler = ReservoirSampler(sample_size, seed=5, stratify='s')
+    largest = 0
+    for chunk in chunks(df, 5000):
+        sampler.update(chunk)
+        largest = max(largest, len(sampler.reservoir))
+    assert largest <= (sampler.oversample + 1) * sample_size
+    assert len(sampler.result()) == sample_size
+
+
+def test_continuous_stratify_column_does_not_grow_the_reservoir():
+    rng = np.random.default_rng(8)
+    df = pd.DataFrame({'x': np.arange(40000), 's': rng.random(40000)})
+    sampler = ReservoirSampler(300, seed=8, stratify='s')
+    for chunk in chunks(df, 4000):
+        sampler.update(chunk)
+        assert len(sampler.reservoir) <= (sampler.oversample + 1) * 300
+    sample = sampler.result()
+    assert len(sample) == 300 and sample.index.is_unique
+
+
+def test_missing_stratum_values_are_a_stratum_of_their_own():
+    df = stream()
+    df['s'] = df['s'].where(df['x'] % 4 != 0)
+    sample = ReservoirSampler.sample(chunks(df, 3000), 400, seed=6, stratify='s')
+    assert len(sample) == 400
+    assert sample['s'].isna().sum() == 100
+
+    df['s'] = np.nan
+    sample = ReservoirSampler.sample(chunks(df, 3000), 400, seed=6, stratify='s')
+    assert len(sample) == 400 and sample.index.is_unique
+
+
+def test_small_streams_are_kept_whole():
+    df = stream(n=50)
+    assert len(ReservoirSampler.sample(chunks(df, 20), 100, seed=7, stratify='s')) == 50
+    assert ReservoirSampler.sample(iter([]), 100).empty
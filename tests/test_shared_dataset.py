@@ -0,0 +1,41 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from utils.SharedDataset import SharedDataset
+
+
+def table(path, rows):
+    with sqlite3.connect(path) as cnxn:
+        pd.DataFrame({'a': range(rows), 'updated': range(rows)}).to_sql('t', cnxn, index=False, if_exists='replace')
+
+
+def test_sql_snapshot_key_follows_the_table(tmp_path):
+    path = str(tmp_path / 'data.db')
+    conf_dict = {'DataSource': 'sqlite', 'DatabasePath': path, 'Table': 't', 'VersionColumn': 'updated'}
+    table(path, 10)
+    first = SharedDataset.key(conf_dict)
+    assert SharedDataset.key(conf_dict) == first
+    table(path, 11)
+    assert SharedDataset.key(conf_dict) != first
+
+
+def test_new_snapshot_removes_the_older_ones(tmp_path):
+    conf_dict = {'SharedDirectory': str(tmp_path), 'Version': 1}
+    df = pd.DataFrame({'x': [1.0, 2.0]})
+    build = lambda conf_dict: (df, {}, {'version': conf_dict['Version']})
+    attach = lambda df, arrays, artifacts: artifacts['version']
+
+    assert SharedDataset.load(conf_dict, 'data', build, attach) == 1
+    # Another dataset whose name starts the same is kept
+    assert SharedDataset.load(dict(conf_dict, Version=5), 'data-2', build, attach) == 5
+    conf_dict['Version'] = 2
+    assert SharedDataset.load(conf_dict, 'data', build, attach) == 2
+
+    snapshots = {entry for entry in os.listdir(tmp_path) if not entry.endswith('.lock')}
+    assert snapshots == {f'data-{SharedDataset.key(conf_dict)}',
+                         f"data-2-{SharedDataset.key(dict(conf_dict, Version=5))}"}
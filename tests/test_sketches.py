@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from utils.DescriptiveStatistics import DescriptiveStatistics
+from utils.Sketches import HyperLogLog, Moments, StreamingProfile, TDigest
+
+
+def chunks(df, size):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+def frame(n=30000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'normal': rng.normal(100, 15, n),
+        'skewed': rng.lognormal(0, 1, n),
+        'ints': rng.integers(0, 50, n).astype('float64'),
+        'empty': np.nan,
+        'city': rng.choice(['a', 'b', 'c', 'd'], n, p=[0.5, 0.3, 0.15, 0.05]),
+        'code': pd.Series(rng.integers(0, 20000, n)).astype(str),
+        'none': pd.Series([None] * n, dtype='object'),
+    })
+    df.loc[rng.random(n) < 0.05, 'normal'] = np.nan
+    df.loc[rng.random(n) < 0.05, 'city'] = None
+    return df
+
+
+def test_moments_match_describe_and_merge_in_any_order():
+    df = frame()
+    X = df[['normal', 'skewed', 'empty']].to_numpy()
+    whole = Moments(3).update(X)
+    parts = [Moments(3).update(X[start:start + 7000]) for start in range(0, len(X), 7000)]
+    merged = Moments(3)
+    for part in reversed(parts):
+        merged.merge(part)
+
+    expected = df[['normal', 'skewed']].describe()
+    for moments in (whole, merged):
+        np.testing.assert_allclose(moments.mean[:2], expected.loc['mean'], rtol=1e-10)
+        np.testing.assert_allclose(moments.std()[:2], expected.loc['std'], rtol=1e-10)
+        np.testing.assert_array_equal(moments.min[:2], expected.loc['min'])
+        np.testing.assert_array_equal(moments.count, [expected.loc['count', 'normal'], len(df), 0])
+        assert np.isnan(moments.std()[2]) and moments.min[2] == np.inf
+
+
+def test_tdigest_is_exact_below_the_buffer_and_close_above():
+    x = frame()['skewed'].to_numpy()
+    quantiles = [0.01, 0.25, 0.5, 0.75, 0.99]
+    small = TDigest().add(x[:5000])
+    np.testing.assert_allclose(small.quantile(quantiles), np.quantile(x[:5000], quantiles))
+
+    digest = TDigest()
+    for part in np.array_split(x, 10):
+        digest.add(part)
+    merged = TDigest()
+    for part in np.array_split(x, 3):
+        merged.merge(TDigest().add(part))
+    for sketch in (digest, merged):
+        # Within a small fraction of the ranks of the true quantile
+        ranks = np.searchsorted(np.sort(x), sketch.quantile(quantiles)) / len(x)
+        np.testing.assert_allclose(ranks, quantiles, atol=0.005)
+    assert np.isnan(TDigest().add(np.full(10, np.nan)).quantile([0.5])).all()
+
+
+def test_hyperloglog_counts_distinct_values():
+    codes = frame()['code']
+    small = HyperLogLog().add(codes[:1000])
+    assert small.count() == codes[:1000].nunique()
+
+    sketch = HyperLogLog().add(codes)
+    merged = HyperLogLog()
+    for part in chunks(codes, 4000):
+        merged.merge(HyperLogLog().add(part))
+    for estimate in (sketch.count(), merged.count()):
+        assert abs(estimate - codes.nunique()) / codes.nunique() < 0.03
+    assert HyperLogLog().count() == 0
+
+
+def test_streaming_profile_matches_the_in_memory_summary():
+    df = frame()
+    numerical, categorical = ['normal', 'skewed', 'ints', 'empty'], ['city', 'code', 'none']
+    profile = StreamingProfile(numerical, categorical)
+    for chunk in chunks(df, 6000):
+        profile.update(chunk)
+    merged = StreamingProfile(numerical, categorical)
+    for chunk in chunks(df, 9000):
+        merged.merge(StreamingProfile(numerical, categorical).update(chunk))
+
+    exact_num = DescriptiveStatistics.numerical_summary(df, numerical)
+    exact_cat = DescriptiveStatistics.categorical_summary(df, categorical)
+    for sketch in (profile, merged):
+        num, cat = sketch.numerical_summary(), sketch.categorical_summary()
+        pd.testing.assert_series_equal(num['count'], exact_num['count'])
+        pd.testing.assert_series_equal(num['missing'], exact_num['missing'], check_dtype=False)
+        pd.testing.assert_frame_equal(num[['mean', 'std', 'min', 'max']], exact_num[['mean', 'std', 'min', 'max']],
+                                      rtol=1e-9)
+        quantiles = ['25%', '50%', '75%']
+        pd.testing.assert_frame_equal(num.loc[['normal', 'skewed'], quantiles],
+                                      exact_num.loc[['normal', 'skewed'], quantiles], rtol=0.01)
+        # Interpolated between centroids, a quantile of integers lies within one step
+        assert (num.loc['ints', quantiles] - exact_num.loc['ints', quantiles]).abs().max() <= 1
+        assert num.loc['ints', 'unique'] == df['ints'].nunique()
+        assert abs(cat.loc['code', 'unique'] - df['code'].nunique()) / df['code'].nunique() < 0.03
+        assert cat.loc['city', 'unique'] == df['city'].nunique()
+        pd.testing.assert_series_equal(cat['missing'], exact_cat['missing'], check_dtype=False)
+
+        # Columns without any value
+        assert num.loc['empty', 'count'] == 0 and num.loc['empty', 'missing'] == len(df)
+        assert num.loc['empty', ['mean', 'std', 'min', '50%', 'max']].isna().all()
+        assert num.loc['empty', 'unique'] == 0
+        assert cat.loc['none', 'unique'] == 0 and cat.loc['none', 'missing'] == len(df)
+
+        top = sketch.top_values(3)
+        pd.testing.assert_series_equal(top['city'].counts, df['city'].value_counts().iloc[:3], check_names=False)
+        assert top['none'].total == 0 and len(top['none'].counts) == 0
@@ -0,0 +1,46 @@
+import sqlite3
+
+import pandas as pd
+
+from utils.SQLSource import SQLSource
+
+
+class Recorder():
+
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def close(self):
+        pass
+
+
+def test_postgresql_random_order_is_seeded():
+    conf_dict = {'DataSource': 'postgresql', 'Table': 'events'}
+    sql = SQLSource.select(conf_dict, ['a'], sample_size=10, total=10000, seed=42)
+    assert 'REPEATABLE (42)' in sql and 'ORDER BY random()' in sql
+
+    cnxn = Recorder()
+    SQLSource.set_seed(cnxn, conf_dict, 42)
+    (statement, (value,)), = cnxn.executed
+    assert statement == 'SELECT setseed(%s)' and -1 <= value <= 1
+
+    SQLSource.set_seed(cnxn, conf_dict, None)
+    SQLSource.set_seed(cnxn, {'DataSource': 'sqlite'}, 42)
+    assert len(cnxn.executed) == 1
+
+
+def test_sqlite_sample_reads_the_configured_columns(tmp_path):
+    path = str(tmp_path / 'data.db')
+    with sqlite3.connect(path) as cnxn:
+        pd.DataFrame({'a': range(1000), 'b': ['x', 'y'] * 500, 'c': 0.5}).to_sql('t', cnxn, index=False)
+
+    conf_dict = {'DataSource': 'sqlite', 'DatabasePath': path, 'Table': 't'}
+    sample = SQLSource.sample(conf_dict, 100, seed=1, columns=['a', 'b'], chunksize=30)
+    assert list(sample.columns) == ['a', 'b']
+    assert len(sample) == 100 and sample['a'].is_unique
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from utils.TopK import SpaceSaving, TopK
+
+
+def zipf(n=50000, distinct=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(rng.zipf(1.3, n) % distinct).astype(str)
+
+
+def test_topk_frame_adds_the_other_values():
+    x = pd.Series(['a'] * 5 + ['b'] * 3 + ['c'] * 2 + ['d'] + [None] * 4, name='v')
+    top = TopK.from_values(x, k=2)
+    assert top.total == 11 and top.distinct == 4
+    frame = top.frame('v')
+    assert frame['index'].tolist() == ['a', 'b', TopK.other_label]
+    assert frame['v'].tolist() == [5, 3, 3]
+    # Everything shown, no Other row
+    assert TopK.from_values(x).frame('v')['index'].tolist() == ['a', 'b', 'c', 'd']
+    assert TopK.from_values(pd.Series([None] * 3, dtype='object'), k=2).frame('v').empty
+
+
+def test_space_saving_is_exact_without_evictions():
+    x = zipf(distinct=300)
+    sketch = SpaceSaving(capacity=500)
+    for part in np.array_split(x.to_numpy(), 7):
+        sketch.update(part)
+    top = sketch.result(20)
+    assert top.exact and top.distinct == x.nunique() and top.total == len(x)
+    pd.testing.assert_series_equal(top.counts, x.value_counts().iloc[:20], check_names=False)
+
+
+def test_space_saving_keeps_heavy_hitters_and_merges():
+    x = zipf()
+    expected = x.value_counts()
+    sketch = SpaceSaving(capacity=200)
+    for part in np.array_split(x.to_numpy(), 10):
+        sketch.update(part)
+    merged = SpaceSaving(capacity=200)
+    for part in np.array_split(x.to_numpy(), 4):
+        merged.merge(SpaceSaving(capacity=200).update(part))
+
+    for summary in (sketch, merged):
+        result = summary.result(10, distinct=x.nunique())
+        assert not result.exact and result.total == len(x) and result.distinct == x.nunique()
+        # Counts are upper bounds, overestimated by less than total / capacity
+        true = expected.reindex(result.counts.index)
+        assert (result.counts >= true).all()
+        assert (result.counts - true).max() <= len(x) / 200
+        # Every value above total / capacity is kept
+        assert set(expected[expected > len(x) / 200].index) <= set(summary.counts.index)
+        assert result.labels(5) == expected.index[:5].tolist()
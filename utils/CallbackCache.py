@@ -0,0 +1,183 @@
+import functools
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from flask_caching.backends.base import BaseCache
+
+
+class LRUCache(BaseCache):
+    """In-process cache bounded to `threshold` entries with least recently used
+    eviction and a timeout per entry. Thread safe, one instance per worker.
+    """
+
+    def __init__(self, threshold=500, default_timeout=300):
+        super(LRUCache, self).__init__(default_timeout)
+        self._cache = OrderedDict()
+        self._threshold = threshold
+        self._lock = threading.Lock()
+
+    def _normalize_timeout(self, timeout):
+        timeout = BaseCache._normalize_timeout(self, timeout)
+        if timeout > 0:
+            timeout = time.time() + timeout
+        return timeout
+
+    def get(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires != 0 and expires <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=None):
+        item = (self._normalize_timeout(timeout), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            self._cache[key] = item
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._threshold:
+                self._cache.popitem(last=False)
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            return self._cache.pop(key, None) is not None
+
+    def has(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            return item is not None and (item[0] == 0 or item[0] > time.time())
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        return True
+
+
+def lru(app, config, args, kwargs):
+    # Flask-Caching backend factory, CACHE_TYPE = 'utils.CallbackCache.lru'
+    kwargs.update(dict(threshold=config["CACHE_THRESHOLD"]))
+    return LRUCache(*args, **kwargs)
+
+
+class CallbackCache():
+    """Memoization of Dash callbacks on top of a Flask-Caching instance.
+
+    Keys combine the callback name, the version of the dataset the callback
+    reads and its arguments, so a new dataset never serves stale figures.
+    """
+
+    backends = {
+        'lru': 'utils.CallbackCache.lru',
+        'simple': 'simple',
+        'filesystem': 'filesystem',
+        'redis': 'redis',
+        'null': 'null',
+    }
+
+    # Counted per worker process, /metrics sums them over the workers
+    hits = Counter()
+    misses = Counter()
+    counts_lock = threading.Lock()
+
+    @staticmethod
+    def cache_config(conf_dict):
+        """Flask-Caching settings from config.yaml.
+
+        CacheType is one of lru (default), simple, filesystem, redis or null.
+        CacheSize bounds the number of entries and CacheTimeout is the TTL in
+        seconds. redis works with any server speaking the redis protocol at
+        CacheRedisUrl; set its maxmemory-policy to allkeys-lru to bound it. It
+        needs the redis package, which is not in requirements.txt.
+        """
+        cache_type = conf_dict.get('CacheType', 'lru')
+        if cache_type == 'redis':
+            try:
+                import redis    # pylint: disable=W0611
+            except ImportError:
+                raise ImportError("CacheType: redis requires the redis package (pip install redis)")
+        config = {
+            'CACHE_TYPE': CallbackCache.backends.get(cache_type, cache_type),
+            'CACHE_THRESHOLD': conf_dict.get('CacheSize', 500),
+            'CACHE_DEFAULT_TIMEOUT': conf_dict.get('CacheTimeout', 3600),
+        }
+        if cache_type == 'filesystem':
+            config['CACHE_DIR'] = os.path.join(conf_dict.get('CacheDirectory') or '.cache', 'callbacks')
+        if cache_type == 'redis':
+            config['CACHE_REDIS_URL'] = conf_dict.get('CacheRedisUrl', 'redis://localhost:6379/0')
+            config['CACHE_KEY_PREFIX'] = 'idear:'
+        return config
+
+    @staticmethod
+    def make_key(name, version, args, kwargs):
+        arguments = pickle.dumps((args, sorted(kwargs.items())), pickle.HIGHEST_PROTOCOL)
+        return f'{name}:{version}:{hashlib.sha1(arguments).hexdigest()}'
+
+    @staticmethod
+    def memoize(cache, version):
+        """Decorator caching the return value of a callback. `version` is called
+        with the callback arguments and returns the version of the dataset they use.
+        """
+        def decorator(func):
+            name = func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = CallbackCache.make_key(name, version(*args, **kwargs), args, kwargs)
+                cached = cache.get(key)
+                # Values are stored in a 1-tuple so that a cached None is still a hit
+                if cached is not None:
+                    CallbackCache.count(CallbackCache.hits, name)
+                    CallbackCache.mark_request('hit')
+                    return cached[0]
+
+                CallbackCache.count(CallbackCache.misses, name)
+                CallbackCache.mark_request('miss')
+                result = func(*args, **kwargs)
+                cache.set(key, (result,))
+                return result
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def count(counter, name):
+        with CallbackCache.counts_lock:
+            counter[name] += 1
+
+    @staticmethod
+    def mark_request(result):
+        # Read by the callback metrics of the current request
+        import flask
+
+        if flask.has_request_context():
+            flask.g.cache_result = result
+
+    @staticmethod
+    def stats():
+        # Counts of the worker answering the request only
+        with CallbackCache.counts_lock:
+            names = sorted(set(CallbackCache.hits) | set(CallbackCache.misses))
+            callbacks = {name: {'hits': CallbackCache.hits[name], 'misses': CallbackCache.misses[name]}
+                         for name in names}
+        return {'worker': os.getpid(), 'callbacks': callbacks}
+
+    @staticmethod
+    def register_stats_route(server, route='/cache-stats'):
+        import flask
+
+        @server.route(route)
+        def cache_stats():      # pylint: disable=W0612
+            return flask.jsonify(CallbackCache.stats())
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.DataIngestion import DataIngestion
+from utils.Sampling import ReservoirSampler
+
+
+class ColumnarFrame():
+    """Read-only stand-in for the sample DataFrame over memory mapped Arrow IPC files.
+
+    Opening only reads the schemas. A column is converted to pandas the first
+    time it is selected and kept in a cache bounded to `cache_bytes`, least
+    recently used first; numerical columns view the mapping without a copy.
+    `frame[col]` gives a Series and `frame[[col1, col2]]` a DataFrame, which is
+    all the callbacks select, and `frame.iloc[rows]` reads the rows of a page
+    without loading whole columns.
+    """
+
+    meta_name = 'meta.json'
+
+    def __init__(self, directory, cache_bytes=256 * 2 ** 20):
+        import pyarrow as pa
+
+        with open(os.path.join(directory, ColumnarFrame.meta_name)) as f:
+            self.meta = json.load(f)
+        self.directory = directory
+        self.tables = []
+        self.locations = OrderedDict()
+        for part in self.meta['parts']:
+            source = pa.memory_map(os.path.join(directory, part), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            for name in table.column_names:
+                self.locations[name] = len(self.tables)
+            self.tables.append(table)
+
+        self.columns = pd.Index(list(self.locations))
+        self.index = pd.Index(np.load(os.path.join(directory, 'index.npy'), mmap_mode='r'))
+        self.cache_bytes = cache_bytes
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.columns)
+
+    @property
+    def dtypes(self):
+        # From the schema, so that no column is loaded
+        import pyarrow as pa
+
+        dtypes = {}
+        for name, part in self.locations.items():
+            arrow_type = self.tables[part].schema.field(name).type
+            if pa.types.is_dictionary(arrow_type):
+                dtypes[name] = pd.CategoricalDtype()
+            elif pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+                dtypes[name] = np.dtype(object)
+            else:
+                dtypes[name] = np.dtype(arrow_type.to_pandas_dtype())
+        return pd.Series(dtypes, dtype=object)
+
+    def __contains__(self, name):
+        return name in self.locations
+
+    def __getitem__(self, key):
+        if isinstance(key, str) or np.isscalar(key):
+            return self.column(key)
+        columns = list(key)
+        if not all(isinstance(col, str) for col in columns):
+            raise TypeError("ColumnarFrame only selects columns by name")
+        return pd.DataFrame({col: self.column(col) for col in columns}, index=self.index, columns=columns)
+
+    def column(self, name):
+        with self.lock:
+            if name in self.cache:
+                self.cache.move_to_end(name)
+                return self.cache[name]
+
+        if name not in self.locations:
+            raise KeyError(name)
+        series = self.tables[self.locations[name]].column(name).to_pandas()
+        series.index = self.index
+        series.name = name
+
+        with self.lock:
+            self.cache[name] = series
+            self.cached_bytes += series.memory_usage(deep=True, index=False)
+            # The column just loaded stays, even on its own over the budget
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= evicted.memory_usage(deep=True, index=False)
+        return series
+
+    def take(self, positions):
+        # Rows at the given positions, read from the mapping without touching the cache
+        positions = np.asarray(positions, dtype='int64')
+        frames = []
+        for table in self.tables:
+            frames.append(table.take(positions).to_pandas())
+        df = pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+        df.index = self.index[positions]
+        return df[list(self.columns)]
+
+    @property
+    def iloc(self):
+        frame = self
+
+        class Indexer():
+            def __getitem__(self, key):
+                if isinstance(key, slice):
+                    return frame.take(np.arange(len(frame))[key])
+                return frame.take(key)
+        return Indexer()
+
+    def memory_usage(self, deep=True, index=True):
+        # Cached columns only, the rest of the frame is on disk
+        with self.lock:
+            usage = {name: series.memory_usage(deep=deep, index=False) for name, series in self.cache.items()}
+        if index:
+            usage = dict(Index=self.index.memory_usage(deep=deep), **usage)
+        return pd.Series(usage, dtype='int64')
+
+    @staticmethod
+    def sample_dir(path, sample_size, seed=None, stratify=None, columns=None, cache_dir=None, float_columns=None,
+                   compact_key=''):
+        key = '|'.join([str(sample_size), str(seed), str(stratify), ','.join(columns or []), compact_key])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+        return DataIngestion.cache_path(path, cache_dir, float_columns).replace('.parquet', f'-columnar-{digest}')
+
+    @staticmethod
+    def positions(parquet_file, sample_size, seed=None, stratify=None, chunksize=None):
+        """Row numbers of the sample in sample order, the same rows DataIngestion.sample
+        draws with this seed. Only the stratification column is read.
+        """
+        chunksize = chunksize or DataIngestion.default_chunksize
+        n_rows = parquet_file.metadata.num_rows
+        if stratify is None:
+            chunks = (pd.DataFrame(index=pd.RangeIndex(min(chunksize, n_rows - start)))
+                      for start in range(0, n_rows, chunksize))
+        else:
+            chunks = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunksize, columns=[stratify]))
+        return ReservoirSampler.sample(chunks, sample_size, seed, stratify).index.to_numpy(dtype='int64')
+
+    @staticmethod
+    def build(path, sample_size, seed=None, stratify=None, columns=None, cache_dir=None, chunksize=None,
+              float_columns=None, transform=None, group_size=256, compact_key=''):
+        """Writes the sample of `path` as Arrow IPC files of `group_size` columns each.
+
+        The rows are drawn first, then every column group is read from the
+        columnar cache in batches and only the sampled rows are kept, so memory
+        is bounded by one column group of the sample. `transform(df)` is applied
+        to each group before it is written (compaction) and the columns numerical
+        before it are recorded in meta.json.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from utils.SharedDataset import SharedDataset
+
+        directory = ColumnarFrame.sample_dir(path, sample_size, seed, stratify, columns, cache_dir, float_columns,
+                                             compact_key)
+        if os.path.exists(os.path.join(directory, ColumnarFrame.meta_name)):
+            return directory
+
+        chunksize = chunksize or DataIngestion.default_chunksize
+        parquet_file = pq.ParquetFile(DataIngestion.ensure_cache(path, cache_dir, chunksize, float_columns))
+        names = [name for name in parquet_file.schema_arrow.names if 'Unnamed' not in name]
+        if columns is not None:
+            # In the configured order, as DataIngestion.sample reads them
+            names = [name for name in columns if name in names]
+
+        positions = ColumnarFrame.positions(parquet_file, sample_size, seed, stratify, chunksize)
+        order = np.argsort(positions, kind='stable')
+        sorted_positions = positions[order]
+        restore = np.empty_like(order)
+        restore[order] = np.arange(len(order))
+
+        tmp_dir = f'{directory}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        parts, numeric = [], []
+        for start in range(0, len(names), group_size):
+            group = names[start:start + group_size]
+            pieces, offset = [], 0
+            for batch in parquet_file.iter_batches(batch_size=chunksize, columns=group):
+                lo, hi = np.searchsorted(sorted_positions, [offset, offset + batch.num_rows])
+                pieces.append(batch.take(pa.array(sorted_positions[lo:hi] - offset)))
+                offset += batch.num_rows
+            df = pa.Table.from_batches(pieces).take(pa.array(restore)).to_pandas()
+            df.index = pd.Index(positions)
+
+            if float_columns:
+                for col in set(float_columns) & set(group):
+                    df[col] = df[col].astype(float)
+            numeric.extend(df.select_dtypes(include=[np.number]).columns)
+            if transform is not None:
+                df = transform(df)
+
+            part = f'part-{len(parts):05d}.arrow'
+            table = SharedDataset.to_table(df, preserve_index=False)
+            with pa.OSFile(os.path.join(tmp_dir, part), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            parts.append(part)
+
+        np.save(os.path.join(tmp_dir, 'index.npy'), positions)
+        with open(os.path.join(tmp_dir, ColumnarFrame.meta_name), 'w') as f:
+            json.dump({'parts': parts, 'columns': names, 'numeric': list(numeric), 'rows': int(len(positions))}, f)
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Written by another process in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return directory
@@ -0,0 +1,74 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class Compaction():
+    """Smaller in-memory layout of a loaded sample.
+
+    Categorical columns are dictionary encoded (pandas Categorical) and
+    numerical columns are downcast to the smallest dtype that holds every
+    value exactly. Columns in both lists keep their numerical dtype.
+    """
+
+    @staticmethod
+    def downcast(x):
+        if pd.api.types.is_bool_dtype(x.dtype):
+            return x
+        if pd.api.types.is_integer_dtype(x.dtype):
+            return pd.to_numeric(x, downcast='integer')
+        if pd.api.types.is_float_dtype(x.dtype) and x.dtype != np.float32:
+            # Only when every value survives the round trip through float32
+            values = x.to_numpy()
+            narrow = values.astype('float32')
+            with np.errstate(over='ignore', invalid='ignore'):
+                restored = narrow.astype(values.dtype)
+            if ((restored == values) | (np.isnan(restored) & np.isnan(values))).all():
+                return pd.Series(narrow, index=x.index, name=x.name)
+        return x
+
+    @staticmethod
+    def categorize(x, max_ratio=0.5):
+        # Mostly distinct values gain nothing from a dictionary
+        if isinstance(x.dtype, pd.CategoricalDtype) or len(x) == 0:
+            return x
+        if x.nunique(dropna=True) > max_ratio * len(x):
+            return x
+        return x.astype('category')
+
+    @staticmethod
+    def compact(df, categorical_columns, numerical_columns, max_category_ratio=0.5):
+        columns = {}
+        for col in df.columns:
+            if col in numerical_columns:
+                columns[col] = Compaction.downcast(df[col])
+            elif col in categorical_columns:
+                columns[col] = Compaction.categorize(df[col], max_category_ratio)
+            else:
+                columns[col] = df[col]
+        compacted = pd.DataFrame(columns, index=df.index)
+        Compaction.log_report(Compaction.memory_report(df, compacted))
+        return compacted
+
+    @staticmethod
+    def memory_report(before, after):
+        report = pd.DataFrame({
+            'dtype_before': before.dtypes.astype(str),
+            'dtype_after': after.dtypes.astype(str),
+            'bytes_before': before.memory_usage(deep=True, index=False),
+            'bytes_after': after.memory_usage(deep=True, index=False),
+        })
+        report.index.name = 'Column name'
+        return report
+
+    @staticmethod
+    def log_report(report):
+        for col, row in report.iterrows():
+            logger.info("%s: %s -> %s, %d -> %d bytes", col, row['dtype_before'], row['dtype_after'],
+                        row['bytes_before'], row['bytes_after'])
+        before, after = report['bytes_before'].sum(), report['bytes_after'].sum()
+        logger.info("Sample memory: %.1f MB -> %.1f MB (%.1fx smaller)", before / 2 ** 20, after / 2 ** 20,
+                    before / max(after, 1))
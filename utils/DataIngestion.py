@@ -0,0 +1,208 @@
+import hashlib
+import os
+
+import pandas as pd
+
+from utils.Sampling import ReservoirSampler
+
+
+class DataIngestion():
+    """Chunked CSV ingestion backed by a columnar (Parquet) cache.
+
+    The first read of a source file streams it in chunks, fixes the column
+    dtypes from the first chunk and writes a Parquet file named after the
+    source fingerprint. Later reads only touch the requested columns of
+    that cache.
+    """
+
+    default_chunksize = 100000
+    default_cache_dir = '.cache'
+
+    @staticmethod
+    def columnar_available():
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def fingerprint(path, float_columns=None):
+        # Size and modification time identify a version of the file without reading it
+        stat = os.stat(path)
+        key = '|'.join([os.path.abspath(path), str(stat.st_size), str(stat.st_mtime_ns),
+                        ','.join(sorted(float_columns or []))])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def cache_path(path, cache_dir=None, float_columns=None):
+        cache_dir = cache_dir or DataIngestion.default_cache_dir
+        stem = os.path.splitext(os.path.basename(path))[0]
+        fingerprint = DataIngestion.fingerprint(path, float_columns)
+        return os.path.join(cache_dir, f'{stem}-{fingerprint}.parquet')
+
+    @staticmethod
+    def iter_csv(path, chunksize=None, columns=None, **read_kwargs):
+        # Making sure that we are not reading any extra column
+        if columns is None:
+            usecols = lambda col: 'Unnamed' not in col
+        else:
+            usecols = columns
+        return pd.read_csv(path, chunksize=chunksize or DataIngestion.default_chunksize,
+                           usecols=usecols, **read_kwargs)
+
+    @staticmethod
+    def infer_schema(chunk, float_columns=None):
+        import pyarrow as pa
+
+        fields = []
+        for col in chunk.columns:
+            dtype = chunk[col].dtype
+            if float_columns and col in float_columns:
+                arrow_type = pa.float64()
+            elif pd.api.types.is_bool_dtype(dtype):
+                arrow_type = pa.bool_()
+            elif pd.api.types.is_integer_dtype(dtype):
+                arrow_type = pa.int64()
+            elif pd.api.types.is_float_dtype(dtype):
+                arrow_type = pa.float64()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(col, arrow_type, nullable=True))
+        return pa.schema(fields)
+
+    @staticmethod
+    def chunk_to_table(chunk, schema):
+        import pyarrow as pa
+
+        arrays = []
+        for field in schema:
+            values = chunk[field.name]
+            if pa.types.is_string(field.type):
+                values = values.where(values.isna(), values.astype(str))
+            elif pa.types.is_boolean(field.type):
+                # Arrow would read any number as a boolean
+                if pd.api.types.infer_dtype(values, skipna=True) not in ('boolean', 'empty'):
+                    return None, field.name
+            try:
+                arrays.append(pa.array(values, type=field.type, from_pandas=True))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError):
+                return None, field.name
+        return pa.Table.from_arrays(arrays, schema=schema), None
+
+    @staticmethod
+    def wider_type(arrow_type, values):
+        # Integers and booleans that meet a decimal stay numerical, anything else becomes a string
+        import pyarrow as pa
+
+        if pa.types.is_integer(arrow_type) or pa.types.is_boolean(arrow_type):
+            present = values.dropna()
+            if pd.to_numeric(present, errors='coerce').notna().all():
+                return pa.float64()
+        return pa.string()
+
+    @staticmethod
+    def build_cache(path, cache_dir=None, chunksize=None, float_columns=None, progress=None, **read_kwargs):
+        """Writes the columnar cache of `path`. `progress`, if given, is called after
+        every chunk with the bytes read so far, the file size and the rows written.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        target = DataIngestion.cache_path(path, cache_dir, float_columns)
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+
+        # Dtypes are fixed from the first chunk. A column that later turns out not to
+        # fit its inferred type is widened, to float64 when it is still numerical and
+        # to string otherwise, and the pass is restarted.
+        widened = {}
+        total = os.path.getsize(path)
+        while True:
+            schema, writer, failed, rows = None, None, None, 0
+            # Progress is read off the position of an open handle on the file
+            source = open(path, 'rb') if progress is not None else None
+            try:
+                for chunk in DataIngestion.iter_csv(source or path, chunksize, **read_kwargs):
+                    if schema is None:
+                        schema = DataIngestion.infer_schema(chunk, float_columns)
+                        for col, arrow_type in widened.items():
+                            schema = schema.set(schema.get_field_index(col), pa.field(col, arrow_type))
+                        writer = pq.ParquetWriter(tmp_path, schema)
+                    table, failed = DataIngestion.chunk_to_table(chunk, schema)
+                    if table is None:
+                        break
+                    writer.write_table(table)
+                    rows += len(chunk)
+                    if progress is not None:
+                        progress(source.tell(), total, rows)
+            finally:
+                if writer is not None:
+                    writer.close()
+                if source is not None:
+                    source.close()
+
+            if failed is None:
+                break
+            if pa.types.is_string(widened.get(failed, pa.null())):
+                os.remove(tmp_path)
+                raise ValueError(f"Column {failed} in {path} could not be converted to a columnar type")
+            widened[failed] = DataIngestion.wider_type(schema.field(failed).type, chunk[failed])
+
+        if writer is None:
+            raise ValueError(f"{path} does not contain any rows")
+        os.replace(tmp_path, target)
+        return target
+
+    @staticmethod
+    def ensure_cache(path, cache_dir=None, chunksize=None, float_columns=None, progress=None, **read_kwargs):
+        target = DataIngestion.cache_path(path, cache_dir, float_columns)
+        if not os.path.exists(target):
+            target = DataIngestion.build_cache(path, cache_dir, chunksize, float_columns, progress, **read_kwargs)
+        return target
+
+    @staticmethod
+    def load(path, columns=None, cache_dir=None, chunksize=None, float_columns=None, **read_kwargs):
+        target = DataIngestion.ensure_cache(path, cache_dir, chunksize, float_columns, **read_kwargs)
+        return pd.read_parquet(target, columns=columns)
+
+    @staticmethod
+    def iter_chunks(path, columns=None, cache_dir=None, chunksize=None, float_columns=None,
+                    use_cache=True, **read_kwargs):
+        chunksize = chunksize or DataIngestion.default_chunksize
+        if not (use_cache and DataIngestion.columnar_available()):
+            yield from DataIngestion.iter_csv(path, chunksize, columns, **read_kwargs)
+            return
+
+        import pyarrow.parquet as pq
+
+        target = DataIngestion.ensure_cache(path, cache_dir, chunksize, float_columns, **read_kwargs)
+        for batch in pq.ParquetFile(target).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+
+    @staticmethod
+    def sample(path, sample_size, seed=None, stratify=None, columns=None, cache_dir=None,
+               chunksize=None, float_columns=None, use_cache=True, **read_kwargs):
+        """One pass reservoir sample of the source. Seeded samples are cached next to
+        the columnar cache so that restarts reproduce them without another pass.
+        """
+        use_cache = use_cache and DataIngestion.columnar_available()
+        sample_path = None
+        if use_cache and seed is not None:
+            key = '|'.join([str(sample_size), str(seed), str(stratify), ','.join(columns or [])])
+            digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+            sample_path = DataIngestion.cache_path(path, cache_dir, float_columns).replace(
+                '.parquet', f'-sample-{digest}.parquet')
+            if os.path.exists(sample_path):
+                return pd.read_parquet(sample_path)
+
+        chunks = DataIngestion.iter_chunks(path, columns, cache_dir, chunksize, float_columns,
+                                           use_cache, **read_kwargs)
+        df = ReservoirSampler.sample(chunks, sample_size, seed, stratify)
+
+        if sample_path is not None:
+            tmp_path = f'{sample_path}.{os.getpid()}.tmp'
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, sample_path)
+        return df
@@ -0,0 +1,260 @@
+import hmac
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.DataIngestion import DataIngestion
+
+
+class DataUpload():
+    """CSV uploads through the Flask server.
+
+    The request only streams the file to UploadDirectory and queues a job.
+    Parsing (chunked CSV reading, type inference and the columnar cache) runs
+    in a separate process that reports its progress in a JSON file, so any
+    gunicorn worker can answer the progress polls. A finished upload writes a
+    manifest that DatasetRegistry picks up as a new dataset.
+
+    Uploads are only accepted with the UploadToken of config.yaml, and at most
+    MaxPendingUploads files are parsed at once over all workers.
+    """
+
+    default_upload_dir = 'uploads'
+    extensions = ('.csv', '.txt')
+    buffer_size = 2 ** 20
+    progress_interval = 0.5
+    token_header = 'X-Upload-Token'
+    # A job not updated for this long is from a server that stopped
+    stale_after = 3600
+    executor = None
+
+    # Posted to the top window, which is redirected to the new dataset and its progress
+    form = '''<!DOCTYPE html>
+<html><head>{stylesheets}</head><body>
+<form action="/upload" method="POST" enctype="multipart/form-data" target="_top">
+  <div class="form-group"><label for="file">CSV file</label>
+    <input class="form-control-file" type="file" id="file" name="file" accept=".csv,.txt" required></div>
+  <div class="form-group"><label for="name">Dataset name</label>
+    <input class="form-control" id="name" name="name" placeholder="Defaults to the file name"></div>
+  <div class="form-group"><label for="target">Target column</label>
+    <input class="form-control" id="target" name="target" placeholder="Defaults to the last column"></div>
+  <div class="form-group"><label for="token">Upload token</label>
+    <input class="form-control" type="password" id="token" name="token" required></div>
+  <button class="btn btn-primary" type="submit">Upload</button>
+</form></body></html>'''
+
+    disabled_form = '''<!DOCTYPE html>
+<html><head>{stylesheets}</head><body>
+<p>Uploads are disabled, set UploadToken in config.yaml to enable them.</p>
+</body></html>'''
+
+    @staticmethod
+    def upload_dir(conf_dict):
+        return conf_dict.get('UploadDirectory') or DataUpload.default_upload_dir
+
+    @staticmethod
+    def dataset_name(name, file_name):
+        from werkzeug.utils import secure_filename
+
+        name = name or os.path.splitext(os.path.basename(file_name or ''))[0]
+        return os.path.splitext(secure_filename(name))[0]
+
+    @staticmethod
+    def save_stream(stream, path, max_bytes=None):
+        # Copies the request body to disk a buffer at a time, never holding the whole file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    buffer = stream.read(DataUpload.buffer_size)
+                    if not buffer:
+                        break
+                    size += len(buffer)
+                    if max_bytes is not None and size > max_bytes:
+                        raise ValueError(f"Upload exceeds {max_bytes // 2 ** 20} MB")
+                    f.write(buffer)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size
+
+    @staticmethod
+    def authorized(token, value):
+        return token is not None and value is not None and hmac.compare_digest(str(value), str(token))
+
+    @staticmethod
+    def exists(upload_dir, name):
+        return os.path.exists(os.path.join(upload_dir, 'datasets', f'{name}.json'))
+
+    @staticmethod
+    def pending(upload_dir):
+        # Jobs of every worker still queued or parsing, by dataset name
+        jobs_dir = os.path.join(upload_dir, 'jobs')
+        if not os.path.isdir(jobs_dir):
+            return []
+        names = []
+        for file_name in os.listdir(jobs_dir):
+            job_id, ext = os.path.splitext(file_name)
+            status = DataUpload.status(upload_dir, job_id) if ext == '.json' else None
+            if (status is not None and status.get('state') in ('queued', 'parsing')
+                    and time.time() - status.get('updated', 0) < DataUpload.stale_after):
+                names.append(status.get('dataset'))
+        return names
+
+    @staticmethod
+    def status_path(upload_dir, job_id):
+        return os.path.join(upload_dir, 'jobs', f'{job_id}.json')
+
+    @staticmethod
+    def write_status(upload_dir, job_id, **status):
+        path = DataUpload.status_path(upload_dir, job_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(status, updated=time.time()), f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def status(upload_dir, job_id):
+        if not job_id or not job_id.isalnum():
+            return None
+        try:
+            with open(DataUpload.status_path(upload_dir, job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def manifest(upload_dir, name, conf_dict):
+        path = os.path.join(upload_dir, 'datasets', f'{name}.json')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(conf_dict, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def start(conf_dict, name, path, target=None):
+        upload_dir = DataUpload.upload_dir(conf_dict)
+        job_id = uuid.uuid4().hex
+        DataUpload.write_status(upload_dir, job_id, state='queued', dataset=name,
+                                bytes_read=0, bytes_total=os.path.getsize(path), rows=0)
+
+        # Spawned rather than forked, the worker holds threads and open connections
+        if DataUpload.executor is None:
+            DataUpload.executor = ProcessPoolExecutor(max_workers=conf_dict.get('UploadWorkers', 1),
+                                                      mp_context=multiprocessing.get_context('spawn'))
+        DataUpload.executor.submit(DataUpload.parse, upload_dir, job_id, name, path, target,
+                                   conf_dict.get('CacheDirectory'), conf_dict.get('ChunkSize'))
+        return job_id
+
+    @staticmethod
+    def parse(upload_dir, job_id, name, path, target=None, cache_dir=None, chunksize=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        state = {'dataset': name, 'bytes_total': os.path.getsize(path)}
+        last_update = [0.0]
+
+        def progress(bytes_read, bytes_total, rows):
+            if time.time() - last_update[0] >= DataUpload.progress_interval:
+                last_update[0] = time.time()
+                DataUpload.write_status(upload_dir, job_id, state='parsing', bytes_read=bytes_read,
+                                        bytes_total=bytes_total, rows=rows, dataset=name)
+
+        try:
+            cache = DataIngestion.ensure_cache(path, cache_dir, chunksize, progress=progress)
+            metadata = pq.ParquetFile(cache).metadata
+            schema = metadata.schema.to_arrow_schema()
+            columns = list(schema.names)
+            if not target:
+                target = columns[-1]
+            if target not in columns:
+                raise ValueError(f"Target column {target} is not in the file")
+
+            # Inferred types decide the column lists, the target is always categorical
+            numerical = [field.name for field in schema if field.name != target
+                         and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type))]
+            categorical = [col for col in columns if col not in numerical]
+            DataUpload.manifest(upload_dir, name, {
+                'DataFilePath': [path], 'Target': target, 'NumericalColumns': numerical,
+                'CategoricalColumns': categorical, 'ColumnsToExclude': [], 'FloatDataTypes': []})
+            DataUpload.write_status(upload_dir, job_id, state='done', bytes_read=state['bytes_total'],
+                                    rows=metadata.num_rows, **state)
+        except Exception as e:      # pylint: disable=W0703
+            DataUpload.write_status(upload_dir, job_id, state='failed', message=str(e), **state)
+
+    @staticmethod
+    def register_routes(server, conf_dict, reserved_names=(), stylesheets=()):
+        """GET /upload serves the form of the Data Input tab and POST /upload takes it,
+        PUT /upload/<name> a raw CSV body (curl -T data.csv). GET /upload/<job id>
+        returns the job status. POST and PUT require UploadToken, in the form, the
+        `token` argument or the X-Upload-Token header, and a name no other dataset has.
+        """
+        import flask
+        from markupsafe import escape
+
+        token = conf_dict.get('UploadToken')
+        form = (DataUpload.form if token else DataUpload.disabled_form).format(stylesheets=''.join(
+            f'<link rel="stylesheet" href="{escape(href)}">' for href in stylesheets))
+
+        upload_dir = DataUpload.upload_dir(conf_dict)
+        max_bytes = conf_dict.get('MaxUploadMB', 1024) * 2 ** 20
+        max_pending = conf_dict.get('MaxPendingUploads', 4)
+
+        def receive(name, file_name, stream, target, value):
+            if not DataUpload.authorized(token, value):
+                flask.abort(403)
+            name = DataUpload.dataset_name(name, file_name)
+            if not name or name in reserved_names:
+                flask.abort(400, f"Invalid dataset name {name}")
+            if os.path.splitext(file_name or 'upload.csv')[1].lower() not in DataUpload.extensions:
+                flask.abort(400, "Only CSV files can be uploaded")
+            if flask.request.content_length is not None and flask.request.content_length > max_bytes:
+                flask.abort(413, f"Upload exceeds {max_bytes // 2 ** 20} MB")
+
+            # An upload never replaces another dataset, and parsing jobs are bounded
+            pending = DataUpload.pending(upload_dir)
+            if DataUpload.exists(upload_dir, name) or name in pending:
+                flask.abort(409, f"A dataset named {name} already exists")
+            if len(pending) >= max_pending:
+                flask.abort(429, "Too many uploads are being parsed, retry later")
+
+            path = os.path.join(os.path.abspath(upload_dir), 'files', f'{name}-{uuid.uuid4().hex[:8]}.csv')
+            try:
+                DataUpload.save_stream(stream, path, max_bytes)
+            except ValueError as e:
+                flask.abort(413, str(e))
+            return name, DataUpload.start(conf_dict, name, path, target)
+
+        @server.route('/upload', methods=['GET'])
+        def upload_page():      # pylint: disable=W0612
+            return form
+
+        @server.route('/upload', methods=['POST'])
+        def upload_form():      # pylint: disable=W0612
+            upload = flask.request.files.get('file')
+            if upload is None or not upload.filename:
+                return flask.redirect('/')
+            name, job_id = receive(flask.request.form.get('name'), upload.filename, upload.stream,
+                                   flask.request.form.get('target'), flask.request.form.get('token'))
+            return flask.redirect(f'/?dataset={name}&upload={job_id}')
+
+        @server.route('/upload/<name>', methods=['PUT'])
+        def upload_raw(name):       # pylint: disable=W0612
+            name, job_id = receive(name, None, flask.request.stream, flask.request.args.get('target'),
+                                   flask.request.args.get('token') or flask.request.headers.get(DataUpload.token_header))
+            return flask.jsonify({'dataset': name, 'job': job_id}), 202
+
+        @server.route('/upload/<job_id>', methods=['GET'])
+        def upload_status(job_id):      # pylint: disable=W0612
+            status = DataUpload.status(upload_dir, job_id)
+            if status is None:
+                flask.abort(404)
+            return flask.jsonify(status)
@@ -0,0 +1,122 @@
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class DatasetRegistry():
+    """Named datasets loaded on first use and evicted least recently used first
+    once their total memory exceeds MemoryBudgetMB.
+
+    Datasets are listed under `Datasets` in config.yaml, each entry overriding
+    the top level settings (DataFilePath, Target, column lists, ...). Without
+    a `Datasets` section the top level settings describe a single dataset.
+    Uploaded datasets are found through their manifests in UploadDirectory,
+    which every worker process reads.
+    """
+
+    def __init__(self, conf_dict, loader):
+        self.loader = loader
+        self.base_conf = {key: value for key, value in conf_dict.items() if key != 'Datasets'}
+        self.datasets = OrderedDict(conf_dict.get('Datasets') or {})
+        if not self.datasets:
+            self.datasets[self.dataset_name(self.base_conf)] = {}
+        self.default = conf_dict.get('DefaultDataset') or next(iter(self.datasets))
+        self.memory_budget = conf_dict.get('MemoryBudgetMB', 2048) * 2 ** 20
+        self.configured = set(self.datasets)
+        self.manifest_dir = os.path.join(conf_dict.get('UploadDirectory') or 'uploads', 'datasets')
+        self.manifests = {}
+
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+        self.loading = {}
+
+    @staticmethod
+    def dataset_name(conf_dict):
+        if 'DataSource' in conf_dict:
+            return conf_dict.get('Table') or conf_dict.get('Database') or 'sql'
+        data_file = conf_dict.get('DataFilePath', 'data/titanic.csv')
+        if isinstance(data_file, list):
+            data_file = data_file[0]
+        return os.path.splitext(os.path.basename(data_file))[0]
+
+    def names(self):
+        self.refresh()
+        return list(self.datasets)
+
+    def resolve(self, name):
+        if name is not None and name not in self.datasets:
+            self.refresh()
+        return name if name in self.datasets else self.default
+
+    def refresh(self):
+        # A manifest written again (same upload name) replaces the loaded dataset
+        if not os.path.isdir(self.manifest_dir):
+            return
+        for file_name in sorted(os.listdir(self.manifest_dir)):
+            name, ext = os.path.splitext(file_name)
+            if ext != '.json' or name in self.configured:
+                continue
+            path = os.path.join(self.manifest_dir, file_name)
+            mtime = os.stat(path).st_mtime_ns
+            if self.manifests.get(name) == mtime:
+                continue
+            with open(path) as f:
+                self.register(name, json.load(f))
+            self.manifests[name] = mtime
+
+    def conf_for(self, name):
+        conf_dict = copy.deepcopy(self.base_conf)
+        conf_dict.update(copy.deepcopy(self.datasets[name] or {}))
+        return conf_dict
+
+    def register(self, name, conf_dict):
+        with self.lock:
+            self.datasets[name] = conf_dict
+            self.loaded.pop(name, None)
+
+    def get(self, name=None):
+        name = self.resolve(name)
+        with self.lock:
+            if name in self.loaded:
+                self.loaded.move_to_end(name)
+                return self.loaded[name]
+
+        # Concurrent requests for the same dataset wait for a single load
+        with self.lock:
+            loading = self.loading.setdefault(name, threading.Lock())
+        with loading:
+            with self.lock:
+                if name in self.loaded:
+                    return self.loaded[name]
+            data_object = self.loader(self.conf_for(name))
+
+            with self.lock:
+                self.loaded[name] = data_object
+                self.evict()
+        return data_object
+
+    def preload(self):
+        """Load the configured datasets with PrecomputeOnStartup set, the
+        default first, so their warm-up runs at startup instead of on the first
+        request. Stops once the memory budget is reached.
+        """
+        names = [self.default] + [name for name in self.datasets if name != self.default]
+        for name in names:
+            if name not in self.configured or not self.conf_for(name).get('PrecomputeOnStartup', False):
+                continue
+            if self.loaded and sum(self.memory_usage().values()) >= self.memory_budget:
+                break
+            self.get(name)
+
+    def memory_usage(self):
+        return {name: data_object.memory_usage() for name, data_object in self.loaded.items()}
+
+    def evict(self):
+        # The most recently used dataset always stays, even on its own over budget
+        usage = self.memory_usage()
+        total = sum(usage.values())
+        while total > self.memory_budget and len(self.loaded) > 1:
+            name, _ = self.loaded.popitem(last=False)
+            total -= usage[name]
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+
+class DescriptiveStatistics():
+    """Column summaries computed for all columns at once.
+
+    Numerical columns are sorted once as a single 2D block; count, missing,
+    distinct values, min/max and quantiles are read off the sorted block and
+    the moments come from the same array. Categorical columns are dictionary
+    encoded with a hash table, which also works on mixed object columns.
+    """
+
+    quantiles = (0.25, 0.5, 0.75)
+
+    @staticmethod
+    def numerical_summary(df, columns):
+        X = df[columns].to_numpy(dtype='float64', na_value=np.nan)
+        n_rows = X.shape[0]
+
+        # NaNs sort to the end of each column
+        S = np.sort(X, axis=0)
+        count = np.count_nonzero(~np.isnan(X), axis=0)
+        has_values = count > 0
+        cols = np.arange(len(columns))
+        last = np.maximum(count - 1, 0)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            total = np.nansum(X, axis=0)
+            mean = np.where(has_values, total / count, np.nan)
+            sq_dev = np.nansum((X - mean) ** 2, axis=0)
+            std = np.where(count > 1, np.sqrt(sq_dev / (count - 1)), np.nan)
+
+        summary = {
+            'count': count.astype('float64'),
+            'mean': mean,
+            'std': std,
+            'min': np.where(has_values, S[0, cols] if n_rows else np.nan, np.nan),
+        }
+
+        # Linear interpolation between order statistics, same as DataFrame.describe
+        for q in DescriptiveStatistics.quantiles:
+            position = q * last
+            lower = np.floor(position).astype('int64')
+            upper = np.minimum(lower + 1, last)
+            fraction = position - lower
+            if n_rows:
+                value = S[lower, cols] + fraction * (S[upper, cols] - S[lower, cols])
+            else:
+                value = np.full(len(columns), np.nan)
+            summary[f'{int(q * 100)}%'] = np.where(has_values, value, np.nan)
+
+        summary['max'] = np.where(has_values, S[last, cols] if n_rows else np.nan, np.nan)
+        summary['missing'] = n_rows - count
+
+        # Distinct values are the positions where the sorted column changes
+        if n_rows:
+            changes = (S[1:] != S[:-1]) & (np.arange(1, n_rows)[:, None] < count)
+            summary['unique'] = np.where(has_values, changes.sum(axis=0) + 1, 0)
+        else:
+            summary['unique'] = np.zeros(len(columns), dtype='int64')
+
+        return pd.DataFrame(summary, index=pd.Index(columns, name='Column name'))
+
+    @staticmethod
+    def categorical_summary(df, columns):
+        missing = np.empty(len(columns), dtype='int64')
+        unique = np.empty(len(columns), dtype='int64')
+        for i, col in enumerate(columns):
+            codes, uniques = DescriptiveStatistics.encode(df[col])
+            missing[i] = np.count_nonzero(codes < 0)
+            unique[i] = len(uniques)
+
+        return pd.DataFrame({'missing': missing, 'unique': unique},
+                            index=pd.Index(columns, name='Column name'))
+
+    @staticmethod
+    def encode(x):
+        # Dense integer codes, -1 marks a missing value
+        codes, uniques = pd.factorize(x)
+        return codes, uniques
+
+    @staticmethod
+    def summarize(df, categorical_columns):
+        numerical_columns = list(df.select_dtypes(include=[np.number]).columns)
+        categorical_columns = [col for col in df.columns if col in categorical_columns]
+
+        summary_num = DescriptiveStatistics.numerical_summary(df, numerical_columns)
+        summary_cat = DescriptiveStatistics.categorical_summary(df, categorical_columns)
+        return summary_num.reset_index(), summary_cat.reset_index()
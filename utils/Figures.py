@@ -0,0 +1,55 @@
+import numpy as np
+import plotly.graph_objs as go
+
+
+class Figures():
+    """Plotly traces built from pre-aggregated data instead of raw rows."""
+
+    @staticmethod
+    def density_heatmap(grid, name='Data Points'):
+        counts = grid['counts'].sum(axis=0).astype('float64')
+        counts[counts == 0] = np.nan  # Empty bins stay transparent
+        return go.Heatmap(x=grid['x'], y=grid['y'], z=counts, name=name, colorscale='Blues',
+                          showscale=False, hovertemplate='x=%{x}<br>y=%{y}<br>count=%{z}<extra></extra>')
+
+    @staticmethod
+    def density_scatter(grid, max_marker_size=14):
+        # One trace per category with a marker on every non-empty bin, sized by count
+        traces = []
+        peak = max(grid['counts'].max(), 1)
+        for category, counts in zip(grid['categories'], grid['counts']):
+            y_bin, x_bin = np.nonzero(counts)
+            bin_counts = counts[y_bin, x_bin]
+            traces.append(go.Scatter(x=grid['x'][x_bin], y=grid['y'][y_bin], mode='markers', name=str(category),
+                                     text=bin_counts, hovertemplate='count=%{text}<extra></extra>',
+                                     marker={'size': 2 + max_marker_size * np.sqrt(bin_counts / peak),
+                                             'opacity': 0.6, 'line': {'width': 0}}))
+        return traces
+
+    @staticmethod
+    def histogram(summary, name):
+        edges = summary['hist_edges']
+        return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=summary['hist_counts'], width=np.diff(edges),
+                      name=name, marker={'line': {'width': 0}})
+
+    @staticmethod
+    def kde(summary, name):
+        return go.Scatter(x=summary['kde_x'], y=summary['kde_y'], mode='lines', name=name)
+
+    @staticmethod
+    def qq(summary):
+        x = summary['qq_theoretical']
+        line_x = np.array([x[0], x[-1]])
+        return [go.Scatter(x=x, y=summary['qq_ordered'], mode='markers'),
+                go.Scatter(x=line_x, y=summary['qq_intercept'] + summary['qq_slope'] * line_x, mode='lines')]
+
+    @staticmethod
+    def box(summary, name):
+        # Precomputed quartiles and fences, only the outliers are sent as points
+        traces = [go.Box(q1=[summary['q1']], median=[summary['median']], q3=[summary['q3']],
+                         lowerfence=[summary['lowerfence']], upperfence=[summary['upperfence']],
+                         x=[name], name=name, boxpoints=False)]
+        if len(summary['outliers']):
+            traces.append(go.Scatter(x=[name] * len(summary['outliers']), y=summary['outliers'],
+                                     mode='markers', name='Outliers'))
+        return traces
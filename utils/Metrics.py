@@ -0,0 +1,205 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import flask
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger(__name__ + '.slow')
+
+
+class CallbackMetrics():
+    """Latency, CPU time, response size and cache results per Dash callback.
+
+    Every worker counts in memory and, when a directory is shared between the
+    gunicorn workers, writes its counts to `<directory>/metrics-<pid>.json` at
+    most every `flush_seconds`. /metrics sums the files of all workers.
+    """
+
+    # Latency histogram buckets in seconds
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, directory=None, flush_seconds=5.0):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.series = {}
+        self.dirty = False
+        self.flusher = None
+
+    def empty(self):
+        return {'count': 0, 'errors': 0, 'wall': 0.0, 'cpu': 0.0, 'bytes': 0, 'sent': 0,
+                'hits': 0, 'misses': 0, 'buckets': [0] * len(self.buckets)}
+
+    def record(self, name, output, status, wall, cpu, size, sent, cache_result=None):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked after the first request, the counts belong to the parent
+                self.reset()
+            item = self.series.setdefault(f'{name}\t{output}', self.empty())
+            item['count'] += 1
+            item['errors'] += status >= 500
+            item['wall'] += wall
+            item['cpu'] += cpu
+            item['bytes'] += size
+            item['sent'] += sent
+            if cache_result == 'hit':
+                item['hits'] += 1
+            elif cache_result == 'miss':
+                item['misses'] += 1
+            for i, bound in enumerate(self.buckets):
+                if wall <= bound:
+                    item['buckets'][i] += 1
+                    break
+            self.dirty = True
+            if self.directory and self.flusher is None:
+                self.flusher = threading.Thread(target=self.flush_periodically, daemon=True)
+                self.flusher.start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            series = json.dumps(self.series)
+            self.dirty = False
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            f.write(series)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Counts of all workers, keyed by (callback name, output id)."""
+        if not self.directory:
+            with self.lock:
+                return {tuple(key.split('\t')): json.loads(json.dumps(item)) for key, item in self.series.items()}
+
+        self.flush()
+        total = defaultdict(self.empty)
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    series = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, item in series.items():
+                merged = total[tuple(key.split('\t'))]
+                for field, value in item.items():
+                    if field == 'buckets':
+                        merged[field] = [a + b for a, b in zip(merged[field], value)]
+                    else:
+                        merged[field] += value
+        return dict(total)
+
+    @staticmethod
+    def label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def exposition(self):
+        """Prometheus text format, version 0.0.4."""
+        series = sorted(self.collect().items())
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def labels(name, output, **extra):
+            pairs = [('callback', name), ('output', output)] + list(extra.items())
+            return '{' + ','.join(f'{key}="{CallbackMetrics.label(value)}"' for key, value in pairs) + '}'
+
+        samples = []
+        for (name, output), item in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, item['buckets']):
+                cumulative += count
+                samples.append(f'idear_callback_duration_seconds_bucket{labels(name, output, le=bound)} {cumulative}')
+            samples.append(f'idear_callback_duration_seconds_bucket{labels(name, output, le="+Inf")} {item["count"]}')
+            samples.append(f'idear_callback_duration_seconds_sum{labels(name, output)} {item["wall"]:.6f}')
+            samples.append(f'idear_callback_duration_seconds_count{labels(name, output)} {item["count"]}')
+        family('idear_callback_duration_seconds', 'histogram', 'Wall time of Dash callback requests.', samples)
+
+        family('idear_callback_cpu_seconds_total', 'counter', 'CPU time of the thread serving Dash callback requests.',
+               [f'idear_callback_cpu_seconds_total{labels(name, output)} {item["cpu"]:.6f}' for (name, output), item in series])
+        family('idear_callback_response_bytes_total', 'counter', 'Uncompressed size of Dash callback responses.',
+               [f'idear_callback_response_bytes_total{labels(name, output)} {item["bytes"]}' for (name, output), item in series])
+        family('idear_callback_sent_bytes_total', 'counter', 'Size of Dash callback responses as sent.',
+               [f'idear_callback_sent_bytes_total{labels(name, output)} {item["sent"]}' for (name, output), item in series])
+        family('idear_callback_errors_total', 'counter', 'Dash callback requests answered with a server error.',
+               [f'idear_callback_errors_total{labels(name, output)} {item["errors"]}' for (name, output), item in series])
+        family('idear_callback_cache_total', 'counter', 'Memoized callback results served from or stored in the cache.',
+               [f'idear_callback_cache_total{labels(name, output, result=result)} {item[field]}'
+                for (name, output), item in series for result, field in (('hit', 'hits'), ('miss', 'misses'))])
+        return '\n'.join(lines) + '\n'
+
+
+class Metrics():
+    """Instrumentation of /_dash-update-component and the /metrics route."""
+
+    collector = CallbackMetrics()
+
+    @staticmethod
+    def init_app(app, conf_dict, route='/metrics'):
+        """Registered before compression, so the timing includes it and the
+        uncompressed size is known.
+        """
+        if not conf_dict.get('Metrics', True):
+            return
+        directory = conf_dict.get('MetricsDirectory') or os.environ.get('IDEAR_METRICS_DIR')
+        Metrics.collector = CallbackMetrics(directory, conf_dict.get('MetricsFlushSeconds', 5.0))
+        slow_seconds = conf_dict.get('SlowCallbackSeconds', 1.0)
+        if conf_dict.get('SlowCallbackLog'):
+            handler = logging.FileHandler(conf_dict['SlowCallbackLog'])
+            handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+            slow_logger.addHandler(handler)
+
+        @app.server.before_request
+        def start_timer():      # pylint: disable=W0612
+            if flask.request.path.endswith('_dash-update-component'):
+                flask.g.metrics_start = (time.perf_counter(), time.thread_time())
+
+        @app.server.after_request
+        def record_callback(response):      # pylint: disable=W0612
+            start = getattr(flask.g, 'metrics_start', None)
+            if start is None:
+                return response
+            wall, cpu = time.perf_counter() - start[0], time.thread_time() - start[1]
+            body = flask.request.get_json(silent=True) or {}
+            output = body.get('output', '')
+            callback = app.callback_map.get(output, {}).get('callback')
+            name = getattr(callback, '__name__', output)
+            sent = response.content_length or 0
+            size = getattr(flask.g, 'uncompressed_length', None) or sent
+            Metrics.collector.record(name, output, response.status_code, wall, cpu, size, sent,
+                                     getattr(flask.g, 'cache_result', None))
+            if wall >= slow_seconds:
+                slow_logger.warning("%s took %.3f s (%.3f s CPU, %d bytes), inputs %s, state %s", name, wall, cpu,
+                                    size, Metrics.arguments(body.get('inputs')), Metrics.arguments(body.get('state')))
+            return response
+
+        @app.server.route(route)
+        def metrics():      # pylint: disable=W0612
+            return flask.Response(Metrics.collector.exposition(), mimetype='text/plain; version=0.0.4')
+
+    @staticmethod
+    def arguments(values, limit=500):
+        # Component property and value of every argument, truncated
+        text = json.dumps([{f"{item.get('id')}.{item.get('property')}": item.get('value')}
+                           for item in values or [] if isinstance(item, dict)], default=str)
+        return text if len(text) <= limit else text[:limit] + '...'
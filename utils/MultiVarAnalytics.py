@@ -1,18 +1,65 @@
-import matplotlib.pyplot as plt
-import matplotlib
-import scipy.stats as stats
-from statsmodels.graphics.mosaicplot import mosaic
-
-import statsmodels.api as sm
-from statsmodels.formula.api import ols
-
+# statsmodels and matplotlib are imported by the methods using them, they
+# take seconds to import and most sessions never need them
 import pandas as pd
 import numpy as np
-import scipy
+import sys
+import threading
+from collections import OrderedDict
+
+
+class ResultsCache():
+    """Results computed from one dataset, least recently used first out.
+
+    Every data object owns one, so results are dropped with the dataset they
+    come from and count towards the registry memory budget. Request threads
+    share it; a result may be computed twice by concurrent requests, the cache
+    itself is only changed under its lock.
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        result = compute()
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def memory_usage(self):
+        with self.lock:
+            values = list(self.results.values())
+        return sum(ResultsCache.nbytes(value) for value in values)
+
+    @staticmethod
+    def nbytes(value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            usage = value.memory_usage(deep=True)
+            return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (tuple, list)):
+            return sum(ResultsCache.nbytes(each) for each in value)
+        if isinstance(value, dict):
+            return sum(ResultsCache.nbytes(each) for each in value.values())
+        return sys.getsizeof(value)
+
 
 class InteractionAnalytics():
     @staticmethod
-    def rank_associations(df, conf_dict, col1, col2, col3):        
+    def rank_associations(df, conf_dict, col1, col2, col3, cache=None):
         try:
             col2 = int(col2)
             col3 = int(col3)
@@ -37,11 +84,7 @@ class InteractionAnalytics():
                 # Interaction with categorical variables
                 etasquared_dict = {}
             if len(conf_dict['CategoricalColumns']) >= 1:
-                for each in conf_dict['CategoricalColumns']:
-                    mod = ols('{} ~ C({})'.format(col1, each),data=df[[col1,each]],missing='drop').fit()
-                    aov_table = sm.stats.anova_lm(mod, typ=1)
-                    esq_sm = aov_table['sum_sq'][0]/(aov_table['sum_sq'][0]+aov_table['sum_sq'][1])
-                    etasquared_dict[each] = esq_sm
+                etasquared_dict = InteractionAnalytics.eta_squared(df, [col1], conf_dict['CategoricalColumns']).loc[col1].to_dict()
 
                 topk_esq = pd.DataFrame.from_dict(etasquared_dict, orient='index').unstack().sort_values(\
                     kind = 'quicksort', ascending=False).head(col3).reset_index()
@@ -54,12 +97,7 @@ class InteractionAnalytics():
         else:
             #Interaction with numerical variables
             if len(conf_dict['NumericalColumns']) >= 1:
-                etasquared_dict = {}
-                for each in conf_dict['NumericalColumns']:
-                    mod = ols('{} ~ C({})'.format(each, col1), data = df[[col1,each]]).fit()
-                    aov_table = sm.stats.anova_lm(mod, typ=1)
-                    esq_sm = aov_table['sum_sq'][0]/(aov_table['sum_sq'][0]+aov_table['sum_sq'][1])
-                    etasquared_dict[each] = esq_sm
+                etasquared_dict = InteractionAnalytics.eta_squared(df, conf_dict['NumericalColumns'], [col1])[col1].to_dict()
 
                 topk_esq = pd.DataFrame.from_dict(etasquared_dict, orient='index').unstack().sort_values(\
                     kind = 'quicksort', ascending=False).head(col2).reset_index()
@@ -69,16 +107,8 @@ class InteractionAnalytics():
             # Interaction with categorical variables
             cramer_dict = {}
             if len(conf_dict['CategoricalColumns'])>1:
-                for each in conf_dict['CategoricalColumns']:
-                    if each !=col1:
-                        tbl = pd.crosstab(df[col1], df[each])
-                        chisq = stats.chi2_contingency(tbl, correction=False)[0]
-                        try:
-                            cramer = np.sqrt(chisq/sum(tbl))
-                        except:
-                            cramer = np.sqrt(chisq/tbl.values.sum())
-                            pass
-                        cramer_dict[each] = cramer
+                cramer_matrix = InteractionAnalytics.cramers_v_matrix(df, conf_dict['CategoricalColumns'], cache=cache)
+                cramer_dict = cramer_matrix.loc[col1].drop(col1).to_dict()
 
                 topk_cramer = pd.DataFrame.from_dict(cramer_dict, orient='index').unstack().sort_values(\
                     kind = 'quicksort', ascending=False).head(col3).reset_index()
@@ -87,42 +117,239 @@ class InteractionAnalytics():
 
             return topk_esq, metric_num, topk_cramer, metric_cat
         
+    # Results that only depend on the data are kept in the ResultsCache of the
+    # dataset passed as `cache`, keyed by arguments alone since a new version of
+    # a dataset is a new data object. Without one they are computed every time.
+    @staticmethod
+    def cached(key, compute, cache=None):
+        if cache is None:
+            return compute()
+        return cache.get(key, compute)
+
+    @staticmethod
+    def cramers_v_matrix(df, categorical_columns, bias_correction=True, cache=None):
+        key = ('cramers_v', tuple(categorical_columns), bias_correction)
+        return InteractionAnalytics.cached(key, lambda: InteractionAnalytics.compute_cramers_v(
+            df, categorical_columns, bias_correction), cache)
+
+    @staticmethod
+    def compute_cramers_v(df, categorical_columns, bias_correction=True):
+        """Pairwise Cramer's V with the Bergsma (2013) bias correction.
+
+        Only the observed cells of a contingency table are counted, from
+        integer codes, and the margins with np.bincount, so memory follows the
+        number of rows and not the product of the cardinalities. Rows with a
+        missing value in either column of a pair are dropped.
+        """
+        encoded = [pd.factorize(df[each]) for each in categorical_columns]
+        n_cols = len(categorical_columns)
+        result = np.eye(n_cols)
+
+        for i in range(n_cols):
+            codes_i, uniques_i = encoded[i]
+            for j in range(i + 1, n_cols):
+                codes_j, uniques_j = encoded[j]
+                valid = (codes_i >= 0) & (codes_j >= 0)
+                rows, cols = codes_i[valid], codes_j[valid]
+                cells, observed = np.unique(rows * np.int64(len(uniques_j)) + cols, return_counts=True)
+                row_totals = np.bincount(rows, minlength=len(uniques_i))
+                col_totals = np.bincount(cols, minlength=len(uniques_j))
+
+                # Categories that do not co-occur with any value of the other column are left out
+                n = len(rows)
+                r, k = np.count_nonzero(row_totals), np.count_nonzero(col_totals)
+                if n < 2 or r < 2 or k < 2:
+                    result[i, j] = result[j, i] = 0.0
+                    continue
+
+                # sum((o - e)^2 / e) = sum(o^2 / e) - n, where only observed cells add to the sum
+                expected = row_totals[cells // len(uniques_j)] * col_totals[cells % len(uniques_j)] / n
+                phi2 = max(0.0, (observed.astype('float64') ** 2 / expected).sum() / n - 1)
+
+                if bias_correction:
+                    phi2 = max(0.0, phi2 - (k - 1) * (r - 1) / (n - 1))
+                    r = r - (r - 1) ** 2 / (n - 1)
+                    k = k - (k - 1) ** 2 / (n - 1)
+                denominator = min(k - 1, r - 1)
+                result[i, j] = result[j, i] = np.sqrt(phi2 / denominator) if denominator > 0 else 0.0
+
+        return pd.DataFrame(result, index=categorical_columns, columns=categorical_columns)
+
+    @staticmethod
+    def eta_squared(df, numerical_columns, categorical_columns):
+        """Eta-squared of every numerical column grouped by every categorical column.
+
+        Same value as SS_between / (SS_between + SS_within) from a one-way ANOVA,
+        computed in closed form from grouped sums over integer coded categories.
+        Rows with a missing value in either column of a pair are dropped.
+        """
+        Y = df[numerical_columns].to_numpy(dtype='float64', na_value=np.nan)
+        n_num = Y.shape[1]
+
+        # Sums of squares are shift invariant, centering keeps them accurate
+        with np.errstate(invalid='ignore'):
+            Y = Y - np.nanmean(Y, axis=0)
+        observed = ~np.isnan(Y)
+        col_index = np.arange(n_num)
+
+        result = pd.DataFrame(np.nan, index=numerical_columns, columns=categorical_columns)
+        for each in categorical_columns:
+            codes, uniques = pd.factorize(df[each])
+            n_groups = len(uniques)
+            valid = observed & (codes >= 0)[:, None]
+
+            # One bincount over (group, column) cells gives every grouped sum at once
+            cells = (codes[:, None] * n_num + col_index)[valid]
+            values = Y[valid]
+            group_n = np.bincount(cells, minlength=n_groups * n_num).reshape(n_groups, n_num)
+            group_sum = np.bincount(cells, weights=values, minlength=n_groups * n_num).reshape(n_groups, n_num)
+            total_sq = np.bincount(cells % n_num, weights=values ** 2, minlength=n_num)
+
+            n = group_n.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                correction = group_sum.sum(axis=0) ** 2 / n
+                ss_between = np.where(group_n > 0, group_sum ** 2 / group_n, 0).sum(axis=0) - correction
+                ss_total = total_sq - correction
+                result[each] = np.where(ss_total > 0, ss_between / ss_total, np.nan)
+
+        return result
+
     @staticmethod
     def NoLabels(x):
         return ''
 
     @staticmethod
-    def categorical_relations(df, col1, col2):
+    def categorical_relations(df, col1, col2, top1=None, top2=None, k=10):
+        # The k most frequent values of each column, the other values as one category
+        from utils.TopK import TopK
+
         if col1 != col2:
-            df2 = df[(df[col1].isin(df[col1].value_counts().head(10).index.tolist()))&(df[col2].isin(df[col2].value_counts().head(10).index.tolist())) ]
-            df3 = pd.crosstab(df2[col1], df2[col2])
+            top1 = list(top1 if top1 is not None else TopK.from_values(df[col1], k).labels())[:k]
+            top2 = list(top2 if top2 is not None else TopK.from_values(df[col2], k).labels())[:k]
+            x = InteractionAnalytics.top_codes(df[col1], top1)
+            y = InteractionAnalytics.top_codes(df[col2], top2)
+            valid = (x >= 0) & (y >= 0)
+            counts = np.bincount(x[valid] * (len(top2) + 1) + y[valid], minlength=(len(top1) + 1) * (len(top2) + 1))
+            df3 = pd.DataFrame(counts.reshape(len(top1) + 1, len(top2) + 1),
+                               index=pd.Index(top1 + [TopK.other_label], name=col1),
+                               columns=pd.Index(top2 + [TopK.other_label], name=col2))
+            # Sorted like a crosstab, the other values last
+            df3 = df3.iloc[list(np.argsort(top1, kind='stable')) + [len(top1)],
+                           list(np.argsort(top2, kind='stable')) + [len(top2)]]
+            df3 = df3.loc[df3.sum(axis=1) > 0, df3.sum(axis=0) > 0]
             df3 = df3+1e-8
         else:
-            df3 = pd.DataFrame(df[col1].value_counts())[:10]
+            top = TopK.from_values(df[col1], k)
+            df3 = top.frame('count', k).set_index('index')
+            df3.index.name = col1
 
         return df3
+
+    @staticmethod
+    def top_codes(x, labels):
+        # Position of each value in labels, len(labels) for the other values and -1 for missing ones
+        codes = pd.Index(labels).get_indexer(x)
+        codes[codes < 0] = len(labels)
+        codes[x.isna().to_numpy()] = -1
+        return codes
     
     @staticmethod
-    def numerical_relations(df, col1, col2):
-        from statsmodels.nonparametric.smoothers_lowess import lowess
-        x = df[col2]
-        y = df[col1]
+    def numerical_relations(df, col1, col2, max_points=2000, cache=None):
+        key = ('numerical_relations', col1, col2, max_points)
+        return InteractionAnalytics.cached(key, lambda: InteractionAnalytics.compute_numerical_relations(
+            df, col1, col2, max_points), cache)
+
+    @staticmethod
+    def compute_numerical_relations(df, col1, col2, max_points=2000):
+        x, y = InteractionAnalytics.sorted_pairs(df, col1, col2)
 
         # lowess
-        lowess_results = pd.DataFrame(lowess(y, x))
+        lowess_results = pd.DataFrame(InteractionAnalytics.fast_lowess(x, y, max_points))
         lowess_results.columns = ['x', 'lowess']
 
-        #ols
-        fit = np.polyfit(x, y, 1)
-        fit1d = np.poly1d(fit)
+        #ols and Pearson correlation from the same centered sums
+        dx = x - x.mean()
+        dy = y - y.mean()
+        sxx, syy, sxy = np.dot(dx, dx), np.dot(dy, dy), np.dot(dx, dy)
+        slope = sxy / sxx if sxx > 0 else 0.0
+        intercept = y.mean() - slope * x.mean()
 
-        ols = pd.DataFrame(data={'x':x, 'ols':fit1d(x)})
+        # A straight line only needs its two end points, x is sorted
+        ends = x[[0, -1]] if len(x) else x
+        ols = pd.DataFrame(data={'x':ends, 'ols':intercept + slope * ends})
 
         #Corr 
-        corr = round(stats.pearsonr(x, y)[0], 6)
+        corr = round(sxy / np.sqrt(sxx * syy), 6) if sxx > 0 and syy > 0 else np.nan
 
         return lowess_results, ols, corr
-    
+
+    @staticmethod
+    def sorted_pairs(df, col1, col2):
+        x = df[col2].to_numpy(dtype='float64', na_value=np.nan)
+        y = df[col1].to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.isfinite(x) & np.isfinite(y)
+        order = np.argsort(x[valid], kind='stable')
+        return x[valid][order], y[valid][order]
+
+    @staticmethod
+    def fast_lowess(x, y, max_points=2000, frac=2.0/3.0):
+        """LOWESS on x-sorted data. Above max_points it runs on an evenly spaced
+        subsample of the sorted points, and the delta shortcut skips the local
+        regressions for points closer than 1% of the x range to the last fit.
+        """
+        from statsmodels.nonparametric.smoothers_lowess import lowess
+
+        if len(x) > max_points:
+            index = np.linspace(0, len(x) - 1, max_points).round().astype('int64')
+            x, y = x[index], y[index]
+        delta = 0.01 * (x[-1] - x[0]) if len(x) else 0.0
+        return lowess(y, x, frac=frac, delta=delta, is_sorted=True)
+
+    @staticmethod
+    def lowess_error(df, col1, col2, max_points=2000, frac=2.0/3.0):
+        """Largest absolute gap between fast_lowess and exact LOWESS on all points,
+        returned as is and relative to the standard deviation of col1.
+        """
+        from statsmodels.nonparametric.smoothers_lowess import lowess
+
+        x, y = InteractionAnalytics.sorted_pairs(df, col1, col2)
+        exact = lowess(y, x, frac=frac, is_sorted=True)
+        fast = InteractionAnalytics.fast_lowess(x, y, max_points, frac)
+        error = np.abs(np.interp(exact[:, 0], fast[:, 0], fast[:, 1]) - exact[:, 1]).max()
+        return error, error / y.std() if y.std() > 0 else np.nan
+
+    @staticmethod
+    def density_grid(df, col_x, col_y, col_color=None, bins=200):
+        """2D count grid of col_x against col_y, binned server side.
+
+        Returns the bin centers and a (category, y, x) count array. Without a
+        colour column there is a single category named None.
+        """
+        x = df[col_x].to_numpy(dtype='float64', na_value=np.nan)
+        y = df[col_y].to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.isfinite(x) & np.isfinite(y)
+
+        if col_color is None:
+            codes, categories = np.zeros(len(x), dtype='int64'), [None]
+        else:
+            codes, categories = pd.factorize(df[col_color])
+            valid &= codes >= 0
+        x, y, codes = x[valid], y[valid], codes[valid]
+
+        x_edges = np.linspace(x.min(), x.max(), bins + 1) if len(x) else np.linspace(0, 1, bins + 1)
+        y_edges = np.linspace(y.min(), y.max(), bins + 1) if len(y) else np.linspace(0, 1, bins + 1)
+        x_bin = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, bins - 1)
+        y_bin = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, bins - 1)
+
+        # One bincount over (category, y bin, x bin) cells
+        cells = (codes * bins + y_bin) * bins + x_bin
+        counts = np.bincount(cells, minlength=len(categories) * bins * bins).reshape(len(categories), bins, bins)
+
+        return {'x': (x_edges[:-1] + x_edges[1:]) / 2,
+                'y': (y_edges[:-1] + y_edges[1:]) / 2,
+                'counts': counts,
+                'categories': list(categories)}
+
     @staticmethod
     def numerical_correlation(df, conf_dict, method):
         corr_df= df[conf_dict['NumericalColumns']].corr(method=method)        
@@ -130,10 +357,12 @@ class InteractionAnalytics():
                 
     @staticmethod
     def nc_relation(df, conf_dict, col1, col2):
+        import statsmodels.api as sm
+        from statsmodels.formula.api import ols
 
         mod = ols('{} ~ {}'.format(col1, col2), data=df[[col1, col2]]).fit()
         aov_table = sm.stats.anova_lm(mod, typ=1)
-        p_val = round(aov_table['PR(>F)'][0], 6)
+        p_val = round(aov_table['PR(>F)'].iloc[0], 6)
         status = 'Passed'
         color = 'blue'
         if p_val < 0.05:
@@ -143,29 +372,56 @@ class InteractionAnalytics():
         return status, p_val
     
     @staticmethod
-    def pca_3d(df, conf_dict, col1, comp1, comp2):
-        from sklearn.decomposition import PCA
+    def pca(df, columns, max_components=None, cache=None):
+        """Principal component scores and explained variance ratios of the
+        standardized columns. Fitted once per dataset version and column set
+        when the ResultsCache of the dataset is passed.
+        """
+        key = ('pca', tuple(columns), max_components)
+        return InteractionAnalytics.cached(key, lambda: InteractionAnalytics.compute_pca(
+            df, columns, max_components), cache)
+
+    @staticmethod
+    def compute_pca(df, columns, max_components=None, incremental_threshold=1000000, batch_size=50000):
+        from sklearn.decomposition import PCA, IncrementalPCA
         from sklearn.preprocessing import StandardScaler
 
-        num_numeric = len(conf_dict['NumericalColumns'])
+        df2 = df[columns].dropna()
+        X = StandardScaler().fit_transform(df2.to_numpy(dtype='float64'))
+        n_components = min(X.shape)
+        if max_components:
+            n_components = min(n_components, int(max_components))
 
-        df2 = df[conf_dict['NumericalColumns']]
-        X = StandardScaler().fit_transform(df2.values)
-        pca = PCA(n_components = num_numeric)
-        pca.fit(X) 
+        # Large tables are fitted in batches, a few leading components of a
+        # wide table with a randomized solver, everything else exactly
+        if X.shape[0] > incremental_threshold:
+            pca = IncrementalPCA(n_components=n_components, batch_size=max(batch_size, n_components))
+        elif n_components < 0.8 * min(X.shape):
+            pca = PCA(n_components=n_components, svd_solver='randomized', random_state=0)
+        else:
+            pca = PCA(n_components=n_components)
+        scores = pca.fit_transform(X)
 
-        explained_variance = pd.DataFrame(data={'Component':np.arange(1,(num_numeric+1),1),
+        component_names = ['PC' + str(i) for i in range(1, n_components + 1)]
+        Y_pca = pd.DataFrame(scores, index=df2.index, columns=component_names)
+        explained_variance = pd.DataFrame(data={'Component':np.arange(1,(n_components+1),1),
                                                'Variance':pca.explained_variance_ratio_})
 
-        Y_pca = pd.DataFrame(pca.fit_transform(X))
-        Y_pca.columns = ['PC1','PC2','PC3']
-        Y_pca[col1] = df[col1]
+        return Y_pca, explained_variance
+
+    @staticmethod
+    def pca_3d(df, conf_dict, col1, comp1, comp2, cache=None):
+        Y_pca, explained_variance = InteractionAnalytics.pca(df, conf_dict['NumericalColumns'],
+                                                             conf_dict.get('PCAComponents'), cache)
+        Y_pca = Y_pca.copy()
+        Y_pca[col1] = df[col1].loc[Y_pca.index]
 
         return Y_pca, explained_variance
-        
+
     @staticmethod
     def nnc_relation(df, conf_dict, col1, col2, col3, Export=False):
         import itertools
+        import matplotlib.pyplot as plt
         markers = ['x', 'o', '^']
         color = itertools.cycle(['r', 'y', 'c', 'y', 'k']) 
         groups = df[[col1, col2, col3]].groupby(col3)
@@ -0,0 +1,184 @@
+import base64
+import functools
+import logging
+
+import flask
+import numpy as np
+import plotly.utils
+from plotly.basedatatypes import BaseFigure
+from flask_compress import Compress
+
+logger = logging.getLogger(__name__)
+
+
+class NegotiatedCompress(Compress):
+    """Flask-Compress picking brotli or gzip per request from Accept-Encoding.
+
+    Browsers only offer brotli over HTTPS, so a single COMPRESS_ALGORITHM
+    would leave plain HTTP deployments uncompressed. The versioned Dash
+    JavaScript bundles are compressed once and kept.
+    """
+
+    algorithms = ('br', 'gzip')
+    brotli_quality = 5
+    static_prefix = '/_dash-component-suites/'
+
+    def __init__(self, app=None):
+        self.static = {}
+        super(NegotiatedCompress, self).__init__(app)
+
+    def after_request(self, response):
+        app = self.app or flask.current_app
+        accept_encoding = flask.request.headers.get('Accept-Encoding', '').lower()
+        algorithm = next((name for name in self.algorithms if name in accept_encoding), None)
+
+        if (algorithm is None or response.mimetype not in app.config['COMPRESS_MIMETYPES'] or
+                not 200 <= response.status_code < 300 or
+                (response.content_length is not None and response.content_length < app.config['COMPRESS_MIN_SIZE']) or
+                'Content-Encoding' in response.headers):
+            return response
+
+        response.direct_passthrough = False
+        if flask.request.path.startswith(self.static_prefix):
+            key = (algorithm, flask.request.full_path)
+            if key not in self.static:
+                self.static[key] = self.encode(app, algorithm, response.get_data())
+            compressed_content = self.static[key]
+        else:
+            compressed_content = self.encode(app, algorithm, response.get_data())
+
+        flask.g.uncompressed_length = response.content_length
+        response.set_data(compressed_content)
+        response.headers['Content-Encoding'] = algorithm
+        response.headers['Content-Length'] = response.content_length
+        vary = response.headers.get('Vary')
+        if vary and 'accept-encoding' not in vary.lower():
+            response.headers['Vary'] = f'{vary}, Accept-Encoding'
+        elif not vary:
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def encode(self, app, algorithm, data):
+        if algorithm == 'br':
+            import brotli
+            return brotli.compress(data, quality=self.brotli_quality)
+
+        import gzip
+        return gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'])
+
+
+class FastJSONEncoder(plotly.utils.PlotlyJSONEncoder):
+    """PlotlyJSONEncoder serializing with orjson, numpy arrays natively and NaN
+    as null, in one pass instead of encode, decode and encode again.
+    """
+
+    def encode(self, o):
+        import orjson
+
+        try:
+            return orjson.dumps(o, default=self.default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            return super(FastJSONEncoder, self).encode(o)
+
+
+class Payload():
+    """Smaller callback responses: compression, fast JSON, rounded figure
+    arrays and a logged size budget per callback.
+    """
+
+    default_budget_kb = 512
+
+    @staticmethod
+    def init_app(app, compress, conf_dict):
+        # Registered before compression, so it runs after it and sees both sizes
+        Payload.register_budget(app, conf_dict)
+        if conf_dict.get('Compression', True):
+            algorithms = conf_dict.get('CompressAlgorithms', ['br', 'gzip'])
+            compress.algorithms = tuple(algorithms if isinstance(algorithms, list) else [algorithms])
+            app.server.config['COMPRESS_LEVEL'] = conf_dict.get('CompressLevel', 6)
+            compress.init_app(app.server)
+
+        # Dash 1.x serializes every callback response with plotly.utils.PlotlyJSONEncoder
+        if conf_dict.get('FastJSON', True) and Payload.orjson_available():
+            plotly.utils.PlotlyJSONEncoder = FastJSONEncoder
+
+    @staticmethod
+    def orjson_available():
+        try:
+            import orjson
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def register_budget(app, conf_dict):
+        budget = conf_dict.get('PayloadBudgetKB', Payload.default_budget_kb) * 1024
+        budgets = {key: value * 1024 for key, value in (conf_dict.get('PayloadBudgets') or {}).items()}
+
+        @app.server.after_request
+        def log_payload(response):      # pylint: disable=W0612
+            if not flask.request.path.endswith('_dash-update-component') or response.status_code != 200:
+                return response
+            output = (flask.request.get_json(silent=True) or {}).get('output', '')
+            callback = app.callback_map.get(output, {}).get('callback')
+            name = getattr(callback, '__name__', output)
+            size = getattr(flask.g, 'uncompressed_length', None) or response.content_length or 0
+            sent = response.content_length or 0
+            limit = budgets.get(name, budget)
+            if size > limit:
+                logger.warning("%s: %.1f KB over its %.0f KB budget (%.1f KB sent)", name, size / 1024,
+                               limit / 1024, sent / 1024)
+            else:
+                logger.debug("%s: %.1f KB (%.1f KB sent)", name, size / 1024, sent / 1024)
+            return response
+
+    @staticmethod
+    def round_array(values, digits=6):
+        # Every value rounded to `digits` significant digits of its own, so that its
+        # shortest JSON representation is short and small values keep their precision
+        values = np.asarray(values)
+        if values.dtype.kind != 'f' or values.size == 0:
+            return values
+        finite = np.isfinite(values) & (values != 0)
+        magnitude = np.floor(np.log10(np.abs(np.where(finite, values, 1.0))))
+        decimals = np.clip(digits - 1 - magnitude, -300, 300)
+        # Dividing by an exact power of ten gives the double closest to the rounded decimal
+        scale = 10.0 ** np.abs(decimals)
+        with np.errstate(invalid='ignore', over='ignore'):
+            rounded = np.where(decimals >= 0, np.round(values * scale) / scale, np.round(values / scale) * scale)
+        return np.where(finite, rounded, values).astype(values.dtype, copy=False)
+
+    @staticmethod
+    def decode_typed_array(value):
+        # Newer plotly versions store arrays as base64 typed arrays, which plotly.js 1.x can not read
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        if 'shape' in value:
+            array = array.reshape([int(size) for size in str(value['shape']).split(',')])
+        return array
+
+    @staticmethod
+    def slim_value(value, digits=6):
+        if isinstance(value, BaseFigure):
+            value = value.to_dict()
+        if isinstance(value, dict):
+            if 'bdata' in value and 'dtype' in value:
+                return Payload.round_array(Payload.decode_typed_array(value), digits)
+            return {key: Payload.slim_value(item, digits) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            if value and all(isinstance(item, float) for item in value):
+                return Payload.round_array(np.array(value), digits)
+            return type(value)(Payload.slim_value(item, digits) for item in value)
+        if isinstance(value, np.ndarray):
+            return Payload.round_array(value, digits)
+        return value
+
+    @staticmethod
+    def slim(digits=6):
+        """Decorator rounding the float arrays of the figures returned by a callback."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return Payload.slim_value(func(*args, **kwargs), digits)
+            return wrapper
+        return decorator
@@ -0,0 +1,53 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Prewarm():
+    """Background import of the analytics backends.
+
+    They are imported by the functions using them, so the app serves its
+    first page without them. With `PrewarmImports` set a daemon thread
+    imports them right after startup, and the first chart does not pay for it.
+    """
+
+    modules = (
+        'scipy.stats',
+        'scipy.special',
+        'plotly.express',
+        'statsmodels.api',
+        'statsmodels.formula.api',
+        'statsmodels.nonparametric.smoothers_lowess',
+        'sklearn.decomposition',
+        'sklearn.preprocessing',
+        'pyarrow.parquet',
+    )
+    thread = None
+
+    @staticmethod
+    def run(modules=None):
+        start = time.perf_counter()
+        for name in modules or Prewarm.modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                logger.debug("%s is not installed", name)
+        logger.info("Prewarmed imports in %.2f s", time.perf_counter() - start)
+
+    @staticmethod
+    def start(conf_dict):
+        if not conf_dict.get('PrewarmImports', False):
+            return None
+        Prewarm.thread = threading.Thread(target=Prewarm.run, args=(conf_dict.get('PrewarmModules'),),
+                                          name='prewarm', daemon=True)
+        Prewarm.thread.start()
+        return Prewarm.thread
+
+    @staticmethod
+    def wait():
+        # A fork in the middle of an import would leave the child with a held module lock
+        if Prewarm.thread is not None:
+            Prewarm.thread.join()
@@ -0,0 +1,235 @@
+import cProfile
+import functools
+import glob
+import hmac
+import itertools
+import html
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+import flask
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler():
+    """Samples the stack of one thread every `interval` seconds into collapsed
+    stacks, `outer;inner;leaf count` per line, the input of flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Profiling():
+    """Opt-in profiling of single Dash callback requests.
+
+    With `Profiling` set in config.yaml, a callback request carrying the
+    X-Profile header, or any callback request while the admin toggle is on,
+    runs under cProfile and a stack sampler. The pstats file, the collapsed
+    stacks and the request arguments are saved to `ProfileDirectory` and
+    listed at /admin/profiles. Without `Profiling`, or without a
+    `ProfileToken`, nothing is registered.
+    """
+
+    header = 'X-Profile'
+    flag_name = 'enabled'
+    sequence = itertools.count()
+
+    @staticmethod
+    def profile_dir(conf_dict):
+        return conf_dict.get('ProfileDirectory') or os.path.join(conf_dict.get('CacheDirectory') or '.cache', 'profiles')
+
+    @staticmethod
+    def init_app(app, conf_dict, route='/admin/profiles'):
+        if not conf_dict.get('Profiling', False):
+            return
+        token = conf_dict.get('ProfileToken')
+        if not token:
+            logger.warning("Profiling is on without a ProfileToken, the profiling routes are not registered")
+            return
+        directory = Profiling.profile_dir(conf_dict)
+        os.makedirs(directory, exist_ok=True)
+        interval = conf_dict.get('ProfileIntervalMs', 5) / 1000
+        keep = conf_dict.get('ProfileKeep', 50)
+        flag_path = os.path.join(directory, Profiling.flag_name)
+
+        def authorized(value):
+            return value is not None and hmac.compare_digest(str(value), str(token))
+
+        # The toggle is a file, so it reaches every worker, checked at most once a second
+        toggle = {'checked': 0.0, 'enabled': False}
+
+        def toggled():
+            now = time.monotonic()
+            if now - toggle['checked'] > 1.0:
+                toggle['checked'], toggle['enabled'] = now, os.path.exists(flag_path)
+            return toggle['enabled']
+
+        endpoint = app.config.routes_pathname_prefix + '_dash-update-component'
+        dispatch = app.server.view_functions[endpoint]
+
+        @functools.wraps(dispatch)
+        def profiled_dispatch(*args, **kwargs):
+            if not (authorized(flask.request.headers.get(Profiling.header)) or toggled()):
+                return dispatch(*args, **kwargs)
+            return Profiling.run(dispatch, args, kwargs, directory, interval, keep)
+
+        app.server.view_functions[endpoint] = profiled_dispatch
+
+        def check_token():
+            if not authorized(flask.request.args.get('token') or flask.request.headers.get(Profiling.header)):
+                flask.abort(403)
+
+        @app.server.route(route)
+        def list_profiles():      # pylint: disable=W0612
+            check_token()
+            return Profiling.index_page(directory, route, os.path.exists(flag_path), flask.request.args.get('token'))
+
+        @app.server.route(route + '/toggle', methods=['POST'])
+        def toggle_profiles():      # pylint: disable=W0612
+            check_token()
+            if os.path.exists(flag_path):
+                os.remove(flag_path)
+            else:
+                open(flag_path, 'w').close()
+            toggle['checked'] = 0.0
+            query = f"?token={flask.request.args['token']}" if flask.request.args.get('token') else ''
+            return flask.redirect(route + query)
+
+        @app.server.route(route + '/<name>')
+        def show_profile(name):      # pylint: disable=W0612
+            check_token()
+            name = os.path.basename(name)
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                flask.abort(404)
+            if name.endswith('.prof') and flask.request.args.get('format') != 'raw':
+                return flask.Response(Profiling.top_functions(path), mimetype='text/plain')
+            return flask.send_file(os.path.abspath(path), mimetype='application/octet-stream' if name.endswith('.prof')
+                                   else 'text/plain', as_attachment=name.endswith('.prof'))
+
+    @staticmethod
+    def run(dispatch, args, kwargs, directory, interval, keep):
+        body = flask.request.get_json(silent=True) or {}
+        sampler = StackSampler(threading.get_ident(), interval).start()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        status = 200
+        try:
+            response = profile.runcall(dispatch, *args, **kwargs)
+            status = getattr(response, 'status_code', 200)
+            return response
+        except Exception:
+            status = 500
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            sampler.stop()
+            try:
+                Profiling.save(directory, body, profile, sampler, wall, status)
+                Profiling.prune(directory, keep)
+            except OSError:
+                logger.exception("Could not save the profile")
+
+    @staticmethod
+    def save(directory, body, profile, sampler, wall, status):
+        output = body.get('output', '')
+        now = time.time()
+        stem = '{}{:03d}-{}-{}-{}'.format(time.strftime('%Y%m%d-%H%M%S', time.localtime(now)), int(now * 1000) % 1000,
+                                          os.getpid(), next(Profiling.sequence),
+                                          ''.join(c if c.isalnum() or c in '-_' else '_' for c in output)[:80])
+        profile.dump_stats(os.path.join(directory, stem + '.prof'))
+        with open(os.path.join(directory, stem + '.collapsed'), 'w') as f:
+            f.write(sampler.collapsed())
+        with open(os.path.join(directory, stem + '.json'), 'w') as f:
+            json.dump({'output': output, 'inputs': body.get('inputs'), 'state': body.get('state'),
+                       'seconds': wall, 'status': status, 'time': time.time(), 'pid': os.getpid(),
+                       'samples': sum(sampler.stacks.values())}, f, default=str)
+        logger.info("Profiled %s in %.3f s: %s", output, wall, stem)
+
+    @staticmethod
+    def prune(directory, keep):
+        metas = sorted(glob.glob(os.path.join(directory, '*.json')), key=os.path.getmtime, reverse=True)
+        for meta in metas[keep:]:
+            for extension in ('.json', '.prof', '.collapsed'):
+                path = meta[:-len('.json')] + extension
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def recent(directory):
+        profiles = []
+        for meta in sorted(glob.glob(os.path.join(directory, '*.json')), key=os.path.getmtime, reverse=True):
+            try:
+                with open(meta) as f:
+                    item = json.load(f)
+            except (OSError, ValueError):
+                continue
+            item['name'] = os.path.basename(meta)[:-len('.json')]
+            profiles.append(item)
+        return profiles
+
+    @staticmethod
+    def top_functions(path, limit=40):
+        stream = io.StringIO()
+        stats = pstats.Stats(path, stream=stream)
+        stats.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    @staticmethod
+    def index_page(directory, route, enabled, token=None):
+        query = f'?token={html.escape(token)}' if token else ''
+        rows = []
+        for item in Profiling.recent(directory):
+            name = html.escape(item['name'])
+            arguments = html.escape(json.dumps([argument.get('value') for argument in item.get('inputs') or []],
+                                               default=str))[:200]
+            rows.append(f"<tr><td>{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item['time']))}</td>"
+                        f"<td>{html.escape(item['output'])}</td><td>{arguments}</td>"
+                        f"<td>{item['seconds']:.3f}</td><td>{item['status']}</td>"
+                        f"<td><a href='{route}/{name}.prof{query}'>stats</a> "
+                        f"<a href='{route}/{name}.prof{query}{'&' if query else '?'}format=raw'>.prof</a> "
+                        f"<a href='{route}/{name}.collapsed{query}'>collapsed</a></td></tr>")
+        state = 'on' if enabled else 'off'
+        return (f"<!DOCTYPE html><html><head><title>Profiles</title></head><body>"
+                f"<h3>Callback profiles</h3>"
+                f"<form method='post' action='{route}/toggle{query}'>Profiling of every callback request is "
+                f"<b>{state}</b> <button type='submit'>Turn {'off' if enabled else 'on'}</button></form>"
+                f"<p>Single requests are profiled with the <code>{Profiling.header}</code> header.</p>"
+                f"<table border='1' cellpadding='4'><tr><th>Time</th><th>Output</th><th>Inputs</th><th>Seconds</th>"
+                f"<th>Status</th><th>Files</th></tr>{''.join(rows)}</table></body></html>")
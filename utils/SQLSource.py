@@ -0,0 +1,191 @@
+import contextlib
+import queue
+import threading
+
+import pandas as pd
+
+from utils.Sampling import ReservoirSampler
+
+
+class ConnectionPool():
+    """Bounded pool of DB-API connections, shared by the threads of a worker.
+
+    A connection that raised while in use is closed instead of being returned.
+    """
+
+    def __init__(self, connect, size=4):
+        self.connect = connect
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        self.slots.acquire()
+        try:
+            try:
+                cnxn = self.idle.get_nowait()
+            except queue.Empty:
+                cnxn = self.connect()
+            try:
+                yield cnxn
+            except BaseException:
+                cnxn.close()
+                raise
+            self.idle.put(cnxn)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SQLSource():
+    """Sampled reads from a SQL database (DataSource in config.yaml).
+
+    Only the configured columns are selected. When the sample is smaller than
+    the table the database draws the random rows itself, so only about
+    Sample_Size rows cross the network, and those are read in chunks into the
+    reservoir sampler which applies the seed and stratification.
+
+    DataSource is `sqlserver` (pyodbc, Server/Database/Username/Password),
+    `postgresql` (psycopg2, ConnectionString) or `sqlite` (DatabasePath). The
+    rows come from `Table` or from an arbitrary SELECT in `Query`.
+    """
+
+    pools = {}
+    lock = threading.Lock()
+
+    # Extra rows drawn by the database when the sample is stratified afterwards
+    stratified_oversampling = 2
+
+    @staticmethod
+    def dialect(conf_dict):
+        source = str(conf_dict.get('DataSource', 'sqlserver')).lower()
+        if source in ('sqlite', 'sqlite3'):
+            return 'sqlite'
+        if source in ('postgres', 'postgresql'):
+            return 'postgresql'
+        return 'sqlserver'
+
+    @staticmethod
+    def connector(conf_dict):
+        dialect = SQLSource.dialect(conf_dict)
+        if dialect == 'sqlite':
+            import sqlite3
+            path = conf_dict['DatabasePath']
+            return path, lambda: sqlite3.connect(path, check_same_thread=False)
+        if dialect == 'postgresql':
+            import psycopg2
+            dsn = conf_dict['ConnectionString']
+            return dsn, lambda: psycopg2.connect(dsn)
+
+        import pyodbc
+        dsn = conf_dict.get('ConnectionString') or \
+            'driver=ODBC Driver 17 for SQL Server;server={};port=1433;database={};Uid={};Pwd={}'.format(
+                conf_dict['Server'], conf_dict['Database'], conf_dict['Username'], conf_dict['Password'])
+        return dsn, lambda: pyodbc.connect(dsn)
+
+    @staticmethod
+    def pool(conf_dict):
+        dsn, connect = SQLSource.connector(conf_dict)
+        with SQLSource.lock:
+            if dsn not in SQLSource.pools:
+                SQLSource.pools[dsn] = ConnectionPool(connect, conf_dict.get('ConnectionPoolSize', 4))
+            return SQLSource.pools[dsn]
+
+    @staticmethod
+    def quote(dialect, name):
+        if dialect == 'sqlserver':
+            return '[' + name.replace(']', ']]') + ']'
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def source(conf_dict):
+        # A table name is used as is, a query becomes a derived table
+        if 'Table' in conf_dict:
+            return conf_dict['Table']
+        return '({}) AS src'.format(conf_dict['Query'].strip().rstrip(';'))
+
+    @staticmethod
+    def select(conf_dict, columns=None, sample_size=None, total=None, seed=None):
+        dialect = SQLSource.dialect(conf_dict)
+        projection = ', '.join(SQLSource.quote(dialect, col) for col in columns) if columns else '*'
+        source = SQLSource.source(conf_dict)
+        if sample_size is None or total is None or sample_size >= total:
+            return f'SELECT {projection} FROM {source}'
+
+        # Block sampling first reads only a fraction of the pages of a table, with
+        # twice the needed rows since the number of sampled rows varies
+        percent = min(100.0, 200.0 * sample_size / total)
+        if dialect == 'sqlserver':
+            if 'Table' in conf_dict and percent < 100:
+                source = f'{source} TABLESAMPLE ({percent:.6f} PERCENT)'
+            return f'SELECT TOP ({int(sample_size)}) {projection} FROM {source} ORDER BY NEWID()'
+        if dialect == 'postgresql':
+            if 'Table' in conf_dict and percent < 100:
+                repeatable = f' REPEATABLE ({int(seed)})' if seed is not None else ''
+                source = f'{source} TABLESAMPLE SYSTEM ({percent:.6f}){repeatable}'
+            return f'SELECT {projection} FROM {source} ORDER BY random() LIMIT {int(sample_size)}'
+        return f'SELECT {projection} FROM {source} ORDER BY random() LIMIT {int(sample_size)}'
+
+    @staticmethod
+    def count(cnxn, conf_dict):
+        cursor = cnxn.cursor()
+        try:
+            cursor.execute('SELECT COUNT(*) FROM {}'.format(SQLSource.source(conf_dict)))
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def version(conf_dict):
+        """Row count of the source and, with VersionColumn (an updated_at or an
+        increasing id column), its largest value. Changes when rows are added
+        and, with the column, when rows are updated.
+        """
+        dialect = SQLSource.dialect(conf_dict)
+        columns = 'COUNT(*)'
+        if conf_dict.get('VersionColumn'):
+            columns += ', MAX({})'.format(SQLSource.quote(dialect, conf_dict['VersionColumn']))
+        with SQLSource.pool(conf_dict).connection() as cnxn:
+            cursor = cnxn.cursor()
+            try:
+                cursor.execute('SELECT {} FROM {}'.format(columns, SQLSource.source(conf_dict)))
+                return '|'.join(str(value) for value in cursor.fetchone())
+            finally:
+                cursor.close()
+
+    @staticmethod
+    def set_seed(cnxn, conf_dict, seed):
+        # random() of PostgreSQL follows setseed for the rest of the session, which
+        # takes a value in [-1, 1]. SQL Server and SQLite cannot seed NEWID()/random()
+        if seed is None or SQLSource.dialect(conf_dict) != 'postgresql':
+            return
+        cursor = cnxn.cursor()
+        try:
+            cursor.execute('SELECT setseed(%s)', ((int(seed) % 2 ** 31) / 2 ** 31,))
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def iter_chunks(conf_dict, columns=None, sample_size=None, chunksize=None, seed=None):
+        """Chunks of the rows selected by the database, read on a pooled connection
+        that goes back to the pool once the last chunk has been read.
+        """
+        chunksize = chunksize or 100000
+        with SQLSource.pool(conf_dict).connection() as cnxn:
+            total = SQLSource.count(cnxn, conf_dict) if sample_size is not None else None
+            sql = SQLSource.select(conf_dict, columns, sample_size, total, seed)
+            if total is not None and sample_size < total:
+                SQLSource.set_seed(cnxn, conf_dict, seed)
+            yield from pd.read_sql(sql, cnxn, chunksize=chunksize)
+
+    @staticmethod
+    def sample(conf_dict, sample_size, seed=None, stratify=None, columns=None, chunksize=None):
+        pushed_down = sample_size * SQLSource.stratified_oversampling if stratify else sample_size
+        chunks = SQLSource.iter_chunks(conf_dict, columns, pushed_down, chunksize, seed)
+        return ReservoirSampler.sample(chunks, sample_size, seed, stratify)
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+class ReservoirSampler():
+    """Single-pass uniform (or stratified) sample over a stream of DataFrame chunks.
+
+    Every row gets a uniform random key and the reservoir keeps the rows with the
+    smallest keys (bottom-k sampling), which is a uniform sample without
+    replacement. Memory is bounded by the sample size plus one chunk. When a
+    stratification column is given, the final sample is allocated proportionally
+    to the stratum sizes seen and takes the smallest keys of each stratum. The
+    reservoir then keeps the `oversample` * sample_size smallest keys overall,
+    which hold about `oversample` times the share of every stratum, and the
+    `stratum_floor` smallest keys of each stratum for the small ones. Within a
+    stratum these are always its smallest keys, so the sample stays uniform.
+    The floor is lowered so that all strata together keep at most sample_size
+    extra rows, bounding memory by (`oversample` + 1) * sample_size rows plus
+    one chunk however many strata there are. With more strata than that
+    allows, a stratum missing rows is made up by the smallest keys left.
+    """
+
+    key_column = '__reservoir_key'
+
+    def __init__(self, sample_size, seed=None, stratify=None, oversample=2, stratum_floor=10):
+        self.sample_size = int(sample_size)
+        self.stratify = stratify
+        self.oversample = oversample
+        self.stratum_floor = stratum_floor
+        self.random_state = np.random.default_rng(seed)
+        self.reservoir = None
+        self.rows_seen = 0
+        self.strata_counts = pd.Series(dtype='int64')
+
+    def update(self, chunk):
+        # Keys are drawn in row order, so the sample does not depend on the chunk size
+        chunk = chunk.copy()
+        chunk.index = pd.RangeIndex(self.rows_seen, self.rows_seen + len(chunk))
+        chunk[self.key_column] = self.random_state.random(len(chunk))
+        self.rows_seen += len(chunk)
+
+        frame = chunk if self.reservoir is None else pd.concat([self.reservoir, chunk])
+
+        if self.stratify is None:
+            self.reservoir = frame.nsmallest(self.sample_size, self.key_column)
+        else:
+            counts = chunk[self.stratify].value_counts(dropna=False)
+            self.strata_counts = self.strata_counts.add(counts, fill_value=0).astype('int64')
+            overall = frame[self.key_column].rank(method='first') <= self.oversample * self.sample_size
+            floor = min(self.stratum_floor, self.sample_size // len(self.strata_counts))
+            rank = frame.groupby(self.stratify, dropna=False, sort=False)[self.key_column].rank(method='first')
+            self.reservoir = frame[overall | (rank <= floor)]
+        return self
+
+    def result(self):
+        if self.reservoir is None:
+            return pd.DataFrame()
+
+        reservoir = self.reservoir
+        if self.stratify is not None and self.rows_seen > self.sample_size:
+            # Proportional allocation with largest remainders so that the sizes add up
+            quota = self.strata_counts * self.sample_size / self.rows_seen
+            allocation = np.floor(quota).astype('int64')
+            shortfall = self.sample_size - allocation.sum()
+            remainders = (quota - allocation).to_numpy()
+            allocation.iloc[np.argsort(-remainders, kind='stable')[:shortfall]] += 1
+
+            rank = reservoir.groupby(self.stratify, dropna=False, sort=False)[self.key_column].rank(method='first')
+            selected = rank <= reservoir[self.stratify].map(allocation)
+            shortfall = self.sample_size - int(selected.sum())
+            if shortfall > 0:
+                rest = reservoir.loc[~selected, self.key_column].nsmallest(shortfall).index
+                selected[rest] = True
+            reservoir = reservoir[selected]
+
+        return reservoir.sort_values(self.key_column).drop(columns=self.key_column)
+
+    @staticmethod
+    def sample(chunks, sample_size, seed=None, stratify=None):
+        sampler = ReservoirSampler(sample_size, seed, stratify)
+        for chunk in chunks:
+            sampler.update(chunk)
+        return sampler.result()
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.DataIngestion import DataIngestion
+
+logger = logging.getLogger(__name__)
+
+
+class SharedDataset():
+    """Loaded datasets shared by the worker processes through memory mapped files.
+
+    The first process loading a dataset (the gunicorn master with preload_app,
+    otherwise one worker while the others wait on a file lock) writes a
+    snapshot to SharedDirectory/<name>-<key>/:
+
+    - sample.arrow, the compacted sample as an uncompressed Arrow IPC file.
+      Floats keep NaN instead of nulls, so numerical columns map without a copy.
+    - <n>.npy, one array per precomputed sort index.
+    - artifacts.pkl, the statistics, summaries and correlation matrices, whose
+      size depends on the number of columns and not on the number of rows.
+
+    Every process then maps the same files, the sample lives once in the page
+    cache however many workers there are. Writing a new snapshot of a dataset
+    removes its older ones; processes still mapping them keep their files
+    until they unmap them.
+    """
+
+    frame_name = 'sample.arrow'
+    artifacts_name = 'artifacts.pkl'
+    # Bumped whenever the artifacts change shape, so older snapshots are not attached
+    format_version = 2
+
+    @staticmethod
+    def enabled(conf_dict):
+        shared = conf_dict.get('SharedMemory', os.environ.get('IDEAR_SHARED_MEMORY') == '1')
+        return bool(shared) and DataIngestion.columnar_available()
+
+    @staticmethod
+    def shared_dir(conf_dict):
+        return conf_dict.get('SharedDirectory') or os.path.join(conf_dict.get('CacheDirectory') or '.cache', 'shared')
+
+    @staticmethod
+    def key(conf_dict):
+        # The configuration and the version of the source identify a snapshot: size and
+        # modification time of a file, row count (and VersionColumn) of a table, or
+        # the SnapshotTTL period for changes neither of them sees
+        source = ''
+        data_file = conf_dict.get('DataFilePath')
+        if isinstance(data_file, list):
+            data_file = data_file[0]
+        if 'DataSource' in conf_dict:
+            from utils.SQLSource import SQLSource
+            source = SQLSource.version(conf_dict)
+        elif data_file and os.path.exists(data_file):
+            source = DataIngestion.fingerprint(data_file, conf_dict.get('FloatDataTypes'))
+        if conf_dict.get('SnapshotTTL'):
+            source += '|' + str(int(time.time() // conf_dict['SnapshotTTL']))
+        text = json.dumps(conf_dict, sort_keys=True, default=str) + source + str(SharedDataset.format_version)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def load(conf_dict, name, build, attach):
+        """Attaches to the snapshot of the dataset, building it first if needed.
+        `build(conf_dict)` returns (df, arrays, artifacts) and `attach(df, arrays,
+        artifacts)` the dataset object.
+        """
+        directory = os.path.join(SharedDataset.shared_dir(conf_dict), f'{name}-{SharedDataset.key(conf_dict)}')
+        if not os.path.exists(os.path.join(directory, SharedDataset.artifacts_name)):
+            os.makedirs(os.path.dirname(directory), exist_ok=True)
+            with SharedDataset.file_lock(directory + '.lock'):
+                if not os.path.exists(os.path.join(directory, SharedDataset.artifacts_name)):
+                    start = time.perf_counter()
+                    SharedDataset.write(directory, *build(conf_dict))
+                    logger.info("Shared snapshot of %s written in %.1f s", name, time.perf_counter() - start)
+                    SharedDataset.remove_older(directory, name)
+        return attach(*SharedDataset.read(directory))
+
+    @staticmethod
+    def remove_older(directory, name):
+        # Other snapshots of the same dataset, <name>-<key> with a 16 hex digit key
+        parent, current = os.path.split(directory)
+        pattern = re.compile(re.escape(name) + r'-[0-9a-f]{16}')
+        for entry in os.listdir(parent):
+            path = os.path.join(parent, entry)
+            if entry != current and pattern.fullmatch(entry) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                try:
+                    os.remove(path + '.lock')
+                except OSError:
+                    pass
+                logger.info("Removed the older shared snapshot %s", entry)
+
+    @staticmethod
+    def file_lock(path):
+        import contextlib
+
+        @contextlib.contextmanager
+        def locked():
+            with open(path, 'a') as f:
+                try:
+                    import fcntl
+                except ImportError:
+                    # Without flock several processes may build, the rename keeps the first
+                    yield
+                    return
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return locked()
+
+    @staticmethod
+    def to_table(df, preserve_index=True):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=preserve_index)
+        for col in df.columns:
+            if pd.api.types.is_float_dtype(df[col].dtype):
+                # from_pandas turns NaN into nulls, which pandas can only read back by copying
+                i = table.schema.get_field_index(str(col))
+                field = table.schema.field(i)
+                table = table.set_column(i, field, pa.array(df[col].to_numpy(), type=field.type))
+        return table
+
+    @staticmethod
+    def write(directory, df, arrays, artifacts):
+        import pyarrow as pa
+
+        tmp_dir = f'{directory}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        table = SharedDataset.to_table(df)
+        with pa.OSFile(os.path.join(tmp_dir, SharedDataset.frame_name), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        names = {}
+        for i, (key, array) in enumerate(arrays.items()):
+            np.save(os.path.join(tmp_dir, f'{i}.npy'), np.ascontiguousarray(array))
+            names[key] = f'{i}.npy'
+        with open(os.path.join(tmp_dir, SharedDataset.artifacts_name), 'wb') as f:
+            pickle.dump({'arrays': names, 'artifacts': artifacts}, f, pickle.HIGHEST_PROTOCOL)
+
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Written by another process in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def read(directory):
+        import pyarrow as pa
+
+        # The mapping lives as long as the arrays viewing it
+        source = pa.memory_map(os.path.join(directory, SharedDataset.frame_name), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        df = table.to_pandas(split_blocks=True)
+
+        with open(os.path.join(directory, SharedDataset.artifacts_name), 'rb') as f:
+            stored = pickle.load(f)
+        arrays = {key: np.load(os.path.join(directory, name), mmap_mode='r') for key, name in stored['arrays'].items()}
+        return df, arrays, stored['artifacts']
+
+    @staticmethod
+    def mapped_bytes(df):
+        # Bytes of the columns viewing the mapping rather than process memory
+        total = 0
+        for col in df.columns:
+            values = df[col].to_numpy() if not isinstance(df[col].dtype, pd.CategoricalDtype) else None
+            if isinstance(values, np.ndarray) and not values.flags.owndata and not values.flags.writeable:
+                total += values.nbytes
+        return total
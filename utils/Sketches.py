@@ -0,0 +1,352 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from utils.DataIngestion import DataIngestion
+from utils.TopK import SpaceSaving
+
+
+class Moments():
+    """Count, mean, sum of squared deviations, min and max of several columns at once.
+
+    A chunk is summarized on its own and merged with the pairwise update of
+    Chan et al., the batch form of Welford's algorithm, which stays accurate
+    where summing squares would cancel. Merging is associative, so chunks can
+    be summarized in any order and in separate processes.
+    """
+
+    def __init__(self, n_columns):
+        self.rows = 0
+        self.count = np.zeros(n_columns, dtype='int64')
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    def update(self, X):
+        chunk = Moments(X.shape[1])
+        chunk.rows = X.shape[0]
+        chunk.count = np.count_nonzero(~np.isnan(X), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunk.mean = np.where(chunk.count > 0, np.nansum(X, axis=0) / chunk.count, 0.0)
+            chunk.m2 = np.nansum((X - chunk.mean) ** 2, axis=0)
+        # fmin and fmax skip NaN, columns without values keep the infinite initial value
+        chunk.min = np.fmin.reduce(X, axis=0, initial=np.inf)
+        chunk.max = np.fmax.reduce(X, axis=0, initial=-np.inf)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        count = self.count + other.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = other.mean - self.mean
+            share = np.where(count > 0, other.count / count, 0.0)
+            self.mean = self.mean + delta * share
+            self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * share
+        self.count = count
+        self.rows += other.rows
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def std(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+
+class TDigest():
+    """Quantile sketch of one column, a merging t-digest.
+
+    Values are buffered and, once there are more than `buffer_size` of them
+    and the centroids, merged in sorted order into centroids whose extent on
+    the k1 scale (`compression` / 2pi * asin(2q - 1)) is about one unit.
+    Centroids are small in the tails and large around the median, so extreme
+    quantiles stay accurate. Up to `buffer_size` values the digest is exact.
+    """
+
+    def __init__(self, compression=400, buffer_size=10000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.buffer = []
+        self.buffer_weights = []
+        self.buffered = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.buffer.append(values)
+            self.buffer_weights.append(np.ones(len(values)))
+            self.buffered += len(values)
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            if self.buffered + len(self.means) > self.buffer_size:
+                self.compress()
+        return self
+
+    def merge(self, other):
+        other.compress()
+        if len(other.means):
+            self.buffer.append(other.means)
+            self.buffer_weights.append(other.weights)
+            self.buffered += len(other.means)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self.compress()
+
+    def compress(self):
+        if not self.buffer:
+            return self
+        # Raw values weigh one, centroids merged from another digest their own weight
+        means = np.concatenate([self.means] + self.buffer)
+        weights = np.concatenate([self.weights] + self.buffer_weights)
+        self.buffer, self.buffer_weights, self.buffered = [], [], 0
+
+        order = np.argsort(means)
+        means, weights = means[order], weights[order]
+        if len(means) > self.buffer_size:
+            # Centroids are grouped by the unit of the k1 scale their right edge falls in
+            right = np.minimum(np.cumsum(weights) / weights.sum(), 1.0)
+            k = self.compression / (2 * np.pi) * np.arcsin(2 * right - 1)
+            bins = np.floor(k + self.compression / 4 - 1e-9)
+            starts = np.concatenate([[0], np.flatnonzero(np.diff(bins)) + 1])
+            merged = np.add.reduceat(weights, starts)
+            means = np.add.reduceat(means * weights, starts) / merged
+            weights = merged
+        self.means, self.weights = means, weights
+        return self
+
+    def quantile(self, q):
+        self.compress()
+        total = self.weights.sum()
+        if total == 0:
+            return np.full(len(q), np.nan)
+        # Position q * (n - 1) between order statistics as in DataFrame.describe,
+        # a centroid standing at the middle of the ranks it holds
+        centers = np.cumsum(self.weights) - self.weights / 2
+        target = np.asarray(q) * (total - 1) + 0.5
+        return np.interp(target, np.concatenate([[0.5], centers, [total - 0.5]]),
+                         np.concatenate([[self.min], self.means, [self.max]]))
+
+
+class HyperLogLog():
+    """Distinct count sketch of one column with 2 ** `precision` registers.
+
+    Values are hashed to 64 bits; the first `precision` bits pick a register,
+    which keeps the longest run of leading zeros seen in the rest. Merging
+    takes the register maxima. The standard error is 1.04 / sqrt(2 ** precision),
+    0.8 % with the default. Up to `exact_limit` distinct hashes are kept as a
+    set instead (the sparse representation), so small counts are exact.
+    """
+
+    def __init__(self, precision=14, exact_limit=4096):
+        self.precision = precision
+        self.exact_limit = exact_limit
+        self.hashes = np.empty(0, dtype='uint64')
+        self.registers = None
+
+    @staticmethod
+    def hash(values):
+        # Missing values are dropped by the caller; categoricals hash like their values
+        return pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+    @staticmethod
+    def bit_length(x):
+        # Exact for 64 bit integers, each 32 bit half converts to float without rounding
+        high = (x >> np.uint64(32)).astype('float64')
+        low = (x & np.uint64(0xFFFFFFFF)).astype('float64')
+        return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+    def add(self, values):
+        if len(values):
+            self.add_hashes(HyperLogLog.hash(values))
+        return self
+
+    def add_hashes(self, hashes):
+        if self.registers is None:
+            self.hashes = np.union1d(self.hashes, hashes)
+            if len(self.hashes) <= self.exact_limit:
+                return self
+            hashes, self.hashes = self.hashes, None
+            self.registers = np.zeros(2 ** self.precision, dtype='uint8')
+        if len(hashes):
+            width = 64 - self.precision
+            index = (hashes >> np.uint64(width)).astype('int64')
+            rest = hashes & np.uint64(2 ** width - 1)
+            rank = (width - HyperLogLog.bit_length(rest) + 1).astype('uint8')
+            np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        if other.registers is None:
+            return self.add_hashes(other.hashes)
+        if self.registers is None:
+            hashes, self.hashes, self.registers = self.hashes, None, other.registers.copy()
+            return self.add_hashes(hashes)
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype('float64')))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return estimate
+
+
+class StreamingProfile():
+    """Descriptive statistics of every row of a source in one streaming pass.
+
+    Numerical columns keep Moments, a TDigest and a HyperLogLog each,
+    categorical columns a missing count, a HyperLogLog and a SpaceSaving
+    sketch of their most frequent values. All of them merge,
+    so the row groups of the columnar cache are profiled in parallel processes
+    and combined, and memory is bounded by the sketches and one chunk. The
+    tables have the layout of DescriptiveStatistics; quantiles and distinct
+    counts are estimates once a column has more than `buffer_size` values.
+    """
+
+    def __init__(self, numerical, categorical, compression=400, precision=14, buffer_size=10000, capacity=500):
+        self.numerical = list(numerical)
+        self.categorical = list(categorical)
+        self.moments = Moments(len(self.numerical))
+        self.digests = [TDigest(compression, buffer_size) for _ in self.numerical]
+        self.num_distinct = [HyperLogLog(precision) for _ in self.numerical]
+        self.cat_distinct = [HyperLogLog(precision) for _ in self.categorical]
+        self.cat_missing = np.zeros(len(self.categorical), dtype='int64')
+        self.heavy_hitters = [SpaceSaving(capacity) for _ in self.categorical]
+        self.rows = 0
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        if self.numerical:
+            X = chunk[self.numerical].to_numpy(dtype='float64', na_value=np.nan)
+            self.moments.update(X)
+            for i in range(len(self.numerical)):
+                values = X[:, i][~np.isnan(X[:, i])]
+                self.digests[i].add(values)
+                self.num_distinct[i].add(values)
+        for i, col in enumerate(self.categorical):
+            values = chunk[col]
+            missing = values.isna()
+            self.cat_missing[i] += int(missing.sum())
+            self.cat_distinct[i].add(values[~missing])
+            self.heavy_hitters[i].update(values[~missing])
+        return self
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.moments.merge(other.moments)
+        for digest, other_digest in zip(self.digests, other.digests):
+            digest.merge(other_digest)
+        for sketch, other_sketch in zip(self.num_distinct + self.cat_distinct,
+                                        other.num_distinct + other.cat_distinct):
+            sketch.merge(other_sketch)
+        for sketch, other_sketch in zip(self.heavy_hitters, other.heavy_hitters):
+            sketch.merge(other_sketch)
+        self.cat_missing += other.cat_missing
+        return self
+
+    def numerical_summary(self):
+        moments = self.moments
+        has_values = moments.count > 0
+        summary = {
+            'count': moments.count.astype('float64'),
+            'mean': np.where(has_values, moments.mean, np.nan),
+            'std': moments.std(),
+            'min': np.where(has_values, moments.min, np.nan),
+        }
+        from utils.DescriptiveStatistics import DescriptiveStatistics
+        quantiles = DescriptiveStatistics.quantiles
+        values = np.array([digest.quantile(quantiles) for digest in self.digests]).reshape(-1, len(quantiles))
+        for j, q in enumerate(quantiles):
+            summary[f'{int(q * 100)}%'] = values[:, j]
+        summary['max'] = np.where(has_values, moments.max, np.nan)
+        summary['missing'] = self.rows - moments.count
+        # An estimate can overshoot the values it was taken over
+        distinct = np.array([round(sketch.count()) for sketch in self.num_distinct], dtype='int64')
+        summary['unique'] = np.minimum(distinct, moments.count)
+        return pd.DataFrame(summary, index=pd.Index(self.numerical, name='Column name'))
+
+    def categorical_summary(self):
+        distinct = np.array([round(sketch.count()) for sketch in self.cat_distinct], dtype='int64')
+        return pd.DataFrame({'missing': self.cat_missing, 'unique': np.minimum(distinct, self.rows - self.cat_missing)},
+                            index=pd.Index(self.categorical, name='Column name'))
+
+    def summarize(self):
+        return self.numerical_summary().reset_index(), self.categorical_summary().reset_index()
+
+    def top_values(self, k=50):
+        return {col: sketch.result(k, round(distinct.count()))
+                for col, sketch, distinct in zip(self.categorical, self.heavy_hitters, self.cat_distinct)}
+
+    @staticmethod
+    def profile_row_groups(target, row_groups, numerical, categorical, chunksize):
+        import pyarrow.parquet as pq
+
+        profile = StreamingProfile(numerical, categorical)
+        batches = pq.ParquetFile(target).iter_batches(batch_size=chunksize, row_groups=row_groups,
+                                                      columns=list(numerical) + list(categorical))
+        for batch in batches:
+            profile.update(batch.to_pandas())
+        return profile
+
+    @staticmethod
+    def profile(path, numerical, categorical, cache_dir=None, chunksize=None, float_columns=None, workers=None,
+                use_cache=True, top_k=50, **read_kwargs):
+        """Statistics tables of every row of `path` and the `top_k` most frequent values
+        of the categorical columns. With the columnar cache the row groups are split
+        over `workers` processes and the result is cached next to it, otherwise the
+        CSV chunks are profiled in turn.
+        """
+        chunksize = chunksize or DataIngestion.default_chunksize
+        if not (use_cache and DataIngestion.columnar_available()):
+            profile = StreamingProfile(numerical, categorical)
+            for chunk in DataIngestion.iter_chunks(path, list(numerical) + list(categorical), chunksize=chunksize,
+                                                   float_columns=float_columns, use_cache=False, **read_kwargs):
+                profile.update(chunk)
+            return profile.summarize(), profile.top_values(top_k)
+
+        import pyarrow.parquet as pq
+
+        target = DataIngestion.ensure_cache(path, cache_dir, chunksize, float_columns, **read_kwargs)
+        key = '|'.join([','.join(numerical), ','.join(categorical), str(top_k)])
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+        profile_path = DataIngestion.cache_path(path, cache_dir, float_columns).replace(
+            '.parquet', f'-profile-{digest}.pkl')
+        if os.path.exists(profile_path):
+            with open(profile_path, 'rb') as f:
+                return pickle.load(f)
+
+        n_groups = pq.ParquetFile(target).metadata.num_row_groups
+        workers = min(workers or os.cpu_count() or 1, n_groups)
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Contiguous ranges of row groups, the workers' profiles merge in any order
+            splits = np.array_split(np.arange(n_groups), workers)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(StreamingProfile.profile_row_groups, target, split.tolist(),
+                                           numerical, categorical, chunksize) for split in splits]
+                profile = futures[0].result()
+                for future in futures[1:]:
+                    profile.merge(future.result())
+        else:
+            profile = StreamingProfile.profile_row_groups(target, list(range(n_groups)), numerical, categorical,
+                                                          chunksize)
+
+        result = profile.summarize(), profile.top_values(top_k)
+        tmp_path = f'{profile_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, profile_path)
+        return result
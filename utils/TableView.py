@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class TableView():
+    """Server side paging, sorting and filtering for dash_table.DataTable.
+
+    Sorting reads a sort index computed once per column, filtering builds a
+    boolean mask, and only the rows of the requested page are serialized, so
+    the payload size depends on the page size and not on the table size.
+    """
+
+    # Operators of the filter row, symbol and word forms
+    operators = [('>=', '>='), ('<=', '<='), ('!=', '!='), ('<', '<'), ('>', '>'), ('=', '='),
+                 ('ge ', '>='), ('le ', '<='), ('ne ', '!='), ('lt ', '<'), ('gt ', '>'), ('eq ', '='),
+                 ('contains ', 'contains'), ('datestartswith ', 'datestartswith')]
+
+    @staticmethod
+    def columns(df):
+        return [{'name': col, 'id': col, 'type': 'numeric' if pd.api.types.is_numeric_dtype(dtype) else 'text'}
+                for col, dtype in df.dtypes.items()]
+
+    @staticmethod
+    def records(df):
+        # Categorical and missing values as plain JSON values
+        return df.astype(object).where(df.notna(), None).to_dict('records')
+
+    @staticmethod
+    def sort_index(x):
+        # Stable ascending order with the missing values last
+        codes, uniques = pd.factorize(x, sort=True)
+        codes[codes < 0] = len(uniques)
+        return np.argsort(codes, kind='stable'), int(np.count_nonzero(codes < len(uniques)))
+
+    @staticmethod
+    def split_filter_part(filter_part):
+        # Parses one term of filter_query, e.g. {Age} > 30 or {Sex} contains "ma"
+        filter_part = filter_part.strip()
+        if not filter_part.startswith('{') or '}' not in filter_part:
+            return None, None, None
+        name = filter_part[1:filter_part.index('}')]
+        rest = filter_part[filter_part.index('}') + 1:].strip()
+        for token, operator in TableView.operators:
+            if rest.startswith(token):
+                value_part = rest[len(token):].strip()
+                break
+        else:
+            return None, None, None
+
+        if len(value_part) > 1 and value_part[0] == value_part[-1] and value_part[0] in ('"', "'", '`'):
+            value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+        else:
+            try:
+                value = float(value_part)
+            except ValueError:
+                value = value_part
+        return name, operator, value
+
+    @staticmethod
+    def text(value):
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def filter_mask(df, filter_query):
+        mask = np.ones(len(df), dtype=bool)
+        for filter_part in (filter_query or '').split(' && '):
+            col, operator, value = TableView.split_filter_part(filter_part)
+            if col not in df.columns:
+                continue
+            x = df[col]
+            if operator in ('contains', 'datestartswith'):
+                strings = x.astype(object).where(x.notna(), '').astype(str)
+                if operator == 'contains':
+                    term = strings.str.contains(TableView.text(value), regex=False)
+                else:
+                    term = strings.str.startswith(TableView.text(value))
+            else:
+                if isinstance(value, float) and not pd.api.types.is_numeric_dtype(x.dtype):
+                    # Numbers typed into a text column compare to their string form
+                    value = TableView.text(value)
+                    x = x.astype(object).where(x.notna(), None)
+                    x = x.map(lambda v: None if v is None else str(v))
+                if isinstance(x.dtype, pd.CategoricalDtype):
+                    x = x.astype(object)
+                try:
+                    term = {'>=': x.ge, '<=': x.le, '<': x.lt, '>': x.gt, '!=': x.ne, '=': x.eq}[operator](value)
+                except TypeError:
+                    term = pd.Series(False, index=x.index)
+            mask &= term.fillna(False).to_numpy(dtype=bool)
+        return mask
+
+    @staticmethod
+    def table(table_id, df, **kwargs):
+        # Small tables (descriptive statistics) are sorted and filtered in the browser
+        import dash_table
+
+        return dash_table.DataTable(id=table_id, columns=TableView.columns(df), data=TableView.records(df),
+                                    sort_action='native', filter_action='native', page_action='none',
+                                    style_table={'overflowX': 'auto'}, style_cell={'textAlign': 'left'},
+                                    style_header={'fontWeight': 'bold'}, **kwargs)
+
+    @staticmethod
+    def page(df, sort_index, page_current, page_size, sort_by=None, filter_query=None):
+        """Rows of one page and the number of pages. `sort_index(col)` returns the
+        cached (ascending order, number of non-missing values) of a column.
+        """
+        page_current, page_size = int(page_current or 0), max(int(page_size or 10), 1)
+        start = page_current * page_size
+
+        order = None
+        if sort_by:
+            col = sort_by[0]['column_id']
+            order, valid = sort_index(col)
+            if sort_by[0]['direction'] == 'desc':
+                order = np.concatenate([order[:valid][::-1], order[valid:]])
+
+        if filter_query:
+            mask = TableView.filter_mask(df, filter_query)
+            positions = order[mask[order]] if order is not None else np.flatnonzero(mask)
+        else:
+            positions = order
+
+        if positions is None:
+            n_rows = len(df)
+            rows = df.iloc[start:start + page_size]
+        else:
+            n_rows = len(positions)
+            rows = df.iloc[positions[start:start + page_size]]
+        return TableView.records(rows), max(math.ceil(n_rows / page_size), 1)
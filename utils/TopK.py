@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+class TopK():
+    """The `k` most frequent values of a column with the size of the rest.
+
+    `counts` holds the top values in decreasing order of frequency, `total`
+    the number of non-missing values and `distinct` the number of distinct
+    values, so that a chart of the top n values can add an "Other" bar for
+    the remaining ones without the full value counts. Built exactly from a
+    sample with `from_values`, or from a SpaceSaving sketch on a stream, in
+    which case the counts are upper bounds.
+    """
+
+    other_label = 'Other'
+
+    def __init__(self, counts, total, distinct, exact=True):
+        self.counts = counts
+        self.total = int(total)
+        self.distinct = int(distinct)
+        self.exact = exact
+
+    @staticmethod
+    def from_values(x, k=50):
+        counts = x.value_counts()
+        # Categoricals also count the categories that do not occur
+        counts = counts[counts > 0]
+        return TopK(counts.iloc[:k], counts.sum(), len(counts))
+
+    def labels(self, n=None):
+        return self.counts.index[:n].tolist()
+
+    def frame(self, name, n=None):
+        # Same layout as pd.DataFrame(x.value_counts()).reset_index() on pandas 1.x,
+        # the remaining values as one row
+        counts = self.counts.iloc[:n]
+        labels, values = counts.index.tolist(), counts.to_numpy(dtype='int64')
+        other = self.total - int(values.sum())
+        if other > 0 and len(labels) < self.distinct:
+            labels, values = labels + [TopK.other_label], np.append(values, other)
+        return pd.DataFrame({'index': labels, name: values})
+
+
+class SpaceSaving():
+    """Heavy hitters of a stream with `capacity` counters (Metwally et al.).
+
+    A value not monitored takes over the counter of the least frequent one,
+    inheriting its count as the error bound, so every value occurring more
+    than total / capacity times is kept and no count is underestimated. A
+    chunk is counted exactly first and merged as a summary of its own (the
+    mergeable form of Agarwal et al.): a value missing from a full summary
+    counts as that summary's minimum. Merging is what combines the sketches
+    of chunks profiled in parallel.
+    """
+
+    def __init__(self, capacity=500):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+        self.errors = pd.Series(dtype='int64')
+        self.total = 0
+        # Exact as long as no value has been evicted
+        self.complete = True
+
+    def floor(self):
+        # Upper bound of the count of any value not monitored
+        return 0 if self.complete else int(self.counts.min())
+
+    def update(self, values):
+        counts = pd.Series(values).value_counts()
+        chunk = SpaceSaving(self.capacity)
+        chunk.total = int(counts.sum())
+        chunk.counts = counts.astype('int64')
+        chunk.errors = pd.Series(0, index=counts.index, dtype='int64')
+        return self.merge(chunk)
+
+    def merge(self, other):
+        floor, other_floor = self.floor(), other.floor()
+        index = self.counts.index.union(other.counts.index, sort=False)
+        counts = (self.counts.reindex(index, fill_value=floor) +
+                  other.counts.reindex(index, fill_value=other_floor))
+        errors = (self.errors.reindex(index, fill_value=floor) +
+                  other.errors.reindex(index, fill_value=other_floor))
+        self.complete = self.complete and other.complete and len(counts) <= self.capacity
+        keep = counts.nlargest(self.capacity, keep='first').index
+        self.counts, self.errors = counts[keep], errors[keep]
+        self.total += other.total
+        return self
+
+    def result(self, k=50, distinct=None):
+        # Once values were evicted the distinct count comes from elsewhere, a HyperLogLog
+        counts = self.counts.sort_values(ascending=False, kind='stable').iloc[:k]
+        if self.complete or distinct is None:
+            distinct = len(self.counts)
+        return TopK(counts, self.total, distinct, exact=self.complete)
@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class UnivariateAnalytics():
+    """Compact univariate summaries of a numerical column.
+
+    The column is sorted once. Histogram counts, quantiles, box plot
+    statistics and QQ points are read off the sorted values, and the KDE is
+    a binned Gaussian KDE evaluated with an FFT convolution on a fixed grid,
+    so the result size does not depend on the number of rows.
+    """
+
+    @staticmethod
+    def summarize(x, max_bins=100, grid_size=512, qq_points=200, max_outliers=500):
+        x = np.asarray(x, dtype='float64')
+        x = np.sort(x[np.isfinite(x)])
+        n = len(x)
+        if n == 0:
+            return None
+
+        summary = {'count': n, 'mean': x.mean(), 'std': x.std(ddof=1) if n > 1 else 0.0,
+                   'normality': UnivariateAnalytics.normality(x)}
+        summary.update(UnivariateAnalytics.histogram(x, max_bins))
+        summary.update(UnivariateAnalytics.box(x, max_outliers))
+        summary.update(UnivariateAnalytics.kde(x, summary['std'], grid_size))
+        summary.update(UnivariateAnalytics.qq(x, qq_points))
+        return summary
+
+    @staticmethod
+    def normality(x, max_points=5000, seed=0):
+        import scipy.stats as stats
+
+        x = np.asarray(x, dtype='float64')
+        x = x[np.isfinite(x)]
+        if len(x) < 3:
+            return 'skipped', 'gray', np.nan
+
+        # Shapiro-Wilk p-values are only accurate up to 5000 points, test a fixed random subset
+        if len(x) > max_points:
+            x = np.random.default_rng(seed).choice(x, max_points, replace=False)
+        p_val = round(stats.shapiro(x)[1], 6)
+        status = 'passed'
+        color = 'blue'
+        if p_val < 0.05:
+            status = 'failed'
+            color = 'red'
+        return status, color, p_val
+
+    @staticmethod
+    def quantile(x, q):
+        # Linear interpolation on already sorted values
+        position = np.asarray(q) * (len(x) - 1)
+        lower = np.floor(position).astype('int64')
+        upper = np.minimum(lower + 1, len(x) - 1)
+        return x[lower] + (position - lower) * (x[upper] - x[lower])
+
+    @staticmethod
+    def histogram(x, max_bins=100):
+        # Freedman-Diaconis bin width, Sturges when the IQR is zero
+        q1, q3 = UnivariateAnalytics.quantile(x, [0.25, 0.75])
+        span = x[-1] - x[0]
+        n_bins = int(np.ceil(np.log2(len(x)))) + 1
+        if q3 > q1 and span > 0:
+            n_bins = max(n_bins, int(np.ceil(span / (2 * (q3 - q1) * len(x) ** (-1.0 / 3)))))
+        n_bins = max(1, min(n_bins, max_bins))
+
+        edges = np.linspace(x[0], x[-1], n_bins + 1) if span > 0 else np.array([x[0] - 0.5, x[0] + 0.5])
+        # Sorted values, so the counts are differences of insertion points
+        positions = np.searchsorted(x, edges[1:-1], side='left')
+        counts = np.diff(np.concatenate([[0], positions, [len(x)]]))
+        return {'hist_edges': edges, 'hist_counts': counts}
+
+    @staticmethod
+    def box(x, max_outliers=500):
+        q1, median, q3 = UnivariateAnalytics.quantile(x, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        inside = x[(x >= q1 - 1.5 * iqr) & (x <= q3 + 1.5 * iqr)]
+        outliers = x[(x < q1 - 1.5 * iqr) | (x > q3 + 1.5 * iqr)]
+        if len(outliers) > max_outliers:
+            outliers = outliers[np.linspace(0, len(outliers) - 1, max_outliers).round().astype('int64')]
+        return {'q1': q1, 'median': median, 'q3': q3,
+                'lowerfence': inside[0] if len(inside) else q1,
+                'upperfence': inside[-1] if len(inside) else q3,
+                'outliers': outliers}
+
+    @staticmethod
+    def kde(x, std, grid_size=512):
+        n = len(x)
+        # Scott's rule, the same bandwidth as scipy.stats.gaussian_kde
+        bandwidth = std * n ** (-1.0 / 5) if std > 0 else 1.0
+        low, high = x[0] - 3 * bandwidth, x[-1] + 3 * bandwidth
+        grid = np.linspace(low, high, grid_size)
+        step = grid[1] - grid[0]
+
+        # Linear binning: each point splits its unit weight between the two nearest grid points
+        position = (x - low) / step
+        left = np.clip(np.floor(position).astype('int64'), 0, grid_size - 2)
+        right_weight = position - left
+        weights = np.bincount(left, weights=1 - right_weight, minlength=grid_size) + \
+            np.bincount(left + 1, weights=right_weight, minlength=grid_size)
+
+        # Convolve with the Gaussian kernel through zero padded real FFTs
+        offsets = np.arange(-(grid_size - 1), grid_size) * step
+        kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+        size = 1 << int(np.ceil(np.log2(len(weights) + len(kernel) - 1)))
+        convolved = np.fft.irfft(np.fft.rfft(weights, size) * np.fft.rfft(kernel, size), size)
+        density = np.maximum(convolved[grid_size - 1:2 * grid_size - 1], 0) / n
+
+        return {'kde_x': grid, 'kde_y': density, 'bandwidth': bandwidth}
+
+    @staticmethod
+    def qq(x, qq_points=200):
+        from scipy.special import ndtri
+
+        n = len(x)
+        # Filliben's estimate of the uniform order statistic medians, as in scipy.stats.probplot
+        medians = (np.arange(1, n + 1) - 0.3175) / (n + 0.365)
+        medians[-1] = 0.5 ** (1.0 / n)
+        medians[0] = 1 - 0.5 ** (1.0 / n)
+        theoretical = ndtri(medians)
+
+        # The line is fitted on every point, only qq_points of them are returned
+        if n > 1:
+            slope, intercept = np.polyfit(theoretical, x, 1)
+        else:
+            slope, intercept = 0.0, x.mean()
+        index = np.unique(np.linspace(0, n - 1, min(n, qq_points)).round().astype('int64'))
+        theoretical, ordered = theoretical[index], x[index]
+
+        return {'qq_theoretical': theoretical, 'qq_ordered': ordered,
+                'qq_slope': slope, 'qq_intercept': intercept}